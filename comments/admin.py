@@ -1,8 +1,18 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.utils.html import format_html
+from .loaders import content_object_loader
 from .models import Comment, CommentVote
 
 
+class CommentChangeList(ChangeList):
+    """Change list resolving the commented objects of a page in bulk."""
+
+    def get_results(self, request):
+        super().get_results(request)
+        content_object_loader(request).resolve(self.result_list)
+
+
 class CommentVoteInline(admin.TabularInline):
     model = CommentVote
     extra = 0
@@ -79,6 +89,9 @@ class CommentAdmin(admin.ModelAdmin):
 
     reply_count_display.short_description = "Replies"
 
+    def get_changelist(self, request, **kwargs):
+        return CommentChangeList
+
     def get_queryset(self, request):
         return (
             super()
@@ -0,0 +1,26 @@
+from rest_framework import filters
+
+
+class CommentOrderingFilter(filters.OrderingFilter):
+    """``OrderingFilter`` that also accepts ``ordering=top|hot``.
+
+    Both rankings read a stored, indexed sort key (see comments.ranking).
+    """
+
+    rankings = {"top": "-top_score", "hot": "-hot_score"}
+
+    def get_ordering(self, request, queryset, view):
+        ranking = request.query_params.get(self.ordering_param, "").strip()
+        if ranking in self.rankings:
+            return [self.rankings[ranking]]
+        return super().get_ordering(request, queryset, view)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        for parameter in parameters:
+            if parameter["name"] == self.ordering_param:
+                parameter["description"] = (
+                    f"{parameter['description']} `top` and `hot` rank by "
+                    "votes."
+                )
+        return parameters
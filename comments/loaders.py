@@ -0,0 +1,49 @@
+from core.loaders import GenericObjectLoader, RequestLoader
+from .models import CommentVote
+
+# Relations followed by the __str__() of commentable models.
+CONTENT_OBJECT_RELATED = {"wiki.Revision": ["article"]}
+
+
+def content_object_loader(request=None):
+    """Return the loader resolving comment targets for request."""
+    return GenericObjectLoader.for_request(
+        request, select_related=CONTENT_OBJECT_RELATED
+    )
+
+
+class UserVoteLoader(RequestLoader):
+    """Look up a user's votes on many comments with one query."""
+
+    request_attribute = "_user_vote_loader"
+
+    def __init__(self, user=None):
+        self.user = user
+        self._cache = {}
+
+    def load(self, comment_ids):
+        """Fetch the votes on the comments not looked up yet."""
+        missing = {pk for pk in comment_ids if pk not in self._cache}
+        if not missing:
+            return
+        for pk in missing:
+            self._cache[pk] = None
+        if self.user is None or not self.user.is_authenticated:
+            return
+        self._cache.update(
+            CommentVote.objects.filter(
+                user=self.user, comment_id__in=missing
+            ).values_list("comment_id", "vote_type")
+        )
+
+    def get(self, comment_id):
+        """Return the vote type on a comment, loading it if needed."""
+        self.load([comment_id])
+        return self._cache[comment_id]
+
+
+def user_vote_loader(request=None):
+    """Return the loader of the requesting user's votes."""
+    return UserVoteLoader.for_request(
+        request, user=getattr(request, "user", None)
+    )
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def place_comments(apps, schema_editor):
+    # Same layout as Comment.set_thread_position(), from created_at.
+    Comment = apps.get_model('comments', 'Comment')
+    comments = {
+        comment.pk: comment
+        for comment in Comment.objects.only(
+            'id', 'parent_id', 'created_at', 'thread_id', 'path', 'depth'
+        )
+    }
+    for comment in comments.values():
+        chain = [comment]
+        while not chain[-1].path and chain[-1].parent_id in comments:
+            chain.append(comments[chain[-1].parent_id])
+        for node in reversed(chain):
+            if node.path:
+                continue
+            stamp = int(node.created_at.timestamp() * 1_000_000)
+            segment = f'{stamp:014x}{node.pk.hex[:2]}'
+            parent = comments.get(node.parent_id)
+            if parent is None:
+                node.thread_id, node.path, node.depth = node.pk, segment, 0
+            else:
+                node.thread_id = parent.thread_id
+                node.path = parent.path + segment
+                node.depth = parent.depth + 1
+    Comment.objects.bulk_update(
+        comments.values(), ['thread_id', 'path', 'depth'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0004_counter_caches'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=1024),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='thread_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['thread_id', 'path'], name='comments_co_thread__d14d60_idx'),
+        ),
+        migrations.RunPython(place_comments, migrations.RunPython.noop),
+    ]
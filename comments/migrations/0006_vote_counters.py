@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0005_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='downvotes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='upvotes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+from comments.ranking import hot_score, top_score
+
+
+def rank_comments(apps, schema_editor):
+    Comment = apps.get_model('comments', 'Comment')
+    comments = list(
+        Comment.objects.only('id', 'upvotes', 'downvotes', 'created_at')
+    )
+    for comment in comments:
+        comment.top_score = top_score(comment.upvotes, comment.downvotes)
+        comment.hot_score = hot_score(
+            comment.upvotes, comment.downvotes, comment.created_at
+        )
+    Comment.objects.bulk_update(
+        comments, ['top_score', 'hot_score'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0006_vote_counters'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='hot_score',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='top_score',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.RunPython(rank_comments, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['content_type', 'object_id', '-top_score', '-id'], name='comments_co_content_f7a314_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['content_type', 'object_id', '-hot_score', '-id'], name='comments_co_content_eed823_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0007_comment_ranking'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('status', 'flagged')), fields=['-created_at', '-id'], name='comments_flagged_queue_idx'),
+        ),
+    ]
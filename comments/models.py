@@ -2,16 +2,38 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
 import uuid
 
+from core.counters import CounterCacheMixin, CounterField
+from .ranking import (
+    hot_score,
+    hot_score_expression,
+    top_score_expression,
+)
+
 User = get_user_model()
 
 
-class Comment(models.Model):
+class Comment(CounterCacheMixin, models.Model):
     """Comments that can be attached to articles,
     revisions, or other content.
+
+    Every comment records the root of its thread and a ``path`` made of
+    one segment per ancestor, so a thread ordered by path lists each
+    comment followed by its replies, oldest first, and a subtree is a
+    prefix range of the ``(thread_id, path)`` index.
     """
 
+    # Sort keys recomputed from the vote counters by rerank()
+    atomic_fields = ("top_score", "hot_score")
+
+    # A segment is the creation time in hex microseconds plus two hex
+    # digits of the id, which keeps siblings in chronological order.
+    PATH_SEGMENT = 16
+    MAX_DEPTH = 64
+
     class Status(models.TextChoices):
         ACTIVE = "active", "Active"
         HIDDEN = "hidden", "Hidden"
@@ -40,6 +62,13 @@ class Comment(models.Model):
         related_name="replies",
     )
 
+    # Position in the thread (see set_thread_position())
+    thread_id = models.UUIDField(null=True, editable=False)
+    path = models.CharField(
+        max_length=PATH_SEGMENT * MAX_DEPTH, blank=True, editable=False
+    )
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
     # Status and moderation
     status = models.CharField(
         max_length=10, choices=Status.choices, default=Status.ACTIVE
@@ -50,47 +79,103 @@ class Comment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     edited_at = models.DateTimeField(null=True, blank=True)
 
-    # Engagement
-    upvotes = models.PositiveIntegerField(default=0)
-    downvotes = models.PositiveIntegerField(default=0)
+    # Engagement: vote tallies, kept up to date by CommentVote (see
+    # comments.votes), and the sort keys derived from them
+    upvotes = CounterField(
+        "comments.CommentVote", "comment", condition={"vote_type": "up"}
+    )
+    downvotes = CounterField(
+        "comments.CommentVote", "comment", condition={"vote_type": "down"}
+    )
+    top_score = models.FloatField(default=0.0, editable=False)
+    hot_score = models.FloatField(default=0.0, editable=False)
+
+    # Denormalized count of active replies (see core.counters)
+    reply_count = CounterField(
+        "comments.Comment", "parent", condition={"status": Status.ACTIVE}
+    )
 
     class Meta:
         ordering = ["-created_at"]
         indexes = [
-            models.Index(fields=["content_type", "object_id", "-created_at"]),
+            models.Index(
+                fields=["content_type", "object_id", "-created_at", "-id"]
+            ),
+            models.Index(fields=["-created_at", "-id"]),
             models.Index(fields=["author", "-created_at"]),
             models.Index(fields=["status", "-created_at"]),
+            models.Index(fields=["thread_id", "path"]),
+            models.Index(
+                fields=["content_type", "object_id", "-top_score", "-id"]
+            ),
+            models.Index(
+                fields=["content_type", "object_id", "-hot_score", "-id"]
+            ),
+            # The moderation queue: a small slice of all comments
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(status="flagged"),
+                name="comments_flagged_queue_idx",
+            ),
         ]
 
     def __str__(self):
         return f"Comment by {self.author.username} on {self.content_object}"
 
+    def save(self, *args, **kwargs):
+        if not self.path:
+            self.set_thread_position()
+        if self._state.adding:
+            self.hot_score = hot_score(
+                self.upvotes, self.downvotes, self.created_at or timezone.now()
+            )
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def rerank(cls, pk, created_at=None):
+        """Recompute the sort keys of a comment from its current votes."""
+        if created_at is None:
+            created_at = (
+                cls.objects.filter(pk=pk)
+                .values_list("created_at", flat=True)
+                .first()
+            )
+            if created_at is None:
+                return
+        cls.objects.filter(pk=pk).update(
+            top_score=top_score_expression(),
+            hot_score=hot_score_expression(created_at),
+        )
+
+    def set_thread_position(self):
+        """Place a new comment in its thread, after existing replies."""
+        stamp = int(timezone.now().timestamp() * 1_000_000)
+        segment = f"{stamp:014x}{self.id.hex[:2]}"
+        if self.parent_id is None:
+            self.thread_id, self.path, self.depth = self.id, segment, 0
+        else:
+            parent = self.parent
+            self.thread_id = parent.thread_id
+            self.path = parent.path + segment
+            self.depth = parent.depth + 1
+
     @property
     def is_reply(self):
         return self.parent is not None
 
-    @property
-    def reply_count(self):
-        return self.replies.filter(status=self.Status.ACTIVE).count()
-
     @property
     def score(self):
         return self.upvotes - self.downvotes
 
     def get_thread_root(self):
         """Get the root comment of the thread."""
-        if self.parent:
-            return self.parent.get_thread_root()
-        return self
+        if self.parent_id is None:
+            return self
+        return Comment.objects.get(pk=self.thread_id)
 
     def get_depth(self):
         """Get nesting depth (0 for root comments)."""
-        depth = 0
-        parent = self.parent
-        while parent:
-            depth += 1
-            parent = parent.parent
-        return depth
+        return self.depth
 
 
 class CommentVote(models.Model):
@@ -121,34 +206,18 @@ class CommentVote(models.Model):
             f"comment {self.comment.id}"
         )
 
-    def save(self, *args, **kwargs):
-        # Handle vote counting
-        if self.pk:
-            # Updating existing vote
-            old_vote = CommentVote.objects.get(pk=self.pk)
-            if old_vote.vote_type != self.vote_type:
-                if old_vote.vote_type == self.VoteType.UP:
-                    self.comment.upvotes -= 1
-                    self.comment.downvotes += 1
-                else:
-                    self.comment.downvotes -= 1
-                    self.comment.upvotes += 1
-        else:
-            # New vote
-            if self.vote_type == self.VoteType.UP:
-                self.comment.upvotes += 1
-            else:
-                self.comment.downvotes += 1
 
-        super().save(*args, **kwargs)
-        self.comment.save()
+def rerank_voted_comment(sender, instance, raw=False, origin=None, **kwargs):
+    # Runs after the vote counters were updated (they connect first).
+    if raw or isinstance(origin, Comment):
+        return
+    comment = (
+        instance.comment if CommentVote.comment.is_cached(instance) else None
+    )
+    Comment.rerank(
+        instance.comment_id, comment.created_at if comment else None
+    )
 
-    def delete(self, *args, **kwargs):
-        # Adjust vote counts when deleting
-        if self.vote_type == self.VoteType.UP:
-            self.comment.upvotes -= 1
-        else:
-            self.comment.downvotes -= 1
 
-        super().delete(*args, **kwargs)
-        self.comment.save()
+post_save.connect(rerank_voted_comment, sender=CommentVote)
+post_delete.connect(rerank_voted_comment, sender=CommentVote)
@@ -0,0 +1,43 @@
+"""Bulk moderation of comments.
+
+Status changes are applied with set-based ``UPDATE`` statements over
+chunks of matching comments, each in its own short transaction, and the
+reply and comment counters that depend on the status are adjusted with
+one ``UPDATE`` per chunk and counter (see ``core.counters``).
+"""
+
+from django.utils import timezone
+
+from core.counters import update_counted
+from .models import Comment
+
+# Moderation actions and the status each one sets
+TRANSITIONS = {
+    "approve": Comment.Status.ACTIVE,
+    "hide": Comment.Status.HIDDEN,
+    "delete": Comment.Status.DELETED,
+    "flag": Comment.Status.FLAGGED,
+}
+
+
+def moderate(comments, action, chunk_size=1000):
+    """Apply a moderation action to a queryset of comments.
+
+    Returns the number of comments whose status changed.
+    """
+    status = TRANSITIONS[action]
+    pending = comments.exclude(status=status).order_by("pk")
+    changed = 0
+    last = None
+    while True:
+        chunk = pending if last is None else pending.filter(pk__gt=last)
+        pks = list(chunk.values_list("pk", flat=True)[:chunk_size])
+        if not pks:
+            return changed
+        # Re-check the status under the lock taken by update_counted().
+        changed += update_counted(
+            Comment.objects.filter(pk__in=pks).exclude(status=status),
+            status=status,
+            updated_at=timezone.now(),
+        )
+        last = pks[-1]
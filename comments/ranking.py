@@ -0,0 +1,62 @@
+"""Sort keys ranking comments by their votes.
+
+``top`` is the lower bound of the Wilson score interval for the share of
+upvotes: a comment ranks high only with both a high ratio and enough
+votes to trust it. ``hot`` is the order of magnitude of the net score
+plus the creation time, so a comment needs ten times the net score to
+outrank one posted ``HOT_DECAY`` seconds later. Neither changes unless
+the votes do, so both are stored on ``Comment`` and indexed.
+
+Each key has a Python version and a query expression over the vote
+columns; updating a row with the expression computes it from the
+counts current at that moment, under the row lock.
+"""
+
+import datetime
+import math
+
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Cast, Greatest, Log, Sign, Sqrt
+
+# 95% confidence
+Z = 1.96
+HOT_DECAY = 45000
+HOT_EPOCH = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def top_score(upvotes, downvotes):
+    """Wilson lower bound of the upvote share."""
+    total = upvotes + downvotes
+    if not total:
+        return 0.0
+    spread = Z * math.sqrt(upvotes * downvotes / total + Z * Z / 4)
+    return (upvotes + Z * Z / 2 - spread) / (total + Z * Z)
+
+
+def hot_score(upvotes, downvotes, created_at):
+    """Net score magnitude, offset by the creation time."""
+    net = upvotes - downvotes
+    order = math.log10(max(abs(net), 1))
+    age = (created_at - HOT_EPOCH).total_seconds()
+    return math.copysign(order, net) + age / HOT_DECAY
+
+
+def top_score_expression():
+    """``top_score()`` of a row's current votes."""
+    upvotes = Cast("upvotes", FloatField())
+    downvotes = Cast("downvotes", FloatField())
+    total = upvotes + downvotes
+    spread = Value(Z) * Sqrt(upvotes * downvotes / total + Value(Z * Z / 4))
+    return Case(
+        When(upvotes=0, downvotes=0, then=Value(0.0)),
+        default=(upvotes + Value(Z * Z / 2) - spread) / (total + Value(Z * Z)),
+        output_field=FloatField(),
+    )
+
+
+def hot_score_expression(created_at):
+    """``hot_score()`` of a row's current votes; created_at is the row's."""
+    net = Cast(F("upvotes") - F("downvotes"), FloatField())
+    order = Log(Value(10.0), Greatest(Abs(net), Value(1.0)))
+    age = (created_at - HOT_EPOCH).total_seconds()
+    return Sign(net) * order + Value(age / HOT_DECAY)
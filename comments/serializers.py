@@ -1,8 +1,29 @@
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
-from .models import Comment
+from core.fieldsets import SparseFieldsetMixin
+from users.serializers import full_name
+from .loaders import content_object_loader, user_vote_loader
+from .models import Comment, CommentVote
+from .moderation import TRANSITIONS
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentListSerializer(serializers.ListSerializer):
+    """Resolve the commented objects of a page in bulk before rendering."""
+
+    def to_representation(self, data):
+        comments = list(data.all() if hasattr(data, "all") else data)
+        if "content_object_str" in self.child.fields:
+            content_object_loader(self.context.get("request")).resolve(
+                comments
+            )
+        if "my_vote" in self.child.fields:
+            user_vote_loader(self.context.get("request")).load(
+                comment.pk for comment in comments
+            )
+        return super().to_representation(comments)
+
+
+class CommentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Comment model.
 
     The `author` is set automatically from `request.user` during create().
@@ -15,6 +36,7 @@ class CommentSerializer(serializers.ModelSerializer):
     content_object_str = serializers.CharField(
         source="__str__", read_only=True
     )
+    my_vote = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
@@ -27,9 +49,13 @@ class CommentSerializer(serializers.ModelSerializer):
             "author",
             "author_name",
             "parent",
+            "thread_id",
+            "depth",
             "status",
             "upvotes",
             "downvotes",
+            "my_vote",
+            "reply_count",
             "created_at",
             "updated_at",
             "edited_at",
@@ -40,7 +66,92 @@ class CommentSerializer(serializers.ModelSerializer):
             "updated_at",
             "edited_at",
             "author",
+            "thread_id",
+            "depth",
+            "reply_count",
         ]
+        expandable_fields = {
+            "author": "users.serializers.UserSummarySerializer",
+        }
+        field_requirements = {
+            "content_object_str": {
+                "only": ["content_type", "object_id"],
+                "select_related": ["author"],
+            },
+            "my_vote": {"only": ["id"]},
+        }
+        list_serializer_class = CommentListSerializer
+        # Columns read by the values() fast path (see core.values)
+        values_mappers = {
+            "author_name": ["author__first_name", "author__last_name"],
+            "content_object_str": [
+                "author__username",
+                "content_type_id",
+                "object_id",
+            ],
+            "my_vote": ["id"],
+        }
+
+    def prepare_values(self, rows):
+        # Resolve the commented objects of a page with one query per type.
+        request = self.context.get("request")
+        self._content_objects = content_object_loader(request)
+        if "content_object_str" in self.fields:
+            self._content_objects.load(
+                (row["content_type_id"], row["object_id"]) for row in rows
+            )
+        self._votes = user_vote_loader(request)
+        if "my_vote" in self.fields:
+            self._votes.load(row["id"] for row in rows)
+
+    def map_author_name(self, first_name, last_name):
+        return full_name(first_name, last_name)
+
+    def map_content_object_str(self, username, content_type_id, object_id):
+        content_object = self._content_objects.get(content_type_id, object_id)
+        # Mirrors Comment.__str__()
+        return f"Comment by {username} on {content_object}"
+
+    def map_my_vote(self, pk):
+        return self._votes.get(pk)
+
+    @extend_schema_field(
+        serializers.ChoiceField(
+            choices=CommentVote.VoteType.choices, allow_null=True
+        )
+    )
+    def get_my_vote(self, obj):
+        """The requesting user's vote on the comment, if any."""
+        return user_vote_loader(self.context.get("request")).get(obj.pk)
+
+    def validate(self, attrs):
+        parent = attrs.get("parent")
+        if self.instance is not None:
+            if "parent" in attrs and parent != self.instance.parent:
+                raise serializers.ValidationError(
+                    {"parent": "A comment cannot be moved to another thread."}
+                )
+            for name in ("content_type", "object_id"):
+                if name in attrs and attrs[name] != getattr(
+                    self.instance, name
+                ):
+                    raise serializers.ValidationError(
+                        {name: "A comment cannot be moved to another object."}
+                    )
+            return attrs
+        if parent is None:
+            return attrs
+        if parent.content_type_id != attrs["content_type"].id or str(
+            parent.object_id
+        ) != str(attrs["object_id"]):
+            raise serializers.ValidationError(
+                {"parent": "The parent is a comment on another object."}
+            )
+        if parent.depth + 1 >= Comment.MAX_DEPTH:
+            raise serializers.ValidationError(
+                {"parent": f"Replies nest at most {Comment.MAX_DEPTH} deep."}
+            )
+        return attrs
 
     def create(self, validated_data):
         request = self.context.get("request")
@@ -53,6 +164,90 @@ class CommentSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class CommentTreeSerializer(CommentSerializer):
+    """A comment with its replies nested up to the requested depth.
+
+    `more` links to the next levels of a comment whose replies were cut
+    off by the depth limit, and is null otherwise.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields["replies"] = CommentTreeSerializer(
+            source="tree_replies", many=True, read_only=True
+        )
+        fields["more"] = serializers.URLField(
+            source="tree_more", allow_null=True, read_only=True
+        )
+        return fields
+
+
+class CommentVoteSerializer(serializers.Serializer):
+    """A vote cast on a comment, with the resulting tallies."""
+
+    vote_type = serializers.ChoiceField(
+        choices=CommentVote.VoteType.choices, allow_null=True
+    )
+    upvotes = serializers.IntegerField(read_only=True)
+    downvotes = serializers.IntegerField(read_only=True)
+
+
+class CommentModerationSerializer(serializers.Serializer):
+    """A moderation action and the comments it applies to.
+
+    Comments are selected by `ids` and/or the filters; at least one of
+    them is required.
+    """
+
+    # Criteria and the lookups they filter comments by
+    CRITERIA = {
+        "ids": "pk__in",
+        "status": "status",
+        "author": "author_id",
+        "content_type": "content_type_id",
+        "object_id": "object_id",
+        "created_after": "created_at__gte",
+        "created_before": "created_at__lt",
+    }
+
+    action = serializers.ChoiceField(choices=list(TRANSITIONS))
+    ids = serializers.ListField(
+        child=serializers.UUIDField(), required=False, allow_empty=False
+    )
+    status = serializers.ChoiceField(
+        choices=Comment.Status.choices, required=False
+    )
+    author = serializers.IntegerField(required=False)
+    content_type = serializers.IntegerField(required=False)
+    object_id = serializers.UUIDField(required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if not any(name in attrs for name in self.CRITERIA):
+            raise serializers.ValidationError(
+                "Select comments by ids or at least one filter."
+            )
+        return attrs
+
+    def get_filters(self):
+        """Return the queryset filters for the validated criteria."""
+        return {
+            lookup: self.validated_data[name]
+            for name, lookup in self.CRITERIA.items()
+            if name in self.validated_data
+        }
+
+
+class CommentModerationResultSerializer(serializers.Serializer):
+    """Summary of a bulk moderation action."""
+
+    action = serializers.CharField()
+    status = serializers.CharField()
+    matched = serializers.IntegerField()
+    updated = serializers.IntegerField()
+
+
 class ContentTypeSerializer(serializers.Serializer):
     """Read-only serializer for django ContentType entries."""
 
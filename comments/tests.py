@@ -1,3 +1,406 @@
-from django.test import TestCase
+from datetime import timedelta
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from wiki.models import Article
+
+from .models import Comment, CommentVote
+from .moderation import moderate
+from .ranking import HOT_DECAY, HOT_EPOCH, hot_score, top_score
+from .votes import cast_vote
+
+User = get_user_model()
+
+
+class VoteTests(TestCase):
+    """Votes are upserted and keep the tallies and sort keys in step."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="voter", email="voter@example.com", password="x"
+        )
+        article = Article.objects.create(title="Zebras", author=cls.user)
+        cls.comment = Comment.objects.create(
+            content_object=article, content="Nice", author=cls.user
+        )
+
+    def statements(self, vote_type):
+        """Return the statements cast_vote() runs, savepoints aside."""
+        with CaptureQueriesContext(connection) as queries:
+            cast_vote(self.comment, self.user, vote_type)
+        return [
+            query["sql"].split()[0]
+            for query in queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+
+    def tallies(self):
+        self.comment.refresh_from_db(
+            fields=["upvotes", "downvotes", "top_score"]
+        )
+        return self.comment.upvotes, self.comment.downvotes
+
+    def test_cast_change_repeat_and_withdraw(self):
+        self.assertIsNone(cast_vote(self.comment, self.user, "up"))
+        self.assertEqual(self.tallies(), (1, 0))
+        self.assertGreater(self.comment.top_score, 0)
+
+        self.assertEqual(cast_vote(self.comment, self.user, "down"), "up")
+        self.assertEqual(self.tallies(), (0, 1))
+        self.assertEqual(CommentVote.objects.get().vote_type, "down")
+
+        self.assertEqual(self.statements("down"), ["INSERT"])
+        self.assertEqual(self.tallies(), (0, 1))
+
+        self.assertEqual(cast_vote(self.comment, self.user, None), "down")
+        self.assertEqual(self.tallies(), (0, 0))
+        self.assertFalse(CommentVote.objects.exists())
+        self.assertIsNone(cast_vote(self.comment, self.user, None))
+        self.assertEqual(self.tallies(), (0, 0))
+
+    def test_statements(self):
+        # Upsert, counter update and rerank
+        self.assertEqual(self.statements("up"), ["INSERT", "UPDATE", "UPDATE"])
+        self.assertEqual(
+            self.statements("down"),
+            ["INSERT", "UPDATE", "UPDATE", "UPDATE"],
+        )
+        self.assertEqual(self.statements(None), ["DELETE", "UPDATE", "UPDATE"])
+
+    def test_model_saves_still_count(self):
+        vote = CommentVote.objects.create(
+            comment=self.comment, user=self.user, vote_type="up"
+        )
+        self.assertEqual(self.tallies(), (1, 0))
+        self.assertEqual(cast_vote(self.comment, self.user, "down"), "up")
+        self.assertEqual(self.tallies(), (0, 1))
+        CommentVote.objects.filter(pk=vote.pk).get().delete()
+        self.assertEqual(self.tallies(), (0, 0))
+
+    def test_vote_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f"/api/comments/comments/{self.comment.pk}/vote/"
+        response = client.post(url, {"vote_type": "up"}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            response.data,
+            {"vote_type": "up", "upvotes": 1, "downvotes": 0},
+        )
+        response = client.delete(url)
+        self.assertEqual(response.data["upvotes"], 0)
+
+
+class RankingTests(SimpleTestCase):
+    """Sort keys on known vote counts."""
+
+    def test_top_score(self):
+        # Wilson lower bounds at 95% confidence
+        cases = [
+            ((0, 0), 0.0),
+            ((1, 0), 0.2065433),
+            ((10, 0), 0.7224598),
+            ((80, 20), 0.7111690),
+            ((50, 50), 0.4038298),
+            ((0, 5), 0.0),
+        ]
+        for votes, expected in cases:
+            with self.subTest(votes=votes):
+                self.assertAlmostEqual(top_score(*votes), expected, places=6)
+        # More votes at the same ratio are more trustworthy.
+        self.assertGreater(top_score(100, 0), top_score(10, 0))
+        self.assertGreater(top_score(10, 0), top_score(1, 0))
+
+    def test_hot_score(self):
+        later = HOT_EPOCH + timedelta(seconds=HOT_DECAY)
+        cases = [
+            ((0, 0, HOT_EPOCH), 0.0),
+            ((1, 0, HOT_EPOCH), 0.0),
+            ((10, 0, HOT_EPOCH), 1.0),
+            ((0, 100, HOT_EPOCH), -2.0),
+            ((10, 0, later), 2.0),
+            ((3, 13, later), 0.0),
+        ]
+        for args, expected in cases:
+            with self.subTest(args=args):
+                self.assertAlmostEqual(hot_score(*args), expected)
+        # Ten times the net score makes up for HOT_DECAY seconds.
+        self.assertAlmostEqual(
+            hot_score(100, 0, HOT_EPOCH), hot_score(10, 0, later)
+        )
+
+
+class RerankTests(TestCase):
+    """The stored sort keys match the Python versions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="voter", email="voter@example.com", password="x"
+        )
+        cls.article = Article.objects.create(title="Zebras", author=cls.user)
+
+    def test_rerank(self):
+        comment = Comment.objects.create(
+            content_object=self.article, content="Nice", author=self.user
+        )
+        for upvotes, downvotes in [(0, 0), (1, 0), (80, 20), (3, 30)]:
+            with self.subTest(upvotes=upvotes, downvotes=downvotes):
+                Comment.objects.filter(pk=comment.pk).update(
+                    upvotes=upvotes, downvotes=downvotes
+                )
+                Comment.rerank(comment.pk)
+                comment.refresh_from_db()
+                self.assertAlmostEqual(
+                    comment.top_score, top_score(upvotes, downvotes)
+                )
+                self.assertAlmostEqual(
+                    comment.hot_score,
+                    hot_score(upvotes, downvotes, comment.created_at),
+                )
+
+
+class CommentTreeTests(TestCase):
+    """Thread paths and the nested tree endpoint."""
+
+    url = "/api/comments/comments/tree/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                username=f"reader{n}", email=f"reader{n}@example.com"
+            )
+            for n in range(3)
+        ]
+        cls.article = Article.objects.create(
+            title="Zebras", author=cls.users[0]
+        )
+        cls.content_type = ContentType.objects.get_for_model(Article)
+
+    def comment(self, parent=None, content="Nice"):
+        return Comment.objects.create(
+            content_object=self.article,
+            content=content,
+            author=self.users[0],
+            parent=parent,
+        )
+
+    def get(self, url=None, **params):
+        response = APIClient().get(url or self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data["results"]
+
+    def roots(self, **params):
+        return self.get(
+            content_type=self.content_type.pk,
+            object_id=self.article.pk,
+            **params,
+        )
+
+    def test_paths_and_depths(self):
+        root = self.comment()
+        first = self.comment(root)
+        second = self.comment(root)
+        nested = self.comment(first)
+        self.assertEqual(
+            [(c.depth, c.thread_id) for c in (root, first, second, nested)],
+            [(0, root.pk), (1, root.pk), (1, root.pk), (2, root.pk)],
+        )
+        self.assertTrue(nested.path.startswith(first.path))
+        self.assertEqual(len(nested.path), 3 * Comment.PATH_SEGMENT)
+        # Path order lists every comment before its replies, oldest first.
+        self.assertEqual(
+            list(
+                Comment.objects.filter(thread_id=root.pk)
+                .order_by("path")
+                .values_list("pk", flat=True)
+            ),
+            [root.pk, first.pk, nested.pk, second.pk],
+        )
+        other = self.comment()
+        self.assertEqual((other.thread_id, other.depth), (other.pk, 0))
+
+    def test_depth_limit_links_to_more(self):
+        chain = [self.comment()]
+        for _ in range(3):
+            chain.append(self.comment(chain[-1]))
+        [root] = self.roots(depth=1)
+        self.assertEqual(root["id"], str(chain[0].pk))
+        self.assertIsNone(root["more"])
+        [reply] = root["replies"]
+        self.assertEqual(
+            (reply["id"], reply["replies"]), (str(chain[1].pk), [])
+        )
+        query = parse_qs(urlsplit(reply["more"]).query)
+        self.assertEqual(query, {"parent": [str(chain[1].pk)], "depth": ["1"]})
+
+        [reply] = self.get(reply["more"])
+        self.assertEqual(reply["id"], str(chain[2].pk))
+        self.assertEqual(reply["replies"][0]["id"], str(chain[3].pk))
+        self.assertIsNone(reply["replies"][0]["more"])
+
+        [root] = self.roots(depth=0)
+        self.assertEqual(root["replies"], [])
+        self.assertIsNotNone(root["more"])
+
+    def test_ranked_tree(self):
+        root = self.comment()
+        replies = [self.comment(root, content=f"Reply {n}") for n in range(3)]
+        for user in self.users:
+            cast_vote(replies[2], user, "up")
+        cast_vote(replies[1], self.users[0], "up")
+        cast_vote(replies[0], self.users[0], "down")
+        self.comment(replies[0])
+
+        for ranking in ("top", "hot"):
+            with self.subTest(ordering=ranking):
+                [node] = self.roots(ordering=ranking, depth=1)
+                self.assertEqual(
+                    [reply["content"] for reply in node["replies"]],
+                    ["Reply 2", "Reply 1", "Reply 0"],
+                )
+                more = parse_qs(urlsplit(node["replies"][2]["more"]).query)
+                self.assertEqual(more["ordering"], [ranking])
+        [node] = self.roots(depth=1)
+        self.assertEqual(
+            [reply["content"] for reply in node["replies"]],
+            ["Reply 0", "Reply 1", "Reply 2"],
+        )
+        response = APIClient().get(
+            self.url,
+            {
+                "content_type": self.content_type.pk,
+                "object_id": self.article.pk,
+                "ordering": "new",
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_replies_stay_on_their_object(self):
+        root = self.comment()
+        reply = self.comment(root)
+        other = Article.objects.create(title="Okapis", author=self.users[0])
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        url = f"/api/comments/comments/{reply.pk}/"
+        for data in (
+            {"object_id": str(other.pk)},
+            {"content_type": ContentType.objects.get_for_model(User).pk},
+        ):
+            with self.subTest(data=data):
+                response = client.patch(url, data, format="json")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(data)), response.data)
+        response = client.patch(
+            url,
+            {"object_id": str(self.article.pk), "content": "Edited"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        reply.refresh_from_db()
+        self.assertEqual(
+            (reply.object_id, reply.content), (self.article.pk, "Edited")
+        )
+
+
+class ModerationTests(TestCase):
+    """Bulk moderation moves comments between statuses and counts them."""
+
+    url = "/api/comments/comments/bulk_moderate/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="reader", email="reader@example.com", password="x"
+        )
+        cls.staff = User.objects.create_user(
+            username="staff",
+            email="staff@example.com",
+            password="x",
+            is_staff=True,
+        )
+        cls.article = Article.objects.create(title="Zebras", author=cls.user)
+        cls.root = Comment.objects.create(
+            content_object=cls.article, content="Root", author=cls.user
+        )
+        cls.replies = [
+            Comment.objects.create(
+                content_object=cls.article,
+                content=f"Reply {n}",
+                author=cls.user,
+                parent=cls.root,
+            )
+            for n in range(4)
+        ]
+
+    def counts(self):
+        self.article.refresh_from_db()
+        self.root.refresh_from_db()
+        return self.article.comment_count, self.root.reply_count
+
+    def statuses(self):
+        return [
+            Comment.objects.get(pk=reply.pk).status for reply in self.replies
+        ]
+
+    def test_moderate(self):
+        self.assertEqual(self.counts(), (5, 4))
+        hidden = Comment.objects.filter(pk=self.replies[0].pk)
+        self.assertEqual(moderate(hidden, "hide"), 1)
+        self.assertEqual(self.counts(), (4, 3))
+        replies = Comment.objects.filter(parent=self.root)
+        # Comments already hidden are not counted again.
+        self.assertEqual(moderate(replies, "hide", chunk_size=2), 3)
+        self.assertEqual(self.statuses(), [Comment.Status.HIDDEN] * 4)
+        self.assertEqual(self.counts(), (1, 0))
+        self.assertEqual(moderate(replies, "hide"), 0)
+
+        first_two = replies.filter(
+            pk__in=[reply.pk for reply in self.replies[:2]]
+        )
+        self.assertEqual(moderate(first_two, "approve"), 2)
+        self.assertEqual(self.counts(), (3, 2))
+        self.assertEqual(moderate(first_two, "flag"), 2)
+        self.assertEqual(moderate(replies, "delete"), 4)
+        self.assertEqual(self.statuses(), [Comment.Status.DELETED] * 4)
+        self.assertEqual(self.counts(), (1, 0))
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        body = {"action": "flag", "ids": [str(self.replies[0].pk)]}
+        response = client.post(self.url, body, format="json")
+        self.assertEqual(response.status_code, 403)
+
+        client.force_authenticate(self.staff)
+        response = client.post(self.url, {"action": "flag"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        response = client.post(self.url, body, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        response = client.post(
+            self.url,
+            {"action": "hide", "status": Comment.Status.ACTIVE},
+            format="json",
+        )
+        self.assertEqual(
+            response.data,
+            {
+                "action": "hide",
+                "status": Comment.Status.HIDDEN,
+                "matched": 4,
+                "updated": 4,
+            },
+        )
+        self.assertEqual(
+            self.statuses(),
+            [Comment.Status.FLAGGED] + [Comment.Status.HIDDEN] * 3,
+        )
+        self.assertEqual(self.counts(), (0, 0))
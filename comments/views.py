@@ -1,23 +1,269 @@
-from rest_framework import viewsets, permissions, filters
+from urllib.parse import urlencode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Exists, OuterRef, Q
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 
+from core.fieldsets import SparseFieldsetFilter
+from core.values import ValuesListMixin
+from .filters import CommentOrderingFilter
+from .loaders import content_object_loader, user_vote_loader
 from .models import Comment
-from .serializers import CommentSerializer
+from .moderation import TRANSITIONS, moderate
+from .serializers import (
+    CommentModerationResultSerializer,
+    CommentModerationSerializer,
+    CommentSerializer,
+    CommentTreeSerializer,
+    CommentVoteSerializer,
+)
+from .votes import cast_vote
 from .serializers import ContentTypeSerializer
 from django.contrib.contenttypes.models import ContentType
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """ViewSet for Comment model."""
 
     queryset = Comment.objects.all().select_related("author", "content_type")
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [
+        DjangoFilterBackend,
+        CommentOrderingFilter,
+        SparseFieldsetFilter,
+    ]
     filterset_fields = ["author", "content_type", "object_id", "status"]
     ordering_fields = ["created_at", "updated_at"]
     ordering = ["-created_at"]
 
+    # Default and maximum number of reply levels returned by tree()
+    TREE_DEPTH = 3
+    MAX_TREE_DEPTH = 10
+
+    @extend_schema(
+        summary="Get a comment thread tree",
+        description=(
+            "Top-level comments on an object (`content_type` and "
+            "`object_id`, newest first) or the replies to a comment "
+            "(`parent`, oldest first), one page at a time, each with its "
+            "replies nested `depth` levels deep. Comments with replies "
+            "below that level carry a `more` link to fetch them. "
+            "`ordering=top` or `hot` ranks every level by votes instead."
+        ),
+        parameters=[
+            OpenApiParameter("content_type", int),
+            OpenApiParameter("object_id", str),
+            OpenApiParameter("parent", str),
+            OpenApiParameter("ordering", str, enum=["top", "hot"]),
+            OpenApiParameter(
+                "depth",
+                int,
+                description=(
+                    f"Reply levels to include (default {TREE_DEPTH}, "
+                    f"max {MAX_TREE_DEPTH})"
+                ),
+            ),
+        ],
+        responses=CommentTreeSerializer(many=True),
+    )
+    @action(detail=False, methods=["get"], filter_backends=[])
+    def tree(self, request):
+        """Get comments with their replies nested."""
+        params = request.query_params
+        try:
+            depth = int(params.get("depth", self.TREE_DEPTH))
+        except ValueError:
+            return Response(
+                {"error": "depth must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        depth = max(0, min(depth, self.MAX_TREE_DEPTH))
+        ranking = params.get("ordering")
+        if ranking and ranking not in CommentOrderingFilter.rankings:
+            return Response(
+                {"error": "ordering must be top or hot"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        sort_key = CommentOrderingFilter.rankings.get(ranking)
+
+        comments = Comment.objects.select_related("author").annotate(
+            has_replies=Exists(Comment.objects.filter(parent=OuterRef("pk")))
+        )
+        try:
+            if params.get("parent"):
+                parent = Comment.objects.filter(pk=params["parent"]).first()
+                if parent is None:
+                    return Response(
+                        {"error": "Comment not found"},
+                        status=status.HTTP_404_NOT_FOUND,
+                    )
+                roots = comments.filter(
+                    thread_id=parent.thread_id, parent=parent
+                ).order_by(sort_key or "path")
+            elif params.get("content_type") and params.get("object_id"):
+                roots = comments.filter(
+                    content_type_id=params["content_type"],
+                    object_id=params["object_id"],
+                    parent__isnull=True,
+                ).order_by(sort_key or "-created_at")
+            else:
+                return Response(
+                    {
+                        "error": (
+                            "Provide either parent or both content_type "
+                            "and object_id"
+                        )
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            page = self.paginate_queryset(roots)
+        except (ValidationError, ValueError):
+            return Response(
+                {"error": "Invalid comment or object id"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        nodes = {}
+        for root in page:
+            root.tree_replies = []
+            nodes[root.pk] = root
+        if page and depth:
+            # One range scan of the (thread_id, path) index per root:
+            # hex path segments sort before "g".
+            subtrees = Q()
+            for root in page:
+                subtrees |= Q(
+                    thread_id=root.thread_id,
+                    path__gt=root.path,
+                    path__lt=root.path + "g",
+                )
+            replies = comments.filter(
+                subtrees, depth__lte=page[0].depth + depth
+            ).order_by("thread_id", "path")
+            # Path order lists every parent before its replies.
+            for reply in replies:
+                reply.tree_replies = []
+                nodes[reply.parent_id].tree_replies.append(reply)
+                nodes[reply.pk] = reply
+
+        if sort_key:
+            field = sort_key.lstrip("-")
+            for node in nodes.values():
+                node.tree_replies.sort(
+                    key=lambda reply: (getattr(reply, field), reply.pk),
+                    reverse=True,
+                )
+        for node in nodes.values():
+            node.tree_more = None
+            if node.has_replies and not node.tree_replies:
+                query = {"parent": node.pk, "depth": depth}
+                if sort_key:
+                    query["ordering"] = ranking
+                node.tree_more = request.build_absolute_uri(
+                    f"{request.path}?{urlencode(query)}"
+                )
+        content_object_loader(request).resolve(list(nodes.values()))
+        user_vote_loader(request).load(nodes)
+
+        serializer = CommentTreeSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(
+        summary="Vote on a comment",
+        description=(
+            "POST sets the current user's vote (`up` or `down`), "
+            "replacing any earlier vote; DELETE or a null `vote_type` "
+            "withdraws it. Returns the comment's updated tallies."
+        ),
+        request=CommentVoteSerializer,
+        responses=CommentVoteSerializer,
+    )
+    @action(
+        detail=True,
+        methods=["post", "delete"],
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def vote(self, request, pk=None):
+        """Cast or withdraw the current user's vote on a comment."""
+        comment = self.get_object()
+        vote_type = None
+        if request.method == "POST":
+            serializer = CommentVoteSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            vote_type = serializer.validated_data["vote_type"]
+        cast_vote(comment, request.user, vote_type)
+        comment.refresh_from_db(fields=["upvotes", "downvotes"])
+        return Response(
+            {
+                "vote_type": vote_type,
+                "upvotes": comment.upvotes,
+                "downvotes": comment.downvotes,
+            }
+        )
+
+    @extend_schema(
+        summary="Moderate comments in bulk",
+        description=(
+            "Approve, hide, delete or flag every comment matching `ids` "
+            "and/or the filters. Comments are updated in chunks with "
+            "set-based updates; comments already in the target status "
+            "are left alone. Staff only."
+        ),
+        request=CommentModerationSerializer,
+        responses=CommentModerationResultSerializer,
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def bulk_moderate(self, request):
+        """Apply a moderation action to many comments at once."""
+        serializer = CommentModerationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        comments = Comment.objects.filter(**serializer.get_filters())
+        matched = comments.count()
+        action_name = serializer.validated_data["action"]
+        updated = moderate(comments, action_name)
+        return Response(
+            {
+                "action": action_name,
+                "status": TRANSITIONS[action_name],
+                "matched": matched,
+                "updated": updated,
+            }
+        )
+
+    @extend_schema(
+        summary="List flagged comments",
+        description="The moderation queue, newest first. Staff only.",
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[permissions.IsAdminUser],
+        filter_backends=[SparseFieldsetFilter],
+    )
+    def flagged(self, request):
+        """List comments waiting for moderation."""
+        # Served from the partial index on flagged comments.
+        queryset = self.filter_queryset(
+            self.get_queryset()
+            .filter(status=Comment.Status.FLAGGED)
+            .order_by("-created_at")
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class ContentTypeViewSet(viewsets.ReadOnlyModelViewSet):
     """List available ContentType entries (id, app_label, model).
@@ -26,6 +272,7 @@ class ContentTypeViewSet(viewsets.ReadOnlyModelViewSet):
     GenericForeignKey-based objects like comments.
     """
 
-    queryset = ContentType.objects.all()
+    queryset = ContentType.objects.order_by("app_label", "model")
     serializer_class = ContentTypeSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = PageNumberPagination
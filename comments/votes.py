@@ -0,0 +1,76 @@
+"""Casting votes on comments.
+
+``Comment.upvotes`` and ``Comment.downvotes`` are counter caches (see
+``core.counters``). ``cast_vote`` writes a vote with a single upsert (or
+delete) that also tells what the vote was before, and applies the
+matching ``F()`` deltas to the counters itself, so concurrent voters
+never overwrite each other's counts and the comment row is only locked
+for those one-column updates. Saving or deleting ``CommentVote``
+instances elsewhere (e.g. in the admin) keeps the counters in step
+through the counter signals instead.
+"""
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Comment, CommentVote
+
+# Counter of each vote type
+COUNTERS = {
+    CommentVote.VoteType.UP.value: "upvotes",
+    CommentVote.VoteType.DOWN.value: "downvotes",
+}
+
+
+def _column(name, value):
+    field = CommentVote._meta.get_field(name)
+    return field.column, field.get_db_prep_value(value, connection)
+
+
+def cast_vote(comment, user, vote_type):
+    """Set user's vote on comment to vote_type, or withdraw it (None).
+
+    Returns the vote type the user had before, or None.
+    """
+    table = connection.ops.quote_name(CommentVote._meta.db_table)
+    comment_column, comment_id = _column("comment", comment.pk)
+    user_column, user_id = _column("user", user.pk)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if vote_type is None:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {comment_column} = %s "
+                f"AND {user_column} = %s RETURNING vote_type",
+                [comment_id, user_id],
+            )
+            row = cursor.fetchone()
+            previous = row[0] if row else None
+        else:
+            _, created_at = _column("created_at", timezone.now())
+            # Only a changed vote is updated, and a row comes back only
+            # for an insert (which keeps the new created_at) or a change.
+            cursor.execute(
+                f"INSERT INTO {table} "
+                f"({comment_column}, {user_column}, vote_type, created_at) "
+                f"VALUES (%s, %s, %s, %s) "
+                f"ON CONFLICT ({comment_column}, {user_column}) "
+                f"DO UPDATE SET vote_type = EXCLUDED.vote_type "
+                f"WHERE {table}.vote_type <> EXCLUDED.vote_type "
+                f"RETURNING created_at = %s",
+                [comment_id, user_id, vote_type, created_at, created_at],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                previous = vote_type
+            elif row[0]:
+                previous = None
+            else:
+                # There are two vote types and this one changed.
+                (previous,) = set(COUNTERS) - {vote_type}
+        if previous != vote_type:
+            for old_or_new, delta in ((previous, -1), (vote_type, 1)):
+                if old_or_new is not None:
+                    Comment._meta.get_field(COUNTERS[old_or_new]).add(
+                        comment.pk, delta
+                    )
+            Comment.rerank(comment.pk, comment.created_at)
+    return previous
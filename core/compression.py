@@ -0,0 +1,129 @@
+"""Compression of long texts stored in text columns.
+
+A stored value is either the text itself or ``MARKER``, a codec letter
+and the base85-encoded compressed UTF-8 bytes::
+
+    "\\x1fz..."   zlib
+    "\\x1fd..."   zlib with a preset dictionary
+    "\\x1fx..."   lzma
+
+``MARKER`` (the ASCII unit separator) does not occur in ordinary text and
+not in base85 either, so plain and compressed values can share a column
+and be told apart by their first character; plain texts that do start
+with it are always compressed. Texts shorter than the threshold, or that
+would not get shorter, are stored as they are.
+
+Preset dictionaries help short texts that share boilerplate. They are
+files listed in ``COMPRESSION_DICTIONARIES``, the first of which is used
+for new values; zlib records the checksum of the dictionary a value was
+compressed with, so older dictionaries must stay listed while values
+compressed with them remain. ``train_dictionary`` builds one from sample
+texts.
+"""
+
+import base64
+import lzma
+import struct
+import zlib
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+
+MARKER = "\x1f"
+ZLIB = "z"
+ZLIB_DICTIONARY = "d"
+LZMA = "x"
+
+METHODS = ("zlib", "lzma")
+
+
+@lru_cache(maxsize=None)
+def get_dictionaries():
+    """Return the configured dictionaries, current one first."""
+    dictionaries = [
+        Path(path).read_bytes()
+        for path in getattr(settings, "COMPRESSION_DICTIONARIES", ())
+    ]
+    return [dictionary for dictionary in dictionaries if dictionary]
+
+
+def _dictionary(checksum):
+    for dictionary in get_dictionaries():
+        if zlib.adler32(dictionary) == checksum:
+            return dictionary
+    raise ValueError(f"Unknown compression dictionary {checksum:08x}")
+
+
+def is_compressed(value):
+    return bool(value) and value[0] == MARKER
+
+
+def compress(text, method="zlib", threshold=1024, dictionary=False):
+    """Return the stored form of text.
+
+    ``dictionary`` uses the current preset dictionary with zlib, if one
+    is configured.
+    """
+    escape = is_compressed(text)
+    if len(text) < threshold and not escape:
+        return text
+    data = text.encode()
+    if method == "lzma":
+        codec, payload = LZMA, lzma.compress(data)
+    elif dictionary and get_dictionaries():
+        compressor = zlib.compressobj(zdict=get_dictionaries()[0])
+        codec = ZLIB_DICTIONARY
+        payload = compressor.compress(data) + compressor.flush()
+    else:
+        codec, payload = ZLIB, zlib.compress(data)
+    stored = MARKER + codec + base64.b85encode(payload).decode("ascii")
+    if len(stored) >= len(text) and not escape:
+        return text
+    return stored
+
+
+def decompress(value):
+    """Return the text a stored value stands for."""
+    if not is_compressed(value):
+        return value
+    codec, payload = value[1], base64.b85decode(value[2:])
+    if codec == ZLIB:
+        data = zlib.decompress(payload)
+    elif codec == LZMA:
+        data = lzma.decompress(payload)
+    elif codec == ZLIB_DICTIONARY:
+        # The stream header carries the dictionary's Adler-32 checksum.
+        (checksum,) = struct.unpack(">I", payload[2:6])
+        decompressor = zlib.decompressobj(zdict=_dictionary(checksum))
+        data = decompressor.decompress(payload) + decompressor.flush()
+    else:
+        raise ValueError(f"Unknown compression codec {codec!r}")
+    return data.decode()
+
+
+def train_dictionary(samples, size=32768):
+    """Return a preset dictionary of lines common to the sample texts.
+
+    Lines found in at least two samples are ranked by how many bytes
+    they would save; zlib reaches the end of a dictionary most cheaply,
+    so the most valuable lines go last.
+    """
+    frequency = Counter()
+    for sample in samples:
+        frequency.update(set(sample.splitlines(keepends=True)))
+    candidates = [
+        (count * len(line.encode()), line.encode())
+        for line, count in frequency.items()
+        if count > 1 and line.strip()
+    ]
+    candidates.sort(reverse=True)
+    chosen = []
+    total = 0
+    for _, line in candidates:
+        if total + len(line) > size:
+            continue
+        chosen.append(line)
+        total += len(line)
+    return b"".join(reversed(chosen))
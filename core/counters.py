@@ -0,0 +1,335 @@
+"""Denormalized row counts ("counter caches").
+
+A ``CounterField`` on a model stores how many rows of another model point
+at it, optionally only those matching a condition::
+
+    class Article(CounterCacheMixin, BaseModel):
+        section_count = CounterField("wiki.Section", "article")
+        comment_count = CounterField(
+            "comments.Comment", "content_object", condition={"status": ...}
+        )
+
+The relation is a foreign key or a ``GenericForeignKey`` on the counted
+model. Saving and deleting counted instances applies ``F()`` deltas to
+the counters of the rows they leave and join, so concurrent writers never
+lose increments. ``update_counted()`` does the same for a set-based
+``update()``. Other bulk operations that bypass signals (``update()``,
+``bulk_create()``) and direct SQL are not tracked; the ``recount``
+management command repairs any drift. Decrements that would take a
+counter below zero are skipped and logged as drift.
+
+``CounterCacheMixin`` keeps full ``save()`` calls of the counting model
+from overwriting counters with stale in-memory values.
+"""
+
+import logging
+from collections import Counter
+
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.fields.related import lazy_related_operation
+from django.db.models.functions import Coalesce
+from django.db.models.signals import (
+    post_delete,
+    post_init,
+    post_save,
+    pre_save,
+)
+
+logger = logging.getLogger(__name__)
+
+# Every CounterField of every concrete model, in declaration order.
+counters = []
+
+# Snapshot marker for instances whose relation columns were deferred.
+UNKNOWN = object()
+
+
+class CounterField(models.PositiveIntegerField):
+    """Number of ``to`` rows whose ``relation`` points at this row."""
+
+    def __init__(self, to=None, relation=None, condition=None, **kwargs):
+        kwargs.setdefault("default", 0)
+        kwargs.setdefault("editable", False)
+        super().__init__(**kwargs)
+        self.to = to
+        self.relation = relation
+        self.condition = dict(condition or {})
+        self.source = None
+
+    def deconstruct(self):
+        # Migrations only need the column; the bookkeeping lives here.
+        name, _, args, kwargs = super().deconstruct()
+        return name, "django.db.models.PositiveIntegerField", args, kwargs
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super().contribute_to_class(cls, name, *args, **kwargs)
+        if cls._meta.abstract or self.to is None:
+            return
+        lazy_related_operation(self._connect, cls, self.to)
+
+    def _connect(self, model, source):
+        self.source = source
+        relation = source._meta.get_field(self.relation)
+        self.generic = isinstance(relation, GenericForeignKey)
+        if self.generic:
+            self.columns = (
+                source._meta.get_field(relation.ct_field).attname,
+                relation.fk_field,
+            )
+        else:
+            self.columns = (relation.attname,)
+        self.columns += tuple(self.condition)
+        self.snapshot_name = f"_counter_{model._meta.label_lower}_{self.name}"
+        self._content_type_id = None
+        uid = f"{self.snapshot_name}:{source._meta.label_lower}"
+        post_init.connect(self._post_init, sender=source, dispatch_uid=uid)
+        pre_save.connect(self._pre_save, sender=source, dispatch_uid=uid)
+        post_save.connect(self._post_save, sender=source, dispatch_uid=uid)
+        post_delete.connect(self._post_delete, sender=source, dispatch_uid=uid)
+        counters.append(self)
+
+    @property
+    def label(self):
+        return f"{self.model._meta.label}.{self.name}"
+
+    @property
+    def content_type_id(self):
+        if self._content_type_id is None:
+            self._content_type_id = ContentType.objects.get_for_model(
+                self.model
+            ).id
+        return self._content_type_id
+
+    # Bookkeeping -------------------------------------------------------
+
+    def target(self, values):
+        """Return the pk counted for a mapping of column values, or None."""
+        for name, value in self.condition.items():
+            if values[name] != value:
+                return None
+        if self.generic:
+            if values[self.columns[0]] != self.content_type_id:
+                return None
+            return values[self.columns[1]]
+        return values[self.columns[0]]
+
+    def _snapshot(self, instance):
+        state = instance.__dict__
+        if any(column not in state for column in self.columns):
+            return UNKNOWN
+        return self.target(state)
+
+    def _post_init(self, sender, instance, **kwargs):
+        instance.__dict__[self.snapshot_name] = self._snapshot(instance)
+
+    def _pre_save(self, sender, instance, raw=False, **kwargs):
+        if raw or instance._state.adding:
+            return
+        if instance.__dict__.get(self.snapshot_name, UNKNOWN) is UNKNOWN:
+            # Loaded with deferred relation columns: read the stored row.
+            values = (
+                sender._base_manager.filter(pk=instance.pk)
+                .values(*self.columns)
+                .first()
+            )
+            instance.__dict__[self.snapshot_name] = (
+                None if values is None else self.target(values)
+            )
+
+    def _post_save(self, sender, instance, created, raw=False, **kwargs):
+        if raw:
+            return
+        old = None if created else instance.__dict__[self.snapshot_name]
+        new = self.target(
+            {column: getattr(instance, column) for column in self.columns}
+        )
+        if old != new:
+            self.add(old, -1)
+            self.add(new, 1)
+        instance.__dict__[self.snapshot_name] = new
+
+    def _post_delete(self, sender, instance, origin=None, **kwargs):
+        old = instance.__dict__.get(self.snapshot_name, UNKNOWN)
+        if old is UNKNOWN:
+            old = self.target(
+                {column: getattr(instance, column) for column in self.columns}
+            )
+        # Rows deleted along with their counting row need no update.
+        if isinstance(origin, self.model) and origin.pk == old:
+            return
+        self.add(old, -1)
+
+    def add(self, pk, delta):
+        """Atomically add delta to the counter of row pk."""
+        self.add_many({pk: delta})
+
+    def add_many(self, deltas):
+        """Apply a mapping of pk to delta, one UPDATE per distinct delta."""
+        pks_by_delta = {}
+        for pk, delta in deltas.items():
+            if pk is not None and delta:
+                pks_by_delta.setdefault(delta, []).append(pk)
+        for delta, pks in pks_by_delta.items():
+            self._apply(
+                self.model._base_manager.filter(pk__in=pks), delta, len(pks)
+            )
+
+    def _apply(self, queryset, delta, expected=None):
+        """Add delta to the counters of queryset, never below zero."""
+        if delta > 0:
+            queryset.update(**{self.attname: F(self.attname) + delta})
+            return
+        updated = queryset.filter(**{f"{self.attname}__gte": -delta}).update(
+            **{self.attname: F(self.attname) + delta}
+        )
+        if expected is not None and updated == expected:
+            return
+        # Rows that exist but were not updated have drifted.
+        skipped = queryset.count() - updated
+        if skipped > 0:
+            logger.warning(
+                "%s: %d counters would drop below zero and were left "
+                "unchanged; run the recount command to repair them.",
+                self.label,
+                skipped,
+            )
+
+    # Recounting --------------------------------------------------------
+
+    def expected(self):
+        """Subquery expression computing the counter from scratch."""
+        rows = self.source._base_manager.filter(**self.condition)
+        if self.generic:
+            content_type, object_id = self.columns[:2]
+            rows = rows.filter(
+                **{
+                    content_type: self.content_type_id,
+                    object_id: OuterRef("pk"),
+                }
+            )
+            group = object_id
+        else:
+            rows = rows.filter(**{self.columns[0]: OuterRef("pk")})
+            group = self.columns[0]
+        rows = (
+            rows.order_by()
+            .values(group)
+            .annotate(total=Count("*"))
+            .values("total")
+        )
+        return Coalesce(Subquery(rows, output_field=models.IntegerField()), 0)
+
+
+class SubtreeCounterField(CounterField):
+    """Like ``CounterField``, but counting rows anywhere in a subtree.
+
+    ``ancestors`` is the lookup from the model to the ancestors of a row,
+    the row itself included (e.g. through a closure table). A change to
+    the rows counted for one node applies its delta to every ancestor in
+    a single ``UPDATE``. Moving a subtree is up to the tree code, which
+    knows the old and new ancestors.
+    """
+
+    def __init__(self, to=None, relation=None, ancestors=None, **kwargs):
+        super().__init__(to, relation, **kwargs)
+        self.ancestors = ancestors
+
+    def add_many(self, deltas):
+        # Ancestors shared by several rows need the sum of their deltas.
+        for pk, delta in deltas.items():
+            self.add(pk, delta)
+
+    def add(self, pk, delta):
+        if pk is None or not delta:
+            return
+        manager = self.model._base_manager
+        self._apply(
+            manager.filter(
+                pk__in=manager.filter(pk=pk).values(self.ancestors)
+            ),
+            delta,
+        )
+
+    def expected(self):
+        if self.generic:
+            raise NotImplementedError(
+                "Subtree counters need a foreign key relation."
+            )
+        rows = (
+            self.source._base_manager.filter(**self.condition)
+            .filter(**{f"{self.relation}__{self.ancestors}": OuterRef("pk")})
+            .order_by()
+            .annotate(group=models.Value(1))
+            .values("group")
+            .annotate(total=Count("*"))
+            .values("total")
+        )
+        return Coalesce(Subquery(rows, output_field=models.IntegerField()), 0)
+
+
+class CounterCacheMixin:
+    """Leave counter columns out of full saves of existing rows.
+
+    Counters change under concurrent ``F()`` updates, so writing back the
+    value loaded with the instance would undo other requests' changes.
+    Other columns maintained the same way are listed in ``atomic_fields``.
+    """
+
+    atomic_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+            and not args
+            and not self._state.adding
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and not isinstance(field, CounterField)
+                and field.name not in self.atomic_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+def update_counted(queryset, **values):
+    """``queryset.update(**values)`` that keeps counters in step.
+
+    The rows are locked and read first, so the deltas match exactly what
+    the update changed. Counted columns in values must be given by
+    attname (``parent_id``) and as plain values, not expressions. Returns
+    the number of rows updated.
+    """
+    model = queryset.model
+    tracked = [
+        counter
+        for counter in counters
+        if counter.source._meta.concrete_model is model._meta.concrete_model
+    ]
+    columns = {column for counter in tracked for column in counter.columns}
+    with transaction.atomic():
+        rows = list(
+            queryset.select_for_update().values("pk", *sorted(columns))
+        )
+        if not rows:
+            return 0
+        updated = model._base_manager.filter(
+            pk__in=[row["pk"] for row in rows]
+        ).update(**values)
+        for counter in tracked:
+            deltas = Counter()
+            for row in rows:
+                old = counter.target(row)
+                new = counter.target({**row, **values})
+                if old != new:
+                    deltas[old] -= 1
+                    deltas[new] += 1
+            counter.add_many(deltas)
+    return updated
@@ -0,0 +1,46 @@
+"""Line-based deltas between two versions of a text.
+
+A delta is a compact JSON array turning a base text into a new one. An
+integer pair ``[start, end]`` copies lines ``start`` to ``end`` of the
+base (line endings included), a string inserts itself::
+
+    >>> make_delta("a\\nb\\nc\\n", "a\\nB\\nc\\n")
+    '[[0,1],"B\\\\n",[2,3]]'
+
+Lines are split with ``str.splitlines(keepends=True)``, so applying a
+delta reproduces the new text exactly, whatever its line endings.
+"""
+
+import json
+from difflib import SequenceMatcher
+
+
+def make_delta(base, text):
+    """Return the delta turning base into text."""
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    matcher = SequenceMatcher(None, base_lines, lines, autojunk=False)
+    ops = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j1 < j2:
+            inserted = "".join(lines[j1:j2])
+            if ops and isinstance(ops[-1], str):
+                ops[-1] += inserted
+            else:
+                ops.append(inserted)
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+
+
+def apply_delta(base, delta):
+    """Return the text a delta made against base stands for."""
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            start, end = op
+            parts.extend(base_lines[start:end])
+    return "".join(parts)
@@ -0,0 +1,225 @@
+"""Line and word diffs with Myers' algorithm in linear space.
+
+``opcodes(a, b)`` compares two sequences of hashable items (lines,
+words) and returns ``difflib``-style opcodes. Items found on one side
+only are set aside and the common prefix and suffix trimmed; the rest is
+searched for a shortest edit script with the divide-and-conquer variant
+of Myers' O(ND) algorithm, which needs memory linear in the input
+instead of proportional to N×D. Where the two sides of a region differ
+in more than ``max_cost`` items the search gives up and reports the
+region as replaced, which bounds the time spent on unrelated texts at
+O((N + M) × max_cost).
+"""
+
+import re
+
+# Edit distance beyond which a region is reported as replaced.
+MAX_COST = 1000
+
+WORD_RE = re.compile(r"\s+|\w+|[^\w\s]")
+
+
+def words(text):
+    """Split text into words, whitespace runs and punctuation."""
+    return WORD_RE.findall(text)
+
+
+def opcodes(a, b, max_cost=MAX_COST):
+    """Return ``(tag, i1, i2, j1, j2)`` tuples turning a into b.
+
+    Tags are "equal", "replace", "delete" and "insert", as returned by
+    ``difflib.SequenceMatcher.get_opcodes()``.
+    """
+    # Comparing small integers is faster than comparing long lines.
+    codes = {}
+    a = [codes.setdefault(item, len(codes)) for item in a]
+    b = [codes.setdefault(item, len(codes)) for item in b]
+    # Items found on one side only never match; leaving them out makes
+    # rewritten passages cheap to compare.
+    shared = set(a).intersection(b)
+    a_index = [i for i, code in enumerate(a) if code in shared]
+    b_index = [j for j, code in enumerate(b) if code in shared]
+    found = []
+    _match(
+        [a[i] for i in a_index],
+        [b[j] for j in b_index],
+        0,
+        0,
+        len(a_index),
+        len(b_index),
+        max_cost,
+        found,
+    )
+    matches = []
+    for i, j, size in found:
+        for offset in range(size):
+            _add(matches, a_index[i + offset], b_index[j + offset], 1)
+    matches.append((len(a), len(b), 0))
+
+    result = []
+    i = j = 0
+    for ai, bj, size in matches:
+        if i < ai and j < bj:
+            result.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            result.append(("delete", i, ai, j, j))
+        elif j < bj:
+            result.append(("insert", i, i, j, bj))
+        if size:
+            result.append(("equal", ai, ai + size, bj, bj + size))
+        i, j = ai + size, bj + size
+    return result
+
+
+def _match(a, b, left, top, right, bottom, max_cost, matches):
+    """Append the matching blocks of ``a[left:right]``, ``b[top:bottom]``."""
+    # Common prefix and suffix are matched without searching.
+    start = left
+    while left < right and top < bottom and a[left] == b[top]:
+        left += 1
+        top += 1
+    if left > start:
+        _add(matches, start, top - (left - start), left - start)
+    end_a = right
+    while left < right and top < bottom and a[right - 1] == b[bottom - 1]:
+        right -= 1
+        bottom -= 1
+    if left < right and top < bottom:
+        snake = _middle_snake(a, b, left, top, right, bottom, max_cost)
+        if snake is not None:
+            (x1, y1), (x2, y2) = snake
+            # The snake is a diagonal with at most one edit at either
+            # end, which the prefix and suffix matching settles.
+            _match(a, b, left, top, x1, y1, max_cost, matches)
+            _match(a, b, x1, y1, x2, y2, max_cost, matches)
+            _match(a, b, x2, y2, right, bottom, max_cost, matches)
+    if end_a > right:
+        _add(matches, right, bottom, end_a - right)
+
+
+def _add(matches, i, j, size):
+    if matches:
+        last_i, last_j, last_size = matches[-1]
+        if last_i + last_size == i and last_j + last_size == j:
+            matches[-1] = (last_i, last_j, last_size + size)
+            return
+    matches.append((i, j, size))
+
+
+def _middle_snake(a, b, left, top, right, bottom, max_cost):
+    """Return the middle snake of a shortest path through the box.
+
+    The snake runs from ``(x1, y1)`` to ``(x2, y2)``, and the paths of
+    the boxes before and after it are half as long as the whole. Returns
+    None when the edit distance exceeds max_cost.
+    """
+    width = right - left
+    height = bottom - top
+    delta = width - height
+    odd = delta % 2
+    limit = (width + height + 1) // 2
+    if limit > max_cost:
+        limit = max_cost
+    # Furthest x (forward) and y (backward) reached on each diagonal;
+    # negative diagonals index from the end of the lists.
+    forward = [0] * (2 * limit + 3)
+    backward = [0] * (2 * limit + 3)
+    forward[1] = left
+    backward[1] = bottom
+    for d in range(limit + 1):
+        for k in range(d, -d - 1, -2):
+            c = k - delta
+            if k == -d or (k != d and forward[k - 1] < forward[k + 1]):
+                px = x = forward[k + 1]
+            else:
+                px = forward[k - 1]
+                x = px + 1
+            y = top + (x - left) - k
+            py = y if d == 0 or x != px else y - 1
+            while x < right and y < bottom and a[x] == b[y]:
+                x += 1
+                y += 1
+            forward[k] = x
+            if odd and -(d - 1) <= c <= d - 1 and y >= backward[c]:
+                return (px, py), (x, y)
+        for c in range(d, -d - 1, -2):
+            k = c + delta
+            if c == -d or (c != d and backward[c - 1] > backward[c + 1]):
+                py = y = backward[c + 1]
+            else:
+                py = backward[c - 1]
+                y = py - 1
+            x = left + (y - top) + k
+            px = x if d == 0 or y != py else x + 1
+            while x > left and y > top and a[x - 1] == b[y - 1]:
+                x -= 1
+                y -= 1
+            backward[c] = y
+            if not odd and -d <= k <= d and x <= forward[k]:
+                return (x, y), (px, py)
+    return None
+
+
+def grouped(codes, context=3):
+    """Split opcodes into hunks with up to context equal items around.
+
+    Like ``difflib.SequenceMatcher.get_grouped_opcodes()``, but without
+    any hunk when nothing changed.
+    """
+    codes = list(codes)
+    if not any(tag != "equal" for tag, *_ in codes):
+        return []
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+    hunks = []
+    hunk = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            hunk.append((tag, i1, i1 + context, j1, j1 + context))
+            hunks.append(hunk)
+            hunk = []
+            i1, j1 = i2 - context, j2 - context
+        hunk.append((tag, i1, i2, j1, j2))
+    if hunk and not (len(hunk) == 1 and hunk[0][0] == "equal"):
+        hunks.append(hunk)
+    return hunks
+
+
+def unified(a, b, codes, context=3, fromfile="", tofile=""):
+    """Return a unified diff of the lines a and b (with line endings)."""
+    output = [f"--- {fromfile}\n", f"+++ {tofile}\n"]
+    for hunk in grouped(codes, context):
+        first, last = hunk[0], hunk[-1]
+        output.append(
+            f"@@ -{_range(first[1], last[2])} "
+            f"+{_range(first[3], last[4])} @@\n"
+        )
+        for tag, i1, i2, j1, j2 in hunk:
+            if tag == "equal":
+                output.extend(_lines(" ", a[i1:i2]))
+                continue
+            output.extend(_lines("-", a[i1:i2]))
+            output.extend(_lines("+", b[j1:j2]))
+    return "".join(output) if len(output) > 2 else ""
+
+
+def _range(start, stop):
+    # Unified diff ranges are 1-based; empty ones name the line before.
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    if not length:
+        start -= 1
+    return f"{start + 1},{length}"
+
+
+def _lines(prefix, lines):
+    for line in lines:
+        if line.endswith(("\n", "\r")):
+            yield prefix + line
+        else:
+            yield f"{prefix}{line}\n\\ No newline at end of file\n"
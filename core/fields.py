@@ -0,0 +1,123 @@
+"""Model fields shared across apps."""
+
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.functions import Length
+
+from .compression import MARKER, METHODS, compress, decompress
+
+
+class CompressedTextField(models.TextField):
+    """A ``TextField`` whose long values are stored compressed.
+
+    Values of at least ``threshold`` characters are compressed with
+    ``method`` ("zlib" or "lzma"; see core.compression) when saved and
+    decompressed when rows are read, including ``values()`` rows. The
+    column stays a text column holding plain and compressed values side
+    by side, so the field can replace a ``TextField`` without rewriting
+    the table; ``recompress()`` converts existing rows in batches.
+
+    Exact lookups still work. Pattern lookups (``contains``,
+    ``icontains``, ``startswith``...) and database functions only see
+    the stored form, so they miss compressed values.
+    """
+
+    def __init__(
+        self, *args, threshold=1024, method="zlib", dictionary=False, **kwargs
+    ):
+        if method not in METHODS:
+            raise ValueError(f"Unknown compression method {method!r}")
+        self.threshold = threshold
+        self.method = method
+        self.dictionary = dictionary
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.threshold != 1024:
+            kwargs["threshold"] = self.threshold
+        if self.method != "zlib":
+            kwargs["method"] = self.method
+        if self.dictionary:
+            kwargs["dictionary"] = True
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return decompress(value) if value is not None else None
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        return compress(
+            value,
+            method=self.method,
+            threshold=self.threshold,
+            dictionary=self.dictionary,
+        )
+
+
+def recompress(model, names, batch_size=500, expand=False):
+    """Compress the long plain values of fields in batches.
+
+    Each batch is locked, rewritten and committed on its own, so the
+    table stays available to readers and writers, who handle both forms.
+    ``expand`` stores every value plain instead, e.g. before replacing
+    the fields with ``TextField`` again. Returns the rows rewritten.
+    """
+    fields = [model._meta.get_field(name) for name in names]
+    lengths = {}
+    pending = Q()
+    for field in fields:
+        compressed = Q(**{f"{field.attname}__startswith": MARKER})
+        if expand:
+            pending |= compressed
+        else:
+            length = f"_{field.attname}_length"
+            lengths[length] = Length(field.attname)
+            pending |= Q(**{f"{length}__gte": field.threshold}) & ~compressed
+    queryset = (
+        model._base_manager.alias(**lengths).filter(pending).order_by("pk")
+    )
+    total = 0
+    last = None
+    while True:
+        with transaction.atomic():
+            batch = queryset if last is None else queryset.filter(pk__gt=last)
+            rows = list(
+                batch.select_for_update().only(
+                    "pk", *(field.attname for field in fields)
+                )[:batch_size]
+            )
+            if not rows:
+                return total
+            if expand:
+                for row in rows:
+                    # Plain text values bypass the field's compression.
+                    model._base_manager.filter(pk=row.pk).update(
+                        **{
+                            field.attname: models.Value(
+                                getattr(row, field.attname),
+                                output_field=models.TextField(),
+                            )
+                            for field in fields
+                        }
+                    )
+            else:
+                model._base_manager.bulk_update(
+                    rows, [field.attname for field in fields]
+                )
+        last = rows[-1].pk
+        total += len(rows)
+
+
+def compressed_fields():
+    """Return every ``CompressedTextField`` of the installed models."""
+    from django.apps import apps
+
+    return [
+        field
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, CompressedTextField)
+    ]
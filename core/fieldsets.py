@@ -0,0 +1,270 @@
+"""Sparse fieldsets (``?fields=``) and inline expansion (``?expand=``).
+
+Serializers using ``SparseFieldsetMixin`` drop unrequested fields and
+replace expanded relations with nested representations on safe requests.
+``SparseFieldsetFilter`` turns the same parameters into ``only()``,
+``select_related()``, ``prefetch_related()`` and annotations, so columns
+and relations the response does not need are never read.
+
+Serializers describe what they need in ``Meta``:
+
+``expandable_fields``
+    Maps a relation field to the serializer (class or dotted path) used
+    when it is expanded.
+``field_requirements``
+    Maps a field whose needs cannot be derived from its ``source`` (method
+    fields, counts) to a dict with any of ``only``, ``select_related``,
+    ``prefetch_related`` and ``annotate``.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def parse_names(request, param):
+    """Return the comma-separated names in a query parameter, or None."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin implementing ``?fields=`` and ``?expand=``."""
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def _requested(self, param):
+        if not self._is_root():
+            return None
+        return parse_names(self.context.get("request"), param)
+
+    @classmethod
+    def _expandable(cls):
+        return getattr(cls.Meta, "expandable_fields", {})
+
+    @classmethod
+    def _expansion(cls, name):
+        serializer_class = cls._expandable()[name]
+        if isinstance(serializer_class, str):
+            serializer_class = import_string(serializer_class)
+        return serializer_class
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self._requested(FIELDS_PARAM)
+        expand = (self._requested(EXPAND_PARAM) or set()) & set(
+            self._expandable()
+        )
+        if requested is not None:
+            fields = {
+                name: field
+                for name, field in fields.items()
+                if name in requested or name in expand
+            }
+        for name in expand:
+            # Expandable relations need not be listed in Meta.fields.
+            source = fields[name].source if name in fields else None
+            source = source or name
+            relation = _model_field(self.Meta.model, source)
+            many = bool(
+                relation and (relation.one_to_many or relation.many_to_many)
+            )
+            kwargs = {"source": source} if source != name else {}
+            fields[name] = self._expansion(name)(
+                many=many, read_only=True, **kwargs
+            )
+        return fields
+
+    @classmethod
+    def _plan(cls, model, fields=None, expand=None):
+        """Return ``(only, restrict, select, prefetch, annotate)``."""
+        expand = (expand or set()) & set(cls._expandable())
+        declared = cls(context={}).get_fields()
+        for name in expand - set(declared):
+            declared[name] = serializers.ReadOnlyField()
+        if fields is not None:
+            declared = {
+                name: field
+                for name, field in declared.items()
+                if name in fields or name in expand
+            }
+        requirements = getattr(cls.Meta, "field_requirements", {})
+
+        only = {model._meta.pk.name}
+        restrict = fields is not None
+        select = set()
+        prefetch = {}
+        annotate = {}
+        for name, field in declared.items():
+            if field.write_only:
+                continue
+            if name in requirements:
+                needs = requirements[name]
+                only.update(needs.get("only", ()))
+                for path in needs.get("select_related", ()):
+                    select.add(path)
+                    only.add(path.split("__")[0])
+                for path in needs.get("prefetch_related", ()):
+                    prefetch.setdefault(path, path)
+                annotate.update(needs.get("annotate", {}))
+                continue
+            # Fields are unbound here, so a missing source means the name.
+            source = field.source or name
+            if source == "*":
+                restrict = False
+                continue
+            attrs = source.split(".")
+            relation = _model_field(model, attrs[0])
+            if relation is None:
+                # A property or method: its inputs are unknown.
+                restrict = False
+                continue
+            if name in expand:
+                nested = cls._expansion(name)
+                related_model = relation.related_model
+                optimized = issubclass(nested, SparseFieldsetMixin)
+                _, _, nested_select, nested_prefetch, nested_annotate = (
+                    nested._plan(related_model)
+                    if optimized
+                    else (None, None, (), (), None)
+                )
+                if (
+                    relation.one_to_many
+                    or relation.many_to_many
+                    or nested_annotate
+                ):
+                    # Annotations cannot follow a join, so load the related
+                    # rows with their own optimized query instead.
+                    prefetch[attrs[0]] = (
+                        Prefetch(
+                            attrs[0],
+                            queryset=nested.optimize_queryset(
+                                related_model._default_manager.all()
+                            ),
+                        )
+                        if optimized
+                        else attrs[0]
+                    )
+                    if relation.concrete:
+                        only.add(attrs[0])
+                    continue
+                # Follow the nested serializer's own forward relations.
+                select.add(attrs[0])
+                select.update(f"{attrs[0]}__{path}" for path in nested_select)
+                for path in nested_prefetch:
+                    if isinstance(path, str):
+                        path = f"{attrs[0]}__{path}"
+                        prefetch.setdefault(path, path)
+            elif len(attrs) > 1 and relation.is_relation:
+                if relation.many_to_one or relation.one_to_one:
+                    select.add(attrs[0])
+                else:
+                    prefetch.setdefault(attrs[0], attrs[0])
+                    continue
+            if relation.concrete:
+                only.add(attrs[0])
+        return only, restrict, select, prefetch, annotate
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fields=None, expand=None, keep=()):
+        """Apply the loading plan for the requested fields to queryset.
+
+        ``keep`` names extra model fields that must be loaded, such as
+        the columns a paginator orders by.
+        """
+        only, restrict, select, prefetch, annotate = cls._plan(
+            queryset.model, fields, expand
+        )
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if annotate:
+            queryset = queryset.annotate(**annotate)
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch.values())
+        if restrict:
+            queryset = queryset.only(*sorted(only | set(keep)))
+        return queryset
+
+
+class SparseFieldsetFilter(BaseFilterBackend):
+    """Load only what the serializer will render for this request.
+
+    Place it last in ``filter_backends`` so that the final ordering is
+    known and its columns stay loaded.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if request.method not in SAFE_METHODS:
+            return queryset
+        serializer_class = view.get_serializer_class()
+        if not issubclass(serializer_class, SparseFieldsetMixin):
+            return queryset
+        keep = set()
+        order_by = queryset.query.order_by or (
+            queryset.model._meta.ordering
+            if queryset.query.default_ordering
+            else ()
+        )
+        for item in order_by:
+            if isinstance(item, str):
+                name = item.lstrip("-").split("__")[0]
+                field = _model_field(queryset.model, name)
+                if field is not None and field.concrete:
+                    keep.add(name)
+        return serializer_class.optimize_queryset(
+            queryset,
+            parse_names(request, FIELDS_PARAM),
+            parse_names(request, EXPAND_PARAM),
+            keep,
+        )
+
+    def get_schema_operation_parameters(self, view):
+        serializer_class = view.get_serializer_class()
+        expandable = ", ".join(
+            sorted(getattr(serializer_class.Meta, "expandable_fields", {}))
+        )
+        parameters = [
+            {
+                "name": FIELDS_PARAM,
+                "required": False,
+                "in": "query",
+                "description": "Comma-separated fields to include.",
+                "schema": {"type": "string"},
+            }
+        ]
+        if expandable:
+            parameters.append(
+                {
+                    "name": EXPAND_PARAM,
+                    "required": False,
+                    "in": "query",
+                    "description": (
+                        "Comma-separated relations to inline: "
+                        f"{expandable}."
+                    ),
+                    "schema": {"type": "string"},
+                }
+            )
+        return parameters
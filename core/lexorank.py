@@ -0,0 +1,65 @@
+"""Lexicographic ("lexorank") ordering keys.
+
+Keys are strings over ``0-9a-z`` that sort in the intended order, so an
+item can be placed between two neighbours by giving it a key between
+theirs, without touching any other row. Keys never end in ``"0"``, which
+guarantees that a key between any two distinct keys exists; repeated
+inserts at the same spot make keys longer, and ``spread()`` hands out
+fresh, short keys when a list is rewritten anyway.
+
+The alphabet is limited to digits and lowercase letters so that
+database collations other than ``C`` order keys the same way.
+"""
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+
+def _validate(key):
+    if not key or key[-1] == DIGITS[0] or set(key) - set(DIGITS):
+        raise ValueError(f"Invalid ordering key {key!r}")
+
+
+def _midpoint(low, high):
+    # low < high; low may be "" and high None (unbounded).
+    if high is not None:
+        prefix = 0
+        while (low[prefix] if prefix < len(low) else DIGITS[0]) == high[
+            prefix
+        ]:
+            prefix += 1
+        if prefix:
+            return high[:prefix] + _midpoint(low[prefix:], high[prefix:])
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else BASE
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit + 1) // 2]
+    if high is not None and len(high) > 1:
+        return high[:1]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def rank_between(low=None, high=None):
+    """Return a key sorting after low and before high (None: unbounded)."""
+    for key in (low, high):
+        if key is not None:
+            _validate(key)
+    if low is not None and high is not None and low >= high:
+        raise ValueError(f"{low!r} does not sort before {high!r}")
+    return _midpoint(low or "", high)
+
+
+def spread(count):
+    """Return count evenly spaced keys of the shortest length possible."""
+    length = 1
+    while BASE**length <= count:
+        length += 1
+    keys = []
+    for position in range(1, count + 1):
+        value = position * BASE**length // (count + 1)
+        digits = []
+        for _ in range(length):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        keys.append("".join(reversed(digits)).rstrip(DIGITS[0]))
+    return keys
@@ -0,0 +1,60 @@
+"""A thread-safe least-recently-used cache bounded by total value size.
+
+Each value costs ``size(value)`` (its length by default). Storing a value
+evicts the least recently used entries until the total fits within
+``max_size``; values larger than the whole cache are not stored at all.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Map keys to values, forgetting the least recently used first."""
+
+    def __init__(self, max_size, size=len):
+        self.max_size = max_size
+        self.size = size
+        self.total = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the value cached for key and mark it recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        """Cache value for key."""
+        cost = self.size(value)
+        with self._lock:
+            self._pop(key)
+            if cost > self.max_size:
+                return
+            self._entries[key] = (value, cost)
+            self.total += cost
+            while self.total > self.max_size:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total -= evicted
+
+    def discard(self, key):
+        """Forget the value cached for key, if any."""
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total = 0
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total -= entry[1]
@@ -0,0 +1,118 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+from core.compression import compress, decompress, get_dictionaries
+from core.fields import compressed_fields
+
+from .compress_texts import field_label
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the storage and latency of compression settings on a "
+        "sample of the values of compressed text fields (read-only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=1000,
+            help="Values sampled per field (default: 1000).",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=int,
+            default=None,
+            help="Compression threshold (default: each field's own).",
+        )
+        parser.add_argument(
+            "fields",
+            nargs="*",
+            help="Fields as app_label.Model.field (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        available = {
+            field_label(field).lower(): field for field in compressed_fields()
+        }
+        unknown = {label.lower() for label in options["fields"]} - set(
+            available
+        )
+        if unknown:
+            raise CommandError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        candidates = [("none", None, False), ("zlib", "zlib", False)]
+        if get_dictionaries():
+            candidates.append(("zlib+dict", "zlib", True))
+        candidates.append(("lzma", "lzma", False))
+
+        for label in options["fields"] or sorted(available):
+            field = available[label.lower()]
+            self._benchmark(field, candidates, options)
+
+    def _benchmark(self, field, candidates, options):
+        model = field.model
+        values = list(
+            model._base_manager.order_by("-pk").values_list(
+                field.attname, flat=True
+            )[: max(1, options["sample"])]
+        )
+        if not values:
+            self.stdout.write(f"{field_label(field)}: no rows.")
+            return
+        threshold = options["threshold"] or field.threshold
+        plain = sum(len(value.encode()) for value in values)
+        stored = model._base_manager.aggregate(
+            total=Sum(Length(field.attname))
+        )["total"]
+        self.stdout.write(
+            f"{field_label(field)}: {len(values)} values, "
+            f"{plain / len(values):,.0f} bytes on average; whole column "
+            f"stores {stored or 0:,} characters now"
+        )
+
+        for name, method, dictionary in candidates:
+            started = time.perf_counter()
+            if method is None:
+                encoded = values
+            else:
+                encoded = [
+                    compress(value, method, threshold, dictionary)
+                    for value in values
+                ]
+            compress_time = time.perf_counter() - started
+            started = time.perf_counter()
+            for value in encoded:
+                decompress(value)
+            decompress_time = time.perf_counter() - started
+            size = sum(len(value.encode()) for value in encoded)
+            self.stdout.write(
+                f"  {name:<10} {size:>12,} bytes  ratio "
+                f"{plain / size if size else 1:5.2f}x  compress "
+                f"{compress_time / len(values) * 1e6:8.1f} us  decompress "
+                f"{decompress_time / len(values) * 1e6:8.1f} us"
+            )
+
+        # Reading the sample back includes decompressing what is stored.
+        pks = list(
+            model._base_manager.order_by("-pk").values_list("pk", flat=True)[
+                : len(values)
+            ]
+        )
+        timings = []
+        for _ in range(5):
+            started = time.perf_counter()
+            list(
+                model._base_manager.filter(pk__in=pks).values_list(
+                    field.attname, flat=True
+                )
+            )
+            timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f"  reading the sample as stored: "
+            f"{statistics.median(timings) * 1000:.2f} ms"
+        )
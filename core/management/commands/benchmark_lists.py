@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+
+from comments.views import CommentViewSet
+from wiki.views import ArticleViewSet, RevisionViewSet
+
+VIEWSETS = {
+    "articles": ArticleViewSet,
+    "revisions": RevisionViewSet,
+    "comments": CommentViewSet,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time list endpoints rendered by their serializers against the "
+        "values() fast path, on the current database (read-only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=100,
+            help="Rows per page (default: 100, the maximum).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Timed requests per mode (default: 20).",
+        )
+        parser.add_argument(
+            "--query",
+            default="",
+            help="Extra query string, e.g. 'fields=id,title'.",
+        )
+        parser.add_argument(
+            "endpoints",
+            nargs="*",
+            help=f"Any of {', '.join(sorted(VIEWSETS))} (default: all).",
+        )
+
+    def _time(self, viewset, fast, url, repeat):
+        view = viewset.as_view({"get": "list"}, values_list_enabled=fast)
+        factory = APIRequestFactory()
+        timings = []
+        rows = 0
+        for _ in range(repeat + 1):
+            request = factory.get(url)
+            started = time.perf_counter()
+            response = view(request)
+            response.render()
+            timings.append(time.perf_counter() - started)
+            rows = len(response.data["results"])
+        # The first request warms caches and is not counted.
+        return statistics.median(timings[1:]) * 1000, rows
+
+    def handle(self, *args, **options):
+        query = f"page_size={options['page_size']}"
+        if options["query"]:
+            query += f"&{options['query']}"
+        unknown = set(options["endpoints"]) - set(VIEWSETS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(unknown)}")
+        for name in options["endpoints"] or sorted(VIEWSETS):
+            url = f"/{name}/?{query}"
+            slow, rows = self._time(
+                VIEWSETS[name], False, url, options["repeat"]
+            )
+            fast, _ = self._time(VIEWSETS[name], True, url, options["repeat"])
+            self.stdout.write(
+                f"{name:<10} {rows:>4} rows  serializer {slow:8.2f} ms  "
+                f"values() {fast:8.2f} ms  speedup {slow / fast:5.2f}x"
+            )
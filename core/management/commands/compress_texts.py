@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.fields import compressed_fields, recompress
+
+
+def field_label(field):
+    return f"{field.model._meta.label}.{field.name}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compress the long values of compressed text fields (see "
+        "core.fields) stored before the field was introduced or its "
+        "threshold lowered, in batches, while the site keeps running."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows rewritten per transaction (default: 500).",
+        )
+        parser.add_argument(
+            "--expand",
+            action="store_true",
+            help="Store every value plain instead, e.g. before downgrading.",
+        )
+        parser.add_argument(
+            "fields",
+            nargs="*",
+            help="Fields as app_label.Model.field (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        available = {
+            field_label(field).lower(): field for field in compressed_fields()
+        }
+        selected = []
+        for label in options["fields"]:
+            field = available.get(label.lower())
+            if field is None:
+                raise CommandError(
+                    f"Unknown compressed field {label!r}; choose from "
+                    f"{', '.join(sorted(available))}."
+                )
+            selected.append(field)
+
+        batch_size = max(1, options["batch_size"])
+        for field in selected or available.values():
+            rewritten = recompress(
+                field.model,
+                [field.name],
+                batch_size=batch_size,
+                expand=options["expand"],
+            )
+            self.stdout.write(
+                f"{field_label(field)}: Rewrote {rewritten} rows."
+            )
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from core.counters import counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute denormalized counters (see core.counters) from the "
+        "counted rows and fix those that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows fixed per UPDATE (default: 1000).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted counters without changing them.",
+        )
+        parser.add_argument(
+            "counters",
+            nargs="*",
+            help="Counters as app_label.Model.field (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        available = {counter.label.lower(): counter for counter in counters}
+        selected = []
+        for label in options["counters"]:
+            counter = available.get(label.lower())
+            if counter is None:
+                raise CommandError(
+                    f"Unknown counter {label!r}; choose from "
+                    f"{', '.join(sorted(available))}."
+                )
+            selected.append(counter)
+
+        batch_size = max(1, options["batch_size"])
+        for counter in selected or counters:
+            fixed = self._recount(
+                counter, batch_size, dry_run=options["dry_run"]
+            )
+            verb = "Found" if options["dry_run"] else "Fixed"
+            self.stdout.write(f"{counter.label}: {verb} {fixed} rows.")
+
+    def _recount(self, counter, batch_size, dry_run):
+        model = counter.model
+        stale = (
+            model._base_manager.annotate(expected=counter.expected())
+            .exclude(**{counter.attname: F("expected")})
+            .values_list("pk", flat=True)
+        )
+        pks = list(stale.iterator(chunk_size=batch_size))
+        if dry_run:
+            return len(pks)
+        for start in range(0, len(pks), batch_size):
+            # The subquery is re-evaluated inside the UPDATE, so rows
+            # counted concurrently since the scan are still correct.
+            with transaction.atomic():
+                model._base_manager.filter(
+                    pk__in=pks[start : start + batch_size]
+                ).update(**{counter.attname: counter.expected()})
+        return len(pks)
@@ -0,0 +1,65 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.compression import train_dictionary
+from core.fields import compressed_fields
+
+from .compress_texts import field_label
+
+
+class Command(BaseCommand):
+    help = (
+        "Build a preset zlib dictionary from recent values of compressed "
+        "text fields. List the file first in COMPRESSION_DICTIONARIES to "
+        "compress new values of fields with dictionary=True with it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Path of the dictionary file.")
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=2000,
+            help="Values sampled per field (default: 2000).",
+        )
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=32768,
+            help="Dictionary size in bytes (default: 32768, zlib's window).",
+        )
+        parser.add_argument(
+            "fields",
+            nargs="*",
+            help="Fields as app_label.Model.field (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        available = {
+            field_label(field).lower(): field for field in compressed_fields()
+        }
+        samples = []
+        for label in options["fields"] or sorted(available):
+            field = available.get(label.lower())
+            if field is None:
+                raise CommandError(f"Unknown compressed field {label!r}.")
+            samples.extend(
+                field.model._base_manager.order_by("-pk").values_list(
+                    field.attname, flat=True
+                )[: max(1, options["sample"])]
+            )
+        output = Path(options["output"])
+        if output.exists():
+            raise CommandError(
+                f"{output} exists; values compressed with a dictionary "
+                "need it to be read back, so pick a new path."
+            )
+        dictionary = train_dictionary(samples, size=options["size"])
+        if not dictionary:
+            raise CommandError("The sampled values share no lines.")
+        output.write_bytes(dictionary)
+        self.stdout.write(
+            f"Wrote a {len(dictionary):,} byte dictionary from "
+            f"{len(samples)} values to {output}."
+        )
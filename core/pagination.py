@@ -0,0 +1,268 @@
+"""Keyset ("seek") pagination for list endpoints.
+
+Instead of ``COUNT(*)`` plus ``OFFSET``, each page is fetched with a
+``WHERE (ordering columns) > (last row's values)`` condition on the
+queryset's current ordering, completed with the primary key as a
+tiebreak. The cost of a page therefore does not depend on its depth, as
+long as a composite index matches the ordering.
+
+Cursors are opaque, URL-safe base64 strings. Orderings must name fields
+or annotations (plain ``F()`` expressions included); other expressions
+raise ``ImproperlyConfigured``. Collections that are small enough for
+page numbers, or ordered by expressions, can opt in with
+``pagination_class = PageNumberPagination``.
+"""
+
+import base64
+import binascii
+import datetime
+import decimal
+import json
+import uuid
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import (
+    FieldDoesNotExist,
+    ImproperlyConfigured,
+    ValidationError,
+)
+from django.db.models import F, OrderBy, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """Opaque-cursor pagination over the queryset ordering plus ``pk``."""
+
+    cursor_query_param = "cursor"
+    cursor_query_description = "The pagination cursor value."
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    page_size_query_description = "Number of results to return per page."
+    max_page_size = 100
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        self.base_url = request.build_absolute_uri()
+        position, reverse = self.decode_cursor(queryset.model, request)
+
+        order_by = [
+            ("-" if descending != reverse else "") + name
+            for name, descending in self.ordering
+        ]
+        queryset = queryset.order_by(*order_by)
+        if position is not None:
+            queryset = queryset.filter(self.seek(position, reverse))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        # Moving backwards, the cursor row itself is still ahead of us.
+        has_next = has_more if not reverse else position is not None
+        has_previous = has_more if reverse else position is not None
+        self.next_position = (
+            self.position(results[-1]) if has_next and results else None
+        )
+        self.previous_position = (
+            self.position(results[0]) if has_previous and results else None
+        )
+        # An empty page reached backwards: restart from the beginning.
+        self.restart = reverse and not results
+        return results
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        """Return ``[(field, descending), ...]`` ending with the pk."""
+        order_by = list(queryset.query.order_by) or (
+            list(queryset.model._meta.ordering)
+            if queryset.query.default_ordering
+            else []
+        )
+        pk_name = queryset.model._meta.pk.name
+        ordering = []
+        for item in order_by:
+            if isinstance(item, F):
+                item = item.asc()
+            if isinstance(item, str) and item != "?":
+                name, descending = item.lstrip("-"), item.startswith("-")
+            elif (
+                isinstance(item, OrderBy)
+                and isinstance(item.expression, F)
+                and not item.nulls_first
+                and not item.nulls_last
+            ):
+                name, descending = item.expression.name, item.descending
+            else:
+                raise ImproperlyConfigured(
+                    f"Keyset pagination cannot order by {item!r}; use "
+                    "field names or opt into page-number pagination."
+                )
+            ordering.append((pk_name if name == "pk" else name, descending))
+        if not any(name == pk_name for name, _ in ordering):
+            descending = ordering[0][1] if ordering else False
+            ordering.append((pk_name, descending))
+        return ordering
+
+    def seek(self, position, reverse):
+        """Build the condition selecting rows after position."""
+        clauses = []
+        for i, (name, descending) in enumerate(self.ordering):
+            lookup = "lt" if descending != reverse else "gt"
+            equal = {n: v for (n, _), v in zip(self.ordering[:i], position)}
+            clauses.append(Q(**equal, **{f"{name}__{lookup}": position[i]}))
+        # The leading range lets the database seek in the index before
+        # evaluating the expanded comparison.
+        name, descending = self.ordering[0]
+        bound = "lte" if descending != reverse else "gte"
+        return Q(**{f"{name}__{bound}": position[0]}) & reduce(or_, clauses)
+
+    def position(self, row):
+        values = []
+        for name, _ in self.ordering:
+            if isinstance(row, dict):
+                value = row[name]
+            else:
+                value = reduce(getattr, name.split("__"), row)
+            values.append(_encode_value(value))
+        return values
+
+    def _field(self, model, name):
+        field = None
+        for part in name.split("__"):
+            if model is None:
+                return None
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                # Annotations (e.g. search_rank) round-trip as JSON.
+                return None
+            model = field.related_model
+        return field
+
+    def decode_cursor(self, model, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            payload = json.loads(
+                base64.urlsafe_b64decode(encoded.encode("ascii"))
+            )
+            reverse = bool(payload["r"])
+            raw = payload["p"]
+            if len(raw) != len(self.ordering):
+                raise ValueError
+            position = []
+            for (name, _), value in zip(self.ordering, raw):
+                field = self._field(model, name)
+                if value is None:
+                    raise ValueError
+                if field is not None:
+                    field = getattr(field, "target_field", field)
+                    value = field.to_python(value)
+                position.append(value)
+        except (
+            binascii.Error,
+            KeyError,
+            TypeError,
+            UnicodeEncodeError,
+            ValidationError,
+            ValueError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps(
+            {"p": position, "r": int(reverse)}, separators=(",", ":")
+        )
+        encoded = base64.urlsafe_b64encode(payload.encode("utf-8"))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode("ascii")
+        )
+
+    def get_next_link(self):
+        if self.restart:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        parameters = [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": self.cursor_query_description,
+                "schema": {"type": "string"},
+            }
+        ]
+        if self.page_size_query_param:
+            parameters.append(
+                {
+                    "name": self.page_size_query_param,
+                    "required": False,
+                    "in": "query",
+                    "description": self.page_size_query_description,
+                    "schema": {"type": "integer"},
+                }
+            )
+        return parameters
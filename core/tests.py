@@ -1,3 +1,804 @@
-from django.test import TestCase
+import base64
+import difflib
+import json
+import random
+from io import StringIO
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from comments.models import Comment
+from comments.views import CommentViewSet
+from comments.votes import cast_vote
+from wiki.models import Article, Category, Section
+from wiki.search.backends import BaseSearchBackend
+from wiki.serializers import ArticleSerializer
+from wiki.views import ArticleViewSet
+
+from . import diff
+from .counters import update_counted
+from .delta import apply_delta, make_delta
+from .hyperloglog import UNION_BATCH, HyperLogLog
+from .lexorank import DIGITS, rank_between, spread
+from .lru import LRUCache
+from .pagination import KeysetPagination
+from .values import RowMapper
+
+User = get_user_model()
+
+
+class CounterTests(TestCase):
+    """Counter caches follow saves, deletes and set-based updates."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="writer", email="writer@example.com", password="x"
+        )
+
+    def article(self, title="Zebras", **kwargs):
+        return Article.objects.create(title=title, author=self.user, **kwargs)
+
+    def comment(self, target, **kwargs):
+        return Comment.objects.create(
+            content_object=target, content="Nice", author=self.user, **kwargs
+        )
+
+    def counts(self, instance, *names):
+        instance.refresh_from_db(fields=names)
+        return tuple(getattr(instance, name) for name in names)
+
+    def test_create_move_and_delete(self):
+        first, second = self.article("First"), self.article("Second")
+        section = Section.objects.create(article=first, title="Intro")
+        Section.objects.create(article=first, title="Body")
+        self.assertEqual(self.counts(first, "section_count"), (2,))
+
+        section.article = second
+        section.save()
+        self.assertEqual(self.counts(first, "section_count"), (1,))
+        self.assertEqual(self.counts(second, "section_count"), (1,))
+
+        section.delete()
+        self.assertEqual(self.counts(second, "section_count"), (0,))
+
+    def test_deferred_relation_is_read_before_save(self):
+        first, second = self.article("First"), self.article("Second")
+        Section.objects.create(article=first, title="Intro")
+        section = Section.objects.only("id", "title").get()
+        section.article_id = second.pk
+        section.save()
+        self.assertEqual(self.counts(first, "section_count"), (0,))
+        self.assertEqual(self.counts(second, "section_count"), (1,))
+
+    def test_generic_relation_and_condition(self):
+        article = self.article()
+        comment = self.comment(article)
+        reply = self.comment(article, parent=comment)
+        self.assertEqual(self.counts(article, "comment_count"), (2,))
+        self.assertEqual(self.counts(comment, "reply_count"), (1,))
+
+        reply.status = Comment.Status.HIDDEN
+        reply.save()
+        self.assertEqual(self.counts(article, "comment_count"), (1,))
+        self.assertEqual(self.counts(comment, "reply_count"), (0,))
+
+        reply.status = Comment.Status.ACTIVE
+        reply.save()
+        self.assertEqual(self.counts(comment, "reply_count"), (1,))
+
+        # Comments on other models do not count towards the article.
+        self.comment(self.user)
+        self.assertEqual(self.counts(article, "comment_count"), (2,))
+
+    def test_full_save_keeps_concurrent_counts(self):
+        article = self.article()
+        stale = Article.objects.get(pk=article.pk)
+        Section.objects.create(article=article, title="Intro")
+        stale.title = "Renamed"
+        stale.save()
+        self.assertEqual(self.counts(article, "section_count"), (1,))
+
+    def test_update_counted(self):
+        article = self.article()
+        comments = [self.comment(article) for _ in range(3)]
+        updated = update_counted(
+            Comment.objects.filter(pk__in=[c.pk for c in comments[:2]]),
+            status=Comment.Status.HIDDEN,
+        )
+        self.assertEqual(updated, 2)
+        self.assertEqual(self.counts(article, "comment_count"), (1,))
+        self.assertEqual(
+            update_counted(Comment.objects.none(), status="hidden"), 0
+        )
+
+    def test_subtree_counter(self):
+        root = Category.objects.create(name="Animals")
+        child = Category.objects.create(name="Horses", parent=root)
+        article = self.article(category=child, status="published")
+        self.assertEqual(self.counts(root, "subtree_published_count"), (1,))
+        self.assertEqual(self.counts(child, "article_count"), (1,))
+
+        article.status = "draft"
+        article.save()
+        self.assertEqual(self.counts(root, "subtree_published_count"), (0,))
+        self.assertEqual(self.counts(child, "subtree_published_count"), (0,))
+
+    def test_drift_is_logged_not_applied(self):
+        article = self.article()
+        section = Section.objects.create(article=article, title="Intro")
+        Article.objects.filter(pk=article.pk).update(section_count=0)
+        with self.assertLogs("core.counters", "WARNING") as logs:
+            section.delete()
+        self.assertIn("wiki.Article.section_count", logs.output[0])
+        self.assertEqual(self.counts(article, "section_count"), (0,))
+
+    def test_recount(self):
+        article = self.article()
+        Section.objects.create(article=article, title="Intro")
+        self.comment(article)
+        Article.objects.filter(pk=article.pk).update(
+            section_count=7, comment_count=0
+        )
+
+        out = StringIO()
+        call_command(
+            "recount", "wiki.Article.section_count", "--dry-run", stdout=out
+        )
+        self.assertIn(
+            "wiki.Article.section_count: Found 1 rows.", out.getvalue()
+        )
+        self.assertEqual(self.counts(article, "section_count"), (7,))
+
+        call_command("recount", stdout=StringIO())
+        self.assertEqual(
+            self.counts(article, "section_count", "comment_count"), (1, 1)
+        )
+
+
+class LexorankTests(SimpleTestCase):
+    """Ordering keys sort between their neighbours and never end in 0."""
+
+    def assertValidKey(self, key, low=None, high=None):
+        self.assertTrue(key)
+        self.assertNotEqual(key[-1], "0")
+        self.assertFalse(set(key) - set(DIGITS))
+        if low is not None:
+            self.assertLess(low, key)
+        if high is not None:
+            self.assertLess(key, high)
+
+    def test_unbounded(self):
+        key = rank_between()
+        self.assertValidKey(key)
+        self.assertValidKey(rank_between(key, None), low=key)
+        self.assertValidKey(rank_between(None, key), high=key)
+
+    def test_adjacent_keys(self):
+        for low, high in [("1", "2"), ("a", "b"), ("az", "b"), ("1", "11")]:
+            self.assertValidKey(rank_between(low, high), low, high)
+        self.assertValidKey(rank_between(None, "1"), high="1")
+        self.assertValidKey(rank_between(None, "01"), high="01")
+        self.assertValidKey(rank_between("z", None), low="z")
+        self.assertValidKey(rank_between("zz", None), low="zz")
+
+    def test_repeated_inserts_at_one_spot(self):
+        for low, high in [("1", "2"), ("a", None), (None, "a")]:
+            keys = [low, high]
+            for _ in range(200):
+                # Always insert right after the lower bound.
+                key = rank_between(keys[0], keys[1])
+                self.assertValidKey(key, keys[0], keys[1])
+                keys[1] = key
+            for _ in range(200):
+                # And right before the upper bound.
+                key = rank_between(keys[0], keys[1])
+                self.assertValidKey(key, keys[0], keys[1])
+                keys[0] = key
+
+    def test_invalid_keys(self):
+        for low, high in [("10", None), (None, ""), ("A", None), ("b", "a")]:
+            with self.assertRaises(ValueError):
+                rank_between(low, high)
+        with self.assertRaises(ValueError):
+            rank_between("a", "a")
+
+    def test_spread(self):
+        self.assertEqual(spread(0), [])
+        for count in (1, 2, 35, 36, 1000):
+            keys = spread(count)
+            self.assertEqual(len(keys), count)
+            self.assertEqual(keys, sorted(set(keys)))
+            for key in keys:
+                self.assertValidKey(key)
+            length = 1 if count < len(DIGITS) else 2
+            self.assertLessEqual(max(map(len, keys)), length)
+
+
+class DeltaTests(SimpleTestCase):
+    """Deltas rebuild the new text exactly from the base."""
+
+    def assertRoundTrip(self, base, text):
+        delta = make_delta(base, text)
+        self.assertEqual(apply_delta(base, delta), text)
+        return delta
+
+    def test_round_trip(self):
+        base = "".join(f"Line {number}\n" for number in range(20))
+        pairs = [
+            (base, base),
+            (base, base.replace("Line 7", "Line seven")),
+            (base, "New first line\n" + base + "New last line\n"),
+            (base, base.replace("Line 3\nLine 4\n", "")),
+            (base, "Something else entirely\n"),
+            ("", base),
+            (base, ""),
+            ("", ""),
+        ]
+        for base_text, text in pairs:
+            with self.subTest(base=base_text[:20], text=text[:20]):
+                self.assertRoundTrip(base_text, text)
+
+    def test_line_endings(self):
+        pairs = [
+            ("a\nb\nc", "a\nb\nc\n"),
+            ("a\nb\nc\n", "a\nb\nc"),
+            ("a\r\nb\r\n", "a\nb\r\n"),
+            ("a\rb\r", "a\rB\rb\r"),
+            ("über\n", "über\nnaïve ✓\n"),
+        ]
+        for base, text in pairs:
+            with self.subTest(base=base, text=text):
+                self.assertRoundTrip(base, text)
+
+    def test_unchanged_lines_are_copied(self):
+        self.assertEqual(
+            make_delta("a\nb\nc\n", "a\nB\nc\n"), '[[0,1],"B\\n",[2,3]]'
+        )
+        self.assertEqual(make_delta("a\n", "a\n"), "[[0,1]]")
+
+
+class LRUCacheTests(SimpleTestCase):
+    """The cache keeps recently used values within its size budget."""
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(10)
+        cache.set("a", "aaaa")
+        cache.set("b", "bbbb")
+        self.assertEqual(cache.get("a"), "aaaa")
+        cache.set("c", "cccc")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), ("aaaa", "cccc"))
+        self.assertEqual((len(cache), cache.total), (2, 8))
+
+        cache.set("d", "dddddddddd")
+        self.assertEqual((len(cache), cache.total), (1, 10))
+        self.assertEqual(cache.get("d"), "dddddddddd")
+
+    def test_replacing_and_oversized_values(self):
+        cache = LRUCache(10)
+        cache.set("a", "aaaa")
+        cache.set("a", "aa")
+        self.assertEqual((cache.get("a"), cache.total), ("aa", 2))
+        cache.set("b", "b")
+        # Too large to keep: dropped, along with the old value.
+        cache.set("a", "a" * 11)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual((cache.get("b"), cache.total), ("b", 1))
+
+    def test_discard_clear_and_size(self):
+        cache = LRUCache(100, size=lambda value: value["cost"])
+        cache.set("a", {"cost": 60})
+        cache.set("b", {"cost": 30})
+        cache.discard("a")
+        cache.discard("missing")
+        self.assertEqual((len(cache), cache.total), (1, 30))
+        self.assertEqual(cache.get("a", "default"), "default")
+        cache.set("c", {"cost": 70})
+        self.assertEqual(len(cache), 2)
+        cache.clear()
+        self.assertEqual((len(cache), cache.total), (0, 0))
+        self.assertIsNone(cache.get("b"))
+
+
+class DiffTests(SimpleTestCase):
+    """Opcodes are valid, minimal and grouped like difflib's."""
+
+    def assertValid(self, a, b, codes):
+        # The opcodes cover both sides in order and rebuild b from a.
+        i = j = 0
+        rebuilt = []
+        for tag, i1, i2, j1, j2 in codes:
+            self.assertEqual((i1, j1), (i, j))
+            if tag == "equal":
+                self.assertEqual(a[i1:i2], b[j1:j2])
+                rebuilt.extend(a[i1:i2])
+            else:
+                self.assertEqual(tag == "delete", j1 == j2)
+                self.assertEqual(tag == "insert", i1 == i2)
+                rebuilt.extend(b[j1:j2])
+            i, j = i2, j2
+        self.assertEqual((i, j), (len(a), len(b)))
+        self.assertEqual(rebuilt, list(b))
+
+    def matched(self, codes):
+        return sum(i2 - i1 for tag, i1, i2, _, _ in codes if tag == "equal")
+
+    def longest_common(self, a, b):
+        lengths = [0] * (len(b) + 1)
+        for x in a:
+            previous = 0
+            for j, y in enumerate(b, 1):
+                previous, lengths[j] = lengths[j], (
+                    previous + 1 if x == y else max(lengths[j], lengths[j - 1])
+                )
+        return lengths[-1]
+
+    def test_random_sequences(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            a = rng.choices("abcdef", k=rng.randrange(30))
+            b = rng.choices("abcdef", k=rng.randrange(30))
+            if rng.random() < 0.5:
+                # Mostly similar sides, like two versions of a text
+                b = a[:]
+                for _ in range(rng.randrange(5)):
+                    b.insert(rng.randrange(len(b) + 1), rng.choice("xyz"))
+                    if b:
+                        del b[rng.randrange(len(b))]
+            codes = diff.opcodes(a, b)
+            self.assertValid(a, b, codes)
+            # A shortest edit script, never longer than difflib's
+            matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+            self.assertEqual(self.matched(codes), self.longest_common(a, b))
+            self.assertGreaterEqual(
+                self.matched(codes), self.matched(matcher.get_opcodes())
+            )
+
+    def test_same_opcodes_as_difflib_for_simple_edits(self):
+        a = [f"line {n}\n" for n in range(10)]
+        cases = [
+            ([], []),
+            ([], a),
+            (a, []),
+            (a, a),
+            (a, a[:3] + ["new\n"] + a[3:]),
+            (a, a[:3] + a[5:]),
+            (a, a[:3] + ["changed\n"] + a[4:]),
+        ]
+        for old, new in cases:
+            with self.subTest(old=len(old), new=len(new)):
+                matcher = difflib.SequenceMatcher(None, old, new)
+                self.assertEqual(
+                    diff.opcodes(old, new),
+                    [tuple(code) for code in matcher.get_opcodes()],
+                )
+
+    def test_max_cost(self):
+        a, b = list("abcd"), list("dcba")
+        self.assertEqual(
+            diff.opcodes(a, b, max_cost=1), [("replace", 0, 4, 0, 4)]
+        )
+        codes = diff.opcodes(a, b)
+        self.assertValid(a, b, codes)
+        self.assertEqual(self.matched(codes), 1)
+
+        # The common prefix and suffix are matched regardless.
+        a, b = list("xabcdy"), list("xdcbay")
+        self.assertEqual(
+            diff.opcodes(a, b, max_cost=1),
+            [
+                ("equal", 0, 1, 0, 1),
+                ("replace", 1, 5, 1, 5),
+                ("equal", 5, 6, 5, 6),
+            ],
+        )
+
+    def test_grouped_like_difflib(self):
+        rng = random.Random(11)
+        for _ in range(200):
+            a = [f"{n}\n" for n in range(rng.randrange(1, 40))]
+            b = a[:]
+            for _ in range(rng.randrange(1, 4)):
+                b[rng.randrange(len(b))] = "changed\n"
+            matcher = difflib.SequenceMatcher(None, a, b)
+            codes = matcher.get_opcodes()
+            for context in (0, 1, 3):
+                expected = list(matcher.get_grouped_opcodes(context))
+                if a == b:
+                    expected = []
+                self.assertEqual(
+                    diff.grouped(codes, context),
+                    [[tuple(code) for code in hunk] for hunk in expected],
+                )
+
+    def test_grouped_hunk_boundaries(self):
+        a = [f"{n}\n" for n in range(20)]
+        b = a[:]
+        b[2] = b[9] = b[13] = "changed\n"
+        hunks = diff.grouped(diff.opcodes(a, b), context=2)
+        # Six equal lines split the first change off; three do not.
+        self.assertEqual(
+            [(hunk[0][1], hunk[-1][2]) for hunk in hunks], [(0, 5), (7, 16)]
+        )
+        # Exactly 2 * context equal lines between changes stay in one hunk.
+        b = a[:]
+        b[5] = b[10] = "changed\n"
+        hunks = diff.grouped(diff.opcodes(a, b), context=2)
+        self.assertEqual(
+            [(hunk[0][1], hunk[-1][2]) for hunk in hunks], [(3, 13)]
+        )
+        self.assertEqual(diff.grouped(diff.opcodes(a, a)), [])
+        self.assertEqual(diff.grouped([]), [])
+
+    def test_unified(self):
+        a = [f"line {n}\n" for n in range(12)]
+        b = a[:1] + ["new\n"] + a[1:8] + a[9:]
+        codes = diff.opcodes(a, b)
+        self.assertEqual(
+            diff.unified(a, b, codes, fromfile="v1", tofile="v2"),
+            "".join(difflib.unified_diff(a, b, "v1", "v2")),
+        )
+        self.assertEqual(diff.unified(a, a, diff.opcodes(a, a)), "")
+
+    def test_unified_without_trailing_newline(self):
+        a = "one\ntwo".splitlines(keepends=True)
+        b = "one\nthree".splitlines(keepends=True)
+        self.assertEqual(
+            diff.unified(a, b, diff.opcodes(a, b), fromfile="a", tofile="b"),
+            "--- a\n+++ b\n@@ -1,2 +1,2 @@\n one\n"
+            "-two\n\\ No newline at end of file\n"
+            "+three\n\\ No newline at end of file\n",
+        )
+        b = "one\ntwo\n".splitlines(keepends=True)
+        self.assertEqual(
+            diff.opcodes(a, b),
+            [("equal", 0, 1, 0, 1), ("replace", 1, 2, 1, 2)],
+        )
+
+
+class HyperLogLogTests(SimpleTestCase):
+    """Sketches estimate distinct counts and merge into unions."""
+
+    def sketch(self, values, precision=12):
+        sketch = HyperLogLog(precision)
+        sketch.update(f"viewer:{value}" for value in values)
+        return sketch
+
+    def test_estimates(self):
+        self.assertEqual(HyperLogLog().count(), 0)
+        for count in (1, 10, 100):
+            self.assertAlmostEqual(
+                self.sketch(range(count)).count(), count, delta=1
+            )
+        for count in (5000, 50000):
+            # The standard error is 1.6%; allow three of them.
+            self.assertAlmostEqual(
+                self.sketch(range(count)).count(), count, delta=count * 0.05
+            )
+        low = self.sketch(range(20000), precision=6).count()
+        self.assertAlmostEqual(low, 20000, delta=20000 * 0.4)
+
+    def test_duplicates_do_not_count(self):
+        sketch = self.sketch(range(1000))
+        registers = sketch.registers.copy()
+        sketch.update(f"viewer:{value}" for value in range(1000))
+        self.assertTrue((sketch.registers == registers).all())
+
+    def test_merge_and_union(self):
+        first = self.sketch(range(0, 30000))
+        second = self.sketch(range(20000, 50000))
+        expected = self.sketch(range(50000))
+        union = HyperLogLog.union([first, second.to_bytes()])
+        self.assertTrue((union.registers == expected.registers).all())
+        first.merge(second)
+        self.assertTrue((first.registers == expected.registers).all())
+
+        parts = [self.sketch(range(n, 30000, 600)) for n in range(600)]
+        self.assertGreater(len(parts), UNION_BATCH)
+        union = HyperLogLog.union(part.to_bytes() for part in parts)
+        self.assertTrue(
+            (union.registers == self.sketch(range(30000)).registers).all()
+        )
+
+    def test_bytes_round_trip(self):
+        sketch = self.sketch(range(100), precision=10)
+        data = sketch.to_bytes()
+        self.assertLess(len(data), 1024)
+        copy = HyperLogLog.from_bytes(data)
+        self.assertEqual(copy.precision, 10)
+        self.assertTrue((copy.registers == sketch.registers).all())
+
+    def test_precision_mismatch(self):
+        with self.assertRaises(ValueError):
+            HyperLogLog(12).merge(HyperLogLog(10))
+        with self.assertRaises(ValueError):
+            HyperLogLog.union([HyperLogLog(10).to_bytes()])
+        with self.assertRaises(ValueError):
+            HyperLogLog(3)
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages follow the ordering, in both directions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="writer", email="writer@example.com", password="x"
+        )
+        titles = ["Okapi", "Beta", "Beta", "Beta", "Zebra", "Ant", "Gnu"]
+        for number, title in enumerate(titles):
+            Article.objects.create(
+                title=title, slug=f"article-{number}", author=cls.user
+            )
+
+    def paginate(self, queryset, url="/articles/?page_size=2"):
+        paginator = KeysetPagination()
+        request = Request(APIRequestFactory().get(url))
+        page = paginator.paginate_queryset(queryset, request)
+        return (
+            [article.pk for article in page],
+            paginator.get_next_link(),
+            paginator.get_previous_link(),
+        )
+
+    def walk(self, queryset, url="/articles/?page_size=2"):
+        """Return every page forwards, then every page backwards."""
+        forwards, backwards = [], []
+        link = url
+        while link:
+            page, link, previous = self.paginate(queryset, link)
+            forwards.append(page)
+        link = previous
+        while link:
+            page, _, link = self.paginate(queryset, link)
+            backwards.append(page)
+        return forwards, backwards
+
+    def assertWalks(self, queryset, expected, size=2):
+        forwards, backwards = self.walk(
+            queryset, f"/articles/?page_size={size}"
+        )
+        pages = [
+            expected[start : start + size]
+            for start in range(0, len(expected), size)
+        ]
+        self.assertEqual(forwards, pages)
+        self.assertEqual(backwards, pages[-2::-1])
+
+    def test_forward_and_backward(self):
+        expected = Article.objects.order_by("title", "pk")
+        self.assertWalks(
+            Article.objects.order_by("title"),
+            list(expected.values_list("pk", flat=True)),
+        )
+
+    def test_ties_are_broken_by_pk(self):
+        expected = list(
+            Article.objects.order_by("-title", "-pk").values_list(
+                "pk", flat=True
+            )
+        )
+        for size in (1, 2, 3):
+            with self.subTest(size=size):
+                self.assertWalks(
+                    Article.objects.order_by("-title"), expected, size
+                )
+        self.assertWalks(
+            Article.objects.order_by(F("title").desc()), expected, 2
+        )
+
+    def test_ordering_parameter(self):
+        expected = list(
+            Article.objects.order_by("title", "pk").values_list(
+                "slug", flat=True
+            )
+        )
+        client = APIClient()
+        slugs = []
+        link = "/api/wiki/articles/?ordering=title&page_size=3"
+        while link:
+            response = client.get(link)
+            self.assertEqual(response.status_code, 200)
+            slugs += [article["slug"] for article in response.data["results"]]
+            link = response.data["next"]
+        self.assertEqual(slugs, expected)
+
+    def test_search_rank(self):
+        ids = list(
+            Article.objects.order_by("slug").values_list("pk", flat=True)
+        )
+        ids = ids[3:] + ids[:3]
+        queryset = BaseSearchBackend.order_by_ids(Article.objects.all(), ids)
+        self.assertWalks(queryset, ids, 3)
+
+    def test_empty_backward_page_restarts(self):
+        queryset = Article.objects.order_by("title")
+        first, link, _ = self.paginate(queryset)
+        _, _, previous = self.paginate(queryset, link)
+        Article.objects.filter(pk__in=first).delete()
+        page, link, previous = self.paginate(queryset, previous)
+        self.assertEqual(page, [])
+        self.assertIsNone(previous)
+        self.assertEqual(parse_qs(urlsplit(link).query), {"page_size": ["2"]})
+
+    def test_tampered_cursors(self):
+        def cursor(payload):
+            raw = json.dumps(payload).encode()
+            return base64.urlsafe_b64encode(raw).decode()
+
+        queryset = Article.objects.order_by("title")
+        pk = str(queryset.first().pk)
+        bad = [
+            "not a cursor!",
+            base64.urlsafe_b64encode(b"not json").decode(),
+            cursor([]),
+            cursor({"p": ["Beta"], "r": 0}),
+            cursor({"p": ["Beta", "not-a-uuid"], "r": 0}),
+            cursor({"p": ["Beta", None], "r": 0}),
+            cursor({"p": ["Beta", pk]}),
+        ]
+        for value in bad:
+            with self.subTest(cursor=value):
+                with self.assertRaises(NotFound):
+                    self.paginate(queryset, f"/articles/?cursor={value}")
+        response = APIClient().get("/api/wiki/articles/", {"cursor": bad[-1]})
+        self.assertEqual(response.status_code, 404)
+        valid = cursor({"p": ["Beta", pk], "r": 0})
+        self.paginate(queryset, f"/articles/?cursor={valid}")
+
+    def test_expression_orderings(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.paginate(Article.objects.order_by(Lower("title")))
+        with self.assertRaises(ImproperlyConfigured):
+            self.paginate(Article.objects.order_by("?"))
+
+
+class SparseFieldsetTests(TestCase):
+    """?fields= and ?expand= shape the output and the queries."""
+
+    url = "/api/wiki/articles/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="writer",
+            email="writer@example.com",
+            password="x",
+            first_name="Ada",
+            last_name="Writer",
+        )
+        for number in range(3):
+            cls.article(number)
+
+    @classmethod
+    def article(cls, number):
+        article = Article.objects.create(
+            title=f"Article {number}", author=cls.user
+        )
+        for title in ("Intro", "Details"):
+            Section.objects.create(article=article, title=title, content="x")
+        return article
+
+    def get(self, **params):
+        response = APIClient().get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"]
+
+    def test_fields(self):
+        results = self.get(fields="id,title,author_name")
+        self.assertEqual(len(results), 3)
+        for article in results:
+            self.assertEqual(set(article), {"id", "title", "author_name"})
+            self.assertEqual(article["author_name"], "Ada Writer")
+
+    def test_expand(self):
+        results = self.get(fields="title", expand="author,sections")
+        for article in results:
+            self.assertEqual(set(article), {"title", "author", "sections"})
+            self.assertEqual(article["author"]["username"], "writer")
+            self.assertEqual(
+                [section["title"] for section in article["sections"]],
+                ["Intro", "Details"],
+            )
+        # Without ?expand= the relation stays a primary key.
+        results = self.get(fields="author")
+        self.assertEqual(results[0], {"author": self.user.pk})
+
+    def test_only_requested_columns_are_loaded(self):
+        queryset = ArticleSerializer.optimize_queryset(
+            Article.objects.all(), {"id", "title"}
+        )
+        self.assertEqual(
+            queryset.query.deferred_loading, ({"id", "title"}, False)
+        )
+        self.assertEqual(queryset.query.select_related, False)
+        # Unrestricted fields load everything.
+        queryset = ArticleSerializer.optimize_queryset(Article.objects.all())
+        self.assertEqual(queryset.query.deferred_loading[0], frozenset())
+
+    def test_query_count(self):
+        params = {"fields": "title", "expand": "author,sections"}
+        with CaptureQueriesContext(connection) as queries:
+            self.get(**params)
+        # Article bodies are neither rendered nor read.
+        self.assertNotIn("current_content", queries[0]["sql"])
+        for number in range(3, 6):
+            self.article(number)
+        with self.assertNumQueries(len(queries)):
+            self.assertEqual(len(self.get(**params)), 6)
+
+
+class ValuesPathTests(TestCase):
+    """List pages rendered from values() match the serializer's."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="writer",
+            email="writer@example.com",
+            password="x",
+            first_name="Ada",
+            last_name="Writer",
+        )
+        cls.voter = User.objects.create_user(
+            username="voter", email="voter@example.com", password="x"
+        )
+        category = Category.objects.create(name="Mammals")
+        articles = [
+            Article.objects.create(
+                title="Zebras",
+                author=cls.user,
+                category=category,
+                tags=["stripes"],
+                featured=True,
+            ),
+            Article.objects.create(
+                title="Okapis", author=cls.voter, current_summary="Shy"
+            ),
+        ]
+        comments = [
+            Comment.objects.create(
+                content_object=article, content="Nice", author=author
+            )
+            for article in articles
+            for author in (cls.user, cls.voter)
+        ]
+        cast_vote(comments[0], cls.voter, "up")
+        cast_vote(comments[1], cls.voter, "down")
+
+    def assertSameOutput(self, view, url, user=None):
+        self.assertIsNotNone(
+            RowMapper.compile(view.serializer_class(context={}))
+        )
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        response = client.get(url)
+        with patch.object(view, "values_list_enabled", False):
+            expected = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["results"])
+        self.assertEqual(response.json(), expected.json())
+
+    def test_articles(self):
+        self.assertSameOutput(ArticleViewSet, "/api/wiki/articles/")
+        self.assertSameOutput(
+            ArticleViewSet, "/api/wiki/articles/?fields=id,author_name,tags"
+        )
+
+    def test_comments(self):
+        url = "/api/comments/comments/"
+        self.assertSameOutput(CommentViewSet, url)
+        self.assertSameOutput(CommentViewSet, url, self.voter)
@@ -0,0 +1,162 @@
+"""Read-only fast path that renders list pages from ``QuerySet.values()``.
+
+A ``RowMapper`` is compiled from a bound serializer: every field becomes
+an output key, the columns it reads and a converter, so rendering a page
+only reads the needed columns and calls one converter per field instead
+of building model instances and dispatching through
+``Field.get_attribute()`` and ``to_representation()`` per row. The
+serializer remains the source of truth for which fields exist and how
+they look in the API schema.
+
+Fields the mapper cannot translate (nested serializers, method fields
+without a mapper, properties) make ``compile`` return ``None`` and the
+view falls back to the regular serializer. Computed fields opt in by
+listing their columns in ``Meta.values_mappers`` and defining
+``map_<field>(self, *values)`` on the serializer. An optional
+``prepare_values(self, rows)`` hook runs once per page first, e.g. to
+resolve related objects in bulk.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.response import Response
+
+# Serializer fields whose to_representation() is the identity (or a
+# no-op coercion) for the Python values the database returns.
+IDENTITY_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.FloatField,
+    serializers.IntegerField,
+    serializers.JSONField,
+    serializers.PrimaryKeyRelatedField,
+    serializers.ReadOnlyField,
+)
+
+
+def ordering_columns(queryset):
+    """Names a paginator reads from rows: the ordering plus the pk."""
+    order_by = queryset.query.order_by or (
+        queryset.model._meta.ordering
+        if queryset.query.default_ordering
+        else ()
+    )
+    pk_name = queryset.model._meta.pk.name
+    names = [pk_name]
+    for item in order_by:
+        if isinstance(item, str) and item != "?":
+            name = item.lstrip("-")
+            names.append(pk_name if name == "pk" else name)
+    return names
+
+
+def _identity(value):
+    return value
+
+
+class RowMapper:
+    """Render ``values()`` rows the way a serializer would."""
+
+    def __init__(self, serializer, fields):
+        self.serializer = serializer
+        self.fields = fields
+        columns = []
+        for _, field_columns, _, _ in fields:
+            for column in field_columns:
+                if column not in columns:
+                    columns.append(column)
+        self.columns = columns
+
+    @classmethod
+    def compile(cls, serializer):
+        """Return a mapper for a bound serializer, or None."""
+        meta = getattr(serializer, "Meta", None)
+        model = getattr(meta, "model", None)
+        if model is None:
+            return None
+        mappers = getattr(meta, "values_mappers", {})
+        fields = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in mappers:
+                method = getattr(serializer, f"map_{name}")
+                fields.append((name, tuple(mappers[name]), method, False))
+                continue
+            if isinstance(field, serializers.BaseSerializer):
+                return None
+            if field.source == "*" or len(field.source_attrs) != 1:
+                return None
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete or model_field.many_to_many:
+                return None
+            if model_field.is_relation:
+                if not isinstance(field, serializers.PrimaryKeyRelatedField):
+                    return None
+                column = model_field.attname
+            else:
+                column = model_field.name
+            if isinstance(field, IDENTITY_FIELDS):
+                convert = _identity
+            elif isinstance(field, serializers.UUIDField):
+                convert = str
+            else:
+                convert = field.to_representation
+            # Like Serializer.to_representation(), None skips the field.
+            fields.append((name, (column,), convert, True))
+        return cls(serializer, fields)
+
+    def values(self, queryset):
+        """Return queryset as dict rows with every column we need."""
+        columns = list(self.columns)
+        for name in ordering_columns(queryset):
+            if name not in columns:
+                columns.append(name)
+        return queryset.prefetch_related(None).values(*columns)
+
+    def render(self, rows):
+        """Return the serialized representation of rows."""
+        prepare = getattr(self.serializer, "prepare_values", None)
+        if prepare is not None:
+            prepare(rows)
+        data = []
+        fields = self.fields
+        for row in rows:
+            item = {}
+            for name, columns, convert, skip_none in fields:
+                if skip_none:
+                    value = row[columns[0]]
+                    item[name] = None if value is None else convert(value)
+                else:
+                    item[name] = convert(*[row[c] for c in columns])
+            data.append(item)
+        return data
+
+
+class ValuesListMixin:
+    """ViewSet mixin serving ``list`` through a ``RowMapper`` when possible.
+
+    Set ``values_list_enabled = False`` on a view to always use the
+    serializer.
+    """
+
+    values_list_enabled = True
+
+    def list(self, request, *args, **kwargs):
+        mapper = (
+            RowMapper.compile(self.get_serializer())
+            if self.values_list_enabled
+            else None
+        )
+        if mapper is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = mapper.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(mapper.render(page))
+        return Response(mapper.render(list(queryset)))
@@ -118,12 +118,73 @@ REST_FRAMEWORK = {
         "rest_framework.renderers.JSONRenderer",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
-    "DEFAULT_PAGINATION_CLASS": (
-        "rest_framework.pagination.PageNumberPagination"
-    ),
+    # Keyset pagination; small collections opt into page numbers per view.
+    "DEFAULT_PAGINATION_CLASS": "core.pagination.KeysetPagination",
     "PAGE_SIZE": 20,
 }
 
+# Article search (see wiki/search/). SEARCH_BACKEND is either
+# "wiki.search.backends.InvertedIndexBackend" or
+# "wiki.search.backends.DatabaseSearchBackend".
+SEARCH_BACKEND = env.str(
+    "SEARCH_BACKEND", default="wiki.search.backends.InvertedIndexBackend"
+)
+SEARCH_INDEX_DIR = env.str(
+    "SEARCH_INDEX_DIR", default=str(BASE_DIR / "var" / "search")
+)
+SEARCH_INDEX_AUTOUPDATE = env.bool("SEARCH_INDEX_AUTOUPDATE", default=True)
+SEARCH_INDEX_MAX_SEGMENTS = env.int("SEARCH_INDEX_MAX_SEGMENTS", default=8)
+SEARCH_INDEX_MERGE_THRESHOLD = env.int(
+    "SEARCH_INDEX_MERGE_THRESHOLD", default=5000
+)
+SEARCH_MAX_RESULTS = env.int("SEARCH_MAX_RESULTS", default=1000)
+VECTOR_INDEX_DIR = env.str(
+    "VECTOR_INDEX_DIR", default=str(BASE_DIR / "var" / "vectors")
+)
+
+# Article view tracking (see wiki/tracking.py). Views are buffered in
+# memory and written every FLUSH_INTERVAL seconds, or once BUFFER_SIZE
+# views are pending; an interval of 0 writes each view immediately.
+VIEW_TRACKING_FLUSH_INTERVAL = env.float(
+    "VIEW_TRACKING_FLUSH_INTERVAL", default=5.0
+)
+VIEW_TRACKING_BUFFER_SIZE = env.int("VIEW_TRACKING_BUFFER_SIZE", default=10000)
+# Raw views are archived to VIEW_ARCHIVE_DIR and deleted after
+# VIEW_RETENTION_DAYS; hourly rollups are kept for
+# VIEW_HOURLY_ROLLUP_RETENTION_DAYS, daily ones forever (see
+# wiki/analytics.py).
+VIEW_RETENTION_DAYS = env.int("VIEW_RETENTION_DAYS", default=90)
+VIEW_HOURLY_ROLLUP_RETENTION_DAYS = env.int(
+    "VIEW_HOURLY_ROLLUP_RETENTION_DAYS", default=30
+)
+VIEW_ARCHIVE_DIR = env.str(
+    "VIEW_ARCHIVE_DIR", default=str(BASE_DIR / "var" / "archive" / "views")
+)
+# Trending articles (see wiki/trending.py): a view's weight halves every
+# HALF_LIFE hours; workers keep the top SIZE articles per category in
+# memory and reload them every REFRESH_INTERVAL seconds.
+TRENDING_HALF_LIFE = env.float("TRENDING_HALF_LIFE", default=12.0)
+TRENDING_SIZE = env.int("TRENDING_SIZE", default=50)
+TRENDING_REFRESH_INTERVAL = env.float(
+    "TRENDING_REFRESH_INTERVAL", default=60.0
+)
+
+# Revision texts (see wiki/revisions.py): a full copy is stored at least
+# every KEYFRAME_INTERVAL versions, deltas in between; each worker caches
+# up to CACHE_SIZE characters of rebuilt texts.
+REVISION_KEYFRAME_INTERVAL = env.int("REVISION_KEYFRAME_INTERVAL", default=20)
+REVISION_CACHE_SIZE = env.int("REVISION_CACHE_SIZE", default=32_000_000)
+# Diffs between revisions (see wiki/diffs.py), cached per worker up to
+# DIFF_CACHE_SIZE characters.
+REVISION_DIFF_CACHE_SIZE = env.int(
+    "REVISION_DIFF_CACHE_SIZE", default=8_000_000
+)
+
+# Preset zlib dictionaries for CompressedTextField(dictionary=True) (see
+# core/compression.py), comma-separated paths; the first compresses new
+# values, the others are still needed to read older ones.
+COMPRESSION_DICTIONARIES = env.list("COMPRESSION_DICTIONARIES", default=[])
+
 # JWT Settings
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
@@ -174,4 +235,8 @@ SPECTACULAR_SETTINGS = {
             }
         }
     },
+    "ENUM_NAME_OVERRIDES": {
+        "CommentStatusEnum": "comments.models.Comment.Status",
+        "VoteTypeEnum": "comments.models.CommentVote.VoteType",
+    },
 }
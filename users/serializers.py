@@ -6,6 +6,11 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 User = get_user_model()
 
 
+def full_name(first_name, last_name):
+    """Same as ``User.get_full_name()``, from the two column values."""
+    return f"{first_name} {last_name}".strip()
+
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """Custom JWT token serializer that includes user info in the token."""
 
@@ -107,6 +112,15 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
 
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Public, read-only view of a user for embedding in other objects."""
+
+    class Meta:
+        model = User
+        fields = ("id", "username", "first_name", "last_name", "avatar")
+        read_only_fields = fields
+
+
 class UserUpdateSerializer(serializers.ModelSerializer):
     """Serializer for updating user profile."""
 
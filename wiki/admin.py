@@ -1,4 +1,6 @@
+from django import forms
 from django.contrib import admin
+from django.db.models import Q
 from django.utils.html import format_html
 from django.urls import reverse
 from .models import (
@@ -8,21 +10,26 @@ from .models import (
     Section,
     ArticleCollaborator,
     ArticleView,
+    SavedSearch,
+    SearchAlert,
 )
+from .search import SearchUnavailable, get_search_backend
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ["name", "slug", "parent", "article_count", "created_at"]
+    list_display = [
+        "name",
+        "slug",
+        "parent",
+        "article_count",
+        "subtree_published_count",
+        "created_at",
+    ]
     list_filter = ["parent", "created_at"]
     search_fields = ["name", "description"]
     prepopulated_fields = {"slug": ("name",)}
 
-    def article_count(self, obj):
-        return obj.articles.count()
-
-    article_count.short_description = "Articles"
-
 
 class RevisionInline(admin.TabularInline):
     model = Revision
@@ -40,7 +47,8 @@ class RevisionInline(admin.TabularInline):
 class SectionInline(admin.TabularInline):
     model = Section
     extra = 0
-    fields = ["title", "order", "parent"]
+    fields = ["title", "parent", "number"]
+    readonly_fields = ["number"]
 
 
 class ArticleCollaboratorInline(admin.TabularInline):
@@ -61,7 +69,9 @@ class ArticleAdmin(admin.ModelAdmin):
         "updated_at",
     ]
     list_filter = ["status", "featured", "category", "created_at"]
-    search_fields = ["title", "current_content", "author__username"]
+    # Bodies are stored compressed (see core.fields), which icontains
+    # cannot match; get_search_results() asks the search backend.
+    search_fields = ["title", "author__username"]
     prepopulated_fields = {"slug": ("title",)}
     readonly_fields = ["view_count", "created_at", "updated_at"]
 
@@ -103,6 +113,24 @@ class ArticleAdmin(admin.ModelAdmin):
 
     revision_count_display.short_description = "Revisions"
 
+    def get_search_results(self, request, queryset, search_term):
+        # Route full-text matching through the search backend; author
+        # names still match.
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        try:
+            matches = get_search_backend().search(queryset, search_term)
+        except SearchUnavailable:
+            return super().get_search_results(request, queryset, search_term)
+        return (
+            queryset.filter(
+                Q(pk__in=matches.values("pk"))
+                | Q(author__username__iexact=search_term)
+            ),
+            False,
+        )
+
     def get_queryset(self, request):
         return (
             super()
@@ -111,6 +139,30 @@ class ArticleAdmin(admin.ModelAdmin):
         )
 
 
+class RevisionAdminForm(forms.ModelForm):
+    """Enter a new revision's text, which is not a model field."""
+
+    content = forms.CharField(widget=forms.Textarea)
+
+    class Meta:
+        model = Revision
+        fields = "__all__"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields["content"].initial = self.instance.content
+            self.fields["content"].disabled = True
+            self.fields["content"].help_text = (
+                "Saved texts cannot be changed; add a new revision instead."
+            )
+
+    def save(self, commit=True):
+        if "content" in self.changed_data:
+            self.instance.content = self.cleaned_data["content"]
+        return super().save(commit)
+
+
 @admin.register(Revision)
 class RevisionAdmin(admin.ModelAdmin):
     list_display = [
@@ -122,8 +174,11 @@ class RevisionAdmin(admin.ModelAdmin):
         "created_at",
     ]
     list_filter = ["created_at", "editor"]
-    search_fields = ["article__title", "title", "content", "change_message"]
+    # Texts are stored as deltas (see wiki.revisions), so they are not
+    # searchable here.
+    search_fields = ["article__title", "title", "change_message"]
     readonly_fields = ["version_number", "created_at"]
+    form = RevisionAdminForm
 
     fieldsets = (
         ("Article", {"fields": ("article",)}),
@@ -156,9 +211,11 @@ class RevisionAdmin(admin.ModelAdmin):
 
 @admin.register(Section)
 class SectionAdmin(admin.ModelAdmin):
-    list_display = ["title", "article", "parent", "order", "level_display"]
+    list_display = ["title", "article", "parent", "number", "level_display"]
     list_filter = ["article", "created_at"]
-    search_fields = ["title", "content", "article__title"]
+    # Contents are stored compressed (see core.fields), which icontains
+    # cannot match; get_search_results() asks the search backend.
+    search_fields = ["title", "article__title"]
 
     def level_display(self, obj):
         level = obj.get_level()
@@ -167,6 +224,25 @@ class SectionAdmin(admin.ModelAdmin):
 
     level_display.short_description = "Level"
 
+    def get_search_results(self, request, queryset, search_term):
+        # Also list the sections of the articles the search backend finds.
+        search_term = search_term.strip()
+        matched, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+        if not search_term:
+            return matched, may_have_duplicates
+        try:
+            articles = get_search_backend().search(
+                Article.objects.all(), search_term
+            )
+        except SearchUnavailable:
+            return matched, may_have_duplicates
+        return (
+            matched | queryset.filter(article__in=articles.values("pk")),
+            may_have_duplicates,
+        )
+
     def get_queryset(self, request):
         return (
             super().get_queryset(request).select_related("article", "parent")
@@ -202,7 +278,34 @@ class ArticleViewAdmin(admin.ModelAdmin):
     list_display = ["article", "user", "ip_address", "viewed_at"]
     list_filter = ["viewed_at"]
     search_fields = ["article__title", "user__username", "ip_address"]
-    readonly_fields = ["viewed_at"]
+    readonly_fields = ["viewed_at", "agent"]
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related("article", "user")
+
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ["query", "name", "user", "is_active", "created_at"]
+    list_filter = ["is_active", "created_at"]
+    search_fields = ["query", "name", "user__username"]
+    readonly_fields = ["terms", "created_at", "updated_at"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("user")
+
+
+@admin.register(SearchAlert)
+class SearchAlertAdmin(admin.ModelAdmin):
+    list_display = ["saved_search", "article", "revision", "is_read"]
+    list_filter = ["is_read", "created_at"]
+    raw_id_fields = ["saved_search", "article", "revision"]
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .select_related(
+                "saved_search__user", "article", "revision__article"
+            )
+        )
@@ -0,0 +1,331 @@
+"""Article view analytics: rollups, retention and compaction.
+
+``rollup_views()`` counts raw ``ArticleView`` rows into hourly
+``ArticleViewRollup`` rows per article and type of viewer, and sums the
+hours of each day it touches into daily rows. It resumes from a
+high-water mark (an ``AnalyticsCheckpoint``) and only processes hours
+that ended at least ``lag`` ago, because buffered views (see
+wiki.tracking) are written a little after they happen. Periods are
+always recomputed whole, so running it again is harmless.
+
+``add_viewers()`` folds views into HyperLogLog sketches of distinct
+viewers as they are recorded: one per article and day, and one per day
+for the whole site, each category and each author. ``unique_viewers()``
+merges the sketches of a set of articles and days into an approximate
+distinct count; ``group_viewers()`` does the same from the group
+sketches, reading one per group and day however many articles the
+groups hold.
+
+``archive_views()`` moves raw views that are older than the retention
+period, and already rolled up, to gzip-compressed JSON lines files and
+deletes them in batches. ``compact_rollups()`` drops hourly rollups once
+only their daily totals are of interest, and user agents no view refers
+to any more.
+"""
+
+import datetime
+import gzip
+import json
+import os
+
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Case, Count, Exists, OuterRef, Sum, Value, When
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from core.hyperloglog import HyperLogLog
+from .models import (
+    AnalyticsCheckpoint,
+    Article,
+    ArticleView,
+    ArticleViewerSketch,
+    ArticleViewRollup,
+    UserAgent,
+    ViewerGroupSketch,
+)
+
+ROLLUP_CHECKPOINT = "article-view-rollup"
+HOUR = datetime.timedelta(hours=1)
+DAY = datetime.timedelta(days=1)
+UTC = datetime.timezone.utc
+
+
+def _floor(moment, unit):
+    moment = moment.astimezone(UTC)
+    if unit == DAY:
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_mark():
+    """Return the end of the rolled up views, or None before any run."""
+    return (
+        AnalyticsCheckpoint.objects.filter(name=ROLLUP_CHECKPOINT)
+        .values_list("position", flat=True)
+        .first()
+    )
+
+
+def rollup_views(now=None, lag=datetime.timedelta(minutes=10)):
+    """Roll up the views of every complete hour since the last run.
+
+    Returns the number of hours processed. Each day is committed
+    separately, together with the high-water mark.
+    """
+    until = _floor((now or timezone.now()) - lag, HOUR)
+    start = rollup_mark()
+    if start is None:
+        first = ArticleView.objects.order_by("viewed_at").first()
+        if first is None:
+            return 0
+        start = _floor(first.viewed_at, HOUR)
+    hours = 0
+    while start < until:
+        end = min(_floor(start, DAY) + DAY, until)
+        with transaction.atomic():
+            _rollup_hours(start, end)
+            _rollup_day(_floor(start, DAY))
+            AnalyticsCheckpoint.objects.update_or_create(
+                name=ROLLUP_CHECKPOINT, defaults={"position": end}
+            )
+        hours += (end - start) // HOUR
+        start = end
+    return hours
+
+
+def _viewer():
+    return Case(
+        When(
+            user__isnull=True, then=Value(ArticleViewRollup.Viewer.ANONYMOUS)
+        ),
+        default=Value(ArticleViewRollup.Viewer.MEMBER),
+    )
+
+
+def _rollup_hours(start, end):
+    ArticleViewRollup.objects.filter(
+        granularity=ArticleViewRollup.Granularity.HOUR,
+        period_start__gte=start,
+        period_start__lt=end,
+    ).delete()
+    rows = (
+        ArticleView.objects.filter(viewed_at__gte=start, viewed_at__lt=end)
+        .annotate(period=TruncHour("viewed_at", tzinfo=UTC), kind=_viewer())
+        .order_by()
+        .values("period", "article_id", "article__category_id", "kind")
+        .annotate(total=Count("*"))
+    )
+    ArticleViewRollup.objects.bulk_create(
+        [
+            ArticleViewRollup(
+                granularity=ArticleViewRollup.Granularity.HOUR,
+                period_start=row["period"],
+                article_id=row["article_id"],
+                category_id=row["article__category_id"],
+                viewer=row["kind"],
+                views=row["total"],
+            )
+            for row in rows.iterator(chunk_size=2000)
+        ],
+        batch_size=1000,
+    )
+
+
+def _rollup_day(day):
+    ArticleViewRollup.objects.filter(
+        granularity=ArticleViewRollup.Granularity.DAY, period_start=day
+    ).delete()
+    rows = (
+        ArticleViewRollup.objects.filter(
+            granularity=ArticleViewRollup.Granularity.HOUR,
+            period_start__gte=day,
+            period_start__lt=day + DAY,
+        )
+        .order_by()
+        .values("article_id", "article__category_id", "viewer")
+        .annotate(total=Sum("views"))
+    )
+    ArticleViewRollup.objects.bulk_create(
+        [
+            ArticleViewRollup(
+                granularity=ArticleViewRollup.Granularity.DAY,
+                period_start=day,
+                article_id=row["article_id"],
+                category_id=row["article__category_id"],
+                viewer=row["viewer"],
+                views=row["total"],
+            )
+            for row in rows.iterator(chunk_size=2000)
+        ],
+        batch_size=1000,
+    )
+
+
+def viewer_key(user_id, session_key, ip_address, user_agent):
+    """Identify a viewer: the user, else the session, else the client."""
+    if user_id is not None:
+        return f"user:{user_id}"
+    if session_key:
+        return f"session:{session_key}"
+    return f"client:{ip_address}|{user_agent}"
+
+
+def add_viewers(views):
+    """Fold ``(article_id, viewer key, viewed_at)`` into the sketches.
+
+    Must run in a transaction: the sketches are locked while merging.
+    """
+    sketches = defaultdict(HyperLogLog)
+    groups = defaultdict(HyperLogLog)
+    views = list(views)
+    articles = {
+        pk: (category_id, author_id)
+        for pk, category_id, author_id in Article.objects.filter(
+            pk__in={view[0] for view in views}
+        ).values_list("pk", "category_id", "author_id")
+    }
+    for article_id, key, viewed_at in views:
+        if article_id not in articles:
+            continue
+        day = viewed_at.astimezone(UTC).date()
+        category_id, author_id = articles[article_id]
+        sketches[article_id, day].add(key)
+        for scope, group in (
+            (ViewerGroupSketch.Scope.SITE, ""),
+            (ViewerGroupSketch.Scope.CATEGORY, category_id or ""),
+            (ViewerGroupSketch.Scope.AUTHOR, author_id),
+        ):
+            groups[scope.value, str(group), day].add(key)
+    _merge_into(ArticleViewerSketch, ("article_id", "day"), sketches)
+    _merge_into(ViewerGroupSketch, ("scope", "key", "day"), groups)
+
+
+def _merge_into(model, fields, sketches):
+    """Merge sketches, keyed by the values of fields, into model rows."""
+    if not sketches:
+        return
+    model.objects.bulk_create(
+        [
+            model(**dict(zip(fields, key)), sketch=sketch.to_bytes())
+            for key, sketch in sketches.items()
+        ],
+        ignore_conflicts=True,
+    )
+    stored = model.objects.select_for_update().filter(
+        **{
+            f"{field}__in": {key[position] for key in sketches}
+            for position, field in enumerate(fields)
+        }
+    )
+    changed = []
+    for row in stored:
+        sketch = sketches.get(tuple(getattr(row, field) for field in fields))
+        if sketch is None:
+            continue
+        merged = sketch.merge(HyperLogLog.from_bytes(bytes(row.sketch)))
+        row.sketch = merged.to_bytes()
+        changed.append(row)
+    model.objects.bulk_update(changed, ["sketch"])
+
+
+def unique_viewers(articles, start, end):
+    """Approximate distinct viewers of articles from day start to end.
+
+    articles is a queryset of articles; both days are included.
+    """
+    sketches = ArticleViewerSketch.objects.filter(
+        article__in=articles.order_by().values("pk"),
+        day__gte=start,
+        day__lte=end,
+    ).values_list("sketch", flat=True)
+    return HyperLogLog.union(sketches.iterator(chunk_size=500)).count()
+
+
+def group_viewers(scope, keys, start, end):
+    """Approximate distinct viewers of groups from day start to end.
+
+    keys are the category or author ids of the groups ("" for the site
+    or uncategorized articles); both days are included.
+    """
+    sketches = ViewerGroupSketch.objects.filter(
+        scope=scope,
+        key__in=[str(key) for key in keys],
+        day__gte=start,
+        day__lte=end,
+    ).values_list("sketch", flat=True)
+    return HyperLogLog.union(sketches.iterator(chunk_size=500)).count()
+
+
+def archive_views(before, directory, batch_size=5000):
+    """Archive and delete the raw views older than before.
+
+    Views not rolled up yet are kept. Returns the number of views
+    archived and the archive file written (None when there were none).
+    """
+    mark = rollup_mark()
+    if mark is None:
+        return 0, None
+    views = (
+        ArticleView.objects.filter(viewed_at__lt=min(before, mark))
+        .order_by("viewed_at", "id")
+        .values(
+            "id",
+            "article_id",
+            "user_id",
+            "ip_address",
+            "agent__value",
+            "session_key",
+            "viewed_at",
+        )
+    )
+    os.makedirs(directory, exist_ok=True)
+    stamp = timezone.now().astimezone(UTC).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(directory, f"article-views-{stamp}.jsonl.gz")
+    archived = 0
+    with (
+        open(path, "wb") as raw,
+        gzip.GzipFile(fileobj=raw, mode="wb") as archive,
+    ):
+        while True:
+            rows = list(views[:batch_size])
+            if not rows:
+                break
+            for row in rows:
+                row["user_agent"] = row.pop("agent__value") or ""
+                line = json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+                archive.write(line.encode())
+            # Rows are only deleted once they are safely on disk.
+            archive.flush()
+            os.fsync(raw.fileno())
+            ArticleView.objects.filter(
+                pk__in=[row["id"] for row in rows]
+            ).delete()
+            archived += len(rows)
+    if not archived:
+        os.remove(path)
+        path = None
+    return archived, path
+
+
+def compact_rollups(before):
+    """Drop hourly rollups older than before and unused user agents.
+
+    Returns the numbers of rollups and user agents deleted.
+    """
+    # Whole days only, and only those whose daily totals are final.
+    cutoff = _floor(min(before, rollup_mark() or before), DAY)
+    rollups, _ = ArticleViewRollup.objects.filter(
+        granularity=ArticleViewRollup.Granularity.HOUR,
+        period_start__lt=cutoff,
+    ).delete()
+    agents, _ = (
+        UserAgent.objects.filter(
+            ~Exists(ArticleView.objects.filter(agent=OuterRef("pk")))
+        )
+        .order_by()
+        .delete()
+    )
+    return rollups, agents
@@ -0,0 +1,120 @@
+"""Diffs between two revisions of an article.
+
+Texts are compared line by line (see core.diff); the structured style
+also compares the words of changed lines, so that a fixed typo shows as
+one word rather than a replaced line. Results are cached per process, up
+to ``REVISION_DIFF_CACHE_SIZE`` characters, under the ids of the two
+revisions and their ``updated_at``, which changes whenever a revision's
+text is edited, so comparing a pair again only looks up the revisions.
+"""
+
+from functools import lru_cache
+
+from django.conf import settings
+
+from core import diff
+from core.lru import LRUCache
+
+from .revisions import load_texts
+
+STYLES = ("unified", "structured")
+
+
+@lru_cache(maxsize=None)
+def get_diff_cache():
+    """Return this process's cache of revision diffs."""
+    return LRUCache(settings.REVISION_DIFF_CACHE_SIZE, size=_size)
+
+
+def _size(result):
+    if "diff" in result:
+        return len(result["diff"])
+    # Roughly what the structured changes cost in memory
+    return sum(
+        len(change["text"]) + 100
+        for hunk in result["hunks"]
+        for change in hunk["changes"]
+    )
+
+
+def revision_diff(old, new, style="unified", context=3):
+    """Return the diff turning old's text into new's, as a dict.
+
+    ``old`` and ``new`` need ``pk``, ``version_number`` and
+    ``updated_at``; context is the number of unchanged lines shown
+    around changes.
+    """
+    key = (old.pk, old.updated_at, new.pk, new.updated_at, style, context)
+    cache = get_diff_cache()
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    texts = load_texts([old.pk, new.pk])
+    a = texts[old.pk].splitlines(keepends=True)
+    b = texts[new.pk].splitlines(keepends=True)
+    codes = diff.opcodes(a, b)
+    insertions = deletions = 0
+    for tag, i1, i2, j1, j2 in codes:
+        if tag != "equal":
+            deletions += i2 - i1
+            insertions += j2 - j1
+    result = {
+        "from_version": old.version_number,
+        "to_version": new.version_number,
+        "style": style,
+        "insertions": insertions,
+        "deletions": deletions,
+    }
+    if style == "unified":
+        result["diff"] = diff.unified(
+            a,
+            b,
+            codes,
+            context,
+            fromfile=f"v{old.version_number}",
+            tofile=f"v{new.version_number}",
+        )
+    else:
+        result["hunks"] = [
+            _hunk(a, b, hunk) for hunk in diff.grouped(codes, context)
+        ]
+    cache.set(key, result)
+    return result
+
+
+def _hunk(a, b, codes):
+    """Return one structured hunk with word-level changes."""
+    first, last = codes[0], codes[-1]
+    changes = []
+    for tag, i1, i2, j1, j2 in codes:
+        old, new = "".join(a[i1:i2]), "".join(b[j1:j2])
+        if tag == "equal":
+            _append(changes, "equal", old)
+        elif tag == "replace":
+            old_words, new_words = diff.words(old), diff.words(new)
+            for op, w1, w2, v1, v2 in diff.opcodes(old_words, new_words):
+                if op == "equal":
+                    _append(changes, "equal", "".join(old_words[w1:w2]))
+                    continue
+                _append(changes, "delete", "".join(old_words[w1:w2]))
+                _append(changes, "insert", "".join(new_words[v1:v2]))
+        else:
+            _append(changes, "delete", old)
+            _append(changes, "insert", new)
+    return {
+        "from_start": first[1] + 1,
+        "from_lines": last[2] - first[1],
+        "to_start": first[3] + 1,
+        "to_lines": last[4] - first[3],
+        "changes": changes,
+    }
+
+
+def _append(changes, op, text):
+    if not text:
+        return
+    if changes and changes[-1]["op"] == op:
+        changes[-1]["text"] += text
+    else:
+        changes.append({"op": op, "text": text})
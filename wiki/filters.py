@@ -0,0 +1,20 @@
+from django_filters import rest_framework as filters
+
+from .models import Article
+
+
+class ArticleFilter(filters.FilterSet):
+    """Filters for the article list.
+
+    ``category__subtree`` matches articles in a category or any of its
+    subcategories, through one join on the category closure table.
+    """
+
+    category__subtree = filters.UUIDFilter(
+        field_name="category__ancestor_links__ancestor",
+        label="Category, including its subcategories",
+    )
+
+    class Meta:
+        model = Article
+        fields = ["status", "featured", "author", "category"]
@@ -0,0 +1,65 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from wiki.analytics import archive_views, compact_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive raw article views past the retention period to "
+        "compressed files, delete them, and compact old rollups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.VIEW_RETENTION_DAYS,
+            help=(
+                "Days raw views are kept (default: VIEW_RETENTION_DAYS, "
+                f"{settings.VIEW_RETENTION_DAYS})."
+            ),
+        )
+        parser.add_argument(
+            "--hourly-days",
+            type=int,
+            default=settings.VIEW_HOURLY_ROLLUP_RETENTION_DAYS,
+            help=(
+                "Days hourly rollups are kept; daily rollups are kept "
+                "forever (default: VIEW_HOURLY_ROLLUP_RETENTION_DAYS, "
+                f"{settings.VIEW_HOURLY_ROLLUP_RETENTION_DAYS})."
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Views archived and deleted at a time (default: 5000).",
+        )
+        parser.add_argument(
+            "--directory",
+            default=settings.VIEW_ARCHIVE_DIR,
+            help="Directory for archive files (default: VIEW_ARCHIVE_DIR).",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        archived, path = archive_views(
+            now - datetime.timedelta(days=options["days"]),
+            options["directory"],
+            batch_size=max(1, options["batch_size"]),
+        )
+        if path:
+            self.stdout.write(f"Archived {archived} views to {path}.")
+        else:
+            self.stdout.write("No views to archive.")
+        rollups, agents = compact_rollups(
+            now - datetime.timedelta(days=options["hourly_days"])
+        )
+        self.stdout.write(
+            f"Deleted {rollups} hourly rollups and {agents} unused user "
+            "agents."
+        )
@@ -0,0 +1,123 @@
+import random
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from wiki.models import Article
+from wiki.search import article_terms, get_vector_index
+from wiki.search.vectors import (
+    DEFAULT_DIM,
+    DEFAULT_FEATURES,
+    DEFAULT_TABLES,
+    EmbeddingModel,
+    bits_for,
+    hash_terms,
+)
+
+BATCH_SIZE = 1000
+
+
+def _iter_terms(queryset):
+    rows = queryset.values_list(
+        "id", "title", "current_summary", "current_content"
+    ).iterator(chunk_size=BATCH_SIZE)
+    for pk, title, summary, content in rows:
+        yield pk, article_terms(title, summary, content)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fit the article embedding model (TF-IDF + truncated SVD), embed "
+        "every article and publish a new vector index generation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+        parser.add_argument(
+            "--features",
+            type=int,
+            default=DEFAULT_FEATURES,
+            help="Size of the hashed vocabulary.",
+        )
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=20000,
+            help="Articles sampled to fit the SVD projection.",
+        )
+        parser.add_argument(
+            "--tables", type=int, default=DEFAULT_TABLES, help="LSH tables."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        features = options["features"]
+        rng = random.Random(options["seed"])
+
+        # Pass 1: document frequencies and a reservoir sample for the SVD.
+        doc_freq = np.zeros(features, dtype=np.int64)
+        sample = []
+        doc_count = 0
+        pending = []
+        for _, terms in _iter_terms(Article.objects.order_by("pk")):
+            counts = hash_terms(terms, features)
+            pending.extend(counts.keys())
+            if len(pending) > 1_000_000:
+                doc_freq += np.bincount(pending, minlength=features)
+                pending = []
+            doc_count += 1
+            if len(sample) < options["sample"]:
+                sample.append(counts)
+            else:
+                slot = rng.randrange(doc_count)
+                if slot < options["sample"]:
+                    sample[slot] = counts
+        if pending:
+            doc_freq += np.bincount(pending, minlength=features)
+
+        model = EmbeddingModel.fit(
+            sample,
+            doc_freq,
+            doc_count,
+            dim=options["dim"],
+            tables=options["tables"],
+            bits=bits_for(doc_count),
+            seed=options["seed"],
+        )
+        del sample
+
+        # Pass 2: embed every article in batches.
+        ids = []
+        blocks = []
+        batch = []
+        for pk, terms in _iter_terms(Article.objects.order_by("pk")):
+            ids.append(pk)
+            batch.append(terms)
+            if len(batch) == BATCH_SIZE:
+                blocks.append(model.embed(batch))
+                batch = []
+        if batch:
+            blocks.append(model.embed(batch))
+        vectors = (
+            np.concatenate(blocks)
+            if blocks
+            else np.empty((0, model.dim), dtype=np.float32)
+        )
+
+        index = get_vector_index()
+        index.publish(model, ids, vectors)
+
+        # Articles edited while we were building went to the previous
+        # generation; re-embed them into the new one.
+        index.update(
+            _iter_terms(Article.objects.filter(updated_at__gte=started))
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Embedded {len(ids)} articles into {model.dim} dimensions "
+                f"({model.tables} LSH tables x {model.bits} bits)."
+            )
+        )
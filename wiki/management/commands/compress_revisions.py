@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from wiki.models import Article, Revision
+from wiki.revisions import encode, load_texts
+
+
+class Command(BaseCommand):
+    help = (
+        "Store revision texts as deltas between keyframes (see "
+        "wiki.revisions), e.g. after upgrading, or in full again with "
+        "--expand. Revisions already stored as planned are left alone, so "
+        "it is safe to run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Revisions rewritten per transaction (default: 100).",
+        )
+        parser.add_argument(
+            "--expand",
+            action="store_true",
+            help="Store every revision in full, e.g. before downgrading.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        total = changed = 0
+        articles = Article.objects.order_by("pk").values_list("pk", flat=True)
+        for article_id in articles.iterator():
+            # (pk, text, depth) of the revision before the batch
+            previous = None
+            last = 0
+            while True:
+                with transaction.atomic():
+                    revisions = list(
+                        Revision.objects.filter(
+                            article_id=article_id, version_number__gt=last
+                        )
+                        .select_for_update()
+                        .order_by("version_number")
+                        .only(
+                            "id",
+                            "version_number",
+                            "content_data",
+                            "delta_base",
+                            "delta_depth",
+                        )[:batch_size]
+                    )
+                    if not revisions:
+                        break
+                    texts = load_texts([revision.pk for revision in revisions])
+                    updated = []
+                    for revision in revisions:
+                        text = texts[revision.pk]
+                        if options["expand"] or previous is None:
+                            data, is_delta = text, False
+                        else:
+                            data, is_delta = encode(
+                                text, previous[1], previous[2]
+                            )
+                        stored = (
+                            data,
+                            previous[0] if is_delta else None,
+                            previous[2] + 1 if is_delta else 0,
+                        )
+                        if stored != (
+                            revision.content_data,
+                            revision.delta_base_id,
+                            revision.delta_depth,
+                        ):
+                            (
+                                revision.content_data,
+                                revision.delta_base_id,
+                                revision.delta_depth,
+                            ) = stored
+                            updated.append(revision)
+                        previous = (revision.pk, text, stored[2])
+                    Revision.objects.bulk_update(
+                        updated, ["content_data", "delta_base", "delta_depth"]
+                    )
+                last = revisions[-1].version_number
+                total += len(revisions)
+                changed += len(updated)
+        self.stdout.write(f"Rewrote {changed} of {total} revisions.")
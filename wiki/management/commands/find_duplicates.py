@@ -0,0 +1,202 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from wiki.models import Article
+from wiki.search import simhash
+
+# Fingerprint pairs compared at once within a band bucket, which bounds
+# the memory used by buckets of many articles (about 32 MB per array).
+BLOCK_PAIRS = 1 << 22
+
+
+def _fingerprint_chunk(article_ids):
+    """Return ``(pk, simhash)`` for a chunk of articles."""
+    rows = (
+        Article.objects.filter(pk__in=article_ids)
+        .values_list("id", "current_content")
+        .iterator(chunk_size=500)
+    )
+    return [(pk, simhash.simhash(content)) for pk, content in rows]
+
+
+def _init_worker():
+    # Workers started with "spawn" need the app registry loaded.
+    django.setup()
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _close_pairs(fingerprints, threshold):
+    """Yield index pairs within threshold bits, bucketed by band.
+
+    fingerprints should be distinct. Large buckets are compared a block
+    of rows at a time, each block against the rest of the bucket.
+    """
+    for band in range(simhash.BANDS):
+        keys = (fingerprints >> np.uint64(band * simhash.BAND_BITS)) & (
+            np.uint64(simhash.BAND_MASK)
+        )
+        order = np.argsort(keys, kind="stable")
+        starts = np.flatnonzero(np.diff(keys[order])) + 1
+        for group in np.split(order, starts):
+            if len(group) < 2:
+                continue
+            values = fingerprints[group]
+            rows = max(1, BLOCK_PAIRS // len(group))
+            for start in range(0, len(group) - 1, rows):
+                block = values[start : start + rows]
+                distances = simhash.popcount64(
+                    (block[:, None] ^ values[None, start:]).ravel()
+                ).reshape(len(block), len(group) - start)
+                left, right = np.nonzero(np.triu(distances <= threshold, k=1))
+                yield from zip(
+                    group[start + left].tolist(), group[start + right].tolist()
+                )
+
+
+class Command(BaseCommand):
+    help = (
+        "Fingerprint articles that have no SimHash yet (in parallel) and "
+        "print clusters of near-duplicate articles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes (default: CPU count).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Articles fingerprinted per task (default: 5000).",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=int,
+            default=simhash.MAX_DISTANCE,
+            help=(
+                "Maximum Hamming distance between duplicates "
+                f"(default and maximum: {simhash.MAX_DISTANCE})."
+            ),
+        )
+        parser.add_argument(
+            "--min-size",
+            type=int,
+            default=2,
+            help="Only report clusters with at least this many articles.",
+        )
+        parser.add_argument(
+            "--refresh",
+            action="store_true",
+            help="Recompute every fingerprint, not only missing ones.",
+        )
+
+    def handle(self, *args, **options):
+        threshold = options["threshold"]
+        if not 0 <= threshold <= simhash.MAX_DISTANCE:
+            raise CommandError(
+                f"--threshold must be between 0 and {simhash.MAX_DISTANCE}."
+            )
+
+        fingerprinted = self._backfill(options)
+        if fingerprinted:
+            self.stdout.write(f"Fingerprinted {fingerprinted} articles.")
+
+        rows = Article.objects.filter(simhash__isnull=False).values_list(
+            "id", "simhash"
+        )
+        ids = []
+        values = []
+        for pk, value in rows.iterator(chunk_size=10000):
+            ids.append(pk)
+            values.append(value)
+        fingerprints = np.array(values, dtype=np.int64).view(np.uint64)
+        # Articles with the same fingerprint (e.g. identical stubs) share
+        # a cluster without being compared; only distinct ones are.
+        fingerprints, inverse = np.unique(fingerprints, return_inverse=True)
+
+        parent = list(range(len(fingerprints)))
+        for a, b in _close_pairs(fingerprints, threshold):
+            root_a, root_b = _find(parent, a), _find(parent, b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        clusters = {}
+        for pk, i in zip(ids, inverse.ravel().tolist()):
+            clusters.setdefault(_find(parent, i), []).append(pk)
+        clusters = sorted(
+            (c for c in clusters.values() if len(c) >= options["min_size"]),
+            key=len,
+            reverse=True,
+        )
+
+        slugs = dict(
+            Article.objects.filter(
+                pk__in=[pk for cluster in clusters for pk in cluster]
+            ).values_list("id", "slug")
+        )
+        for number, cluster in enumerate(clusters, 1):
+            self.stdout.write(f"Cluster {number} ({len(cluster)} articles):")
+            for pk in cluster:
+                self.stdout.write(f"  {slugs.get(pk, pk)}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Found {len(clusters)} clusters of near-duplicates among "
+                f"{len(ids)} articles."
+            )
+        )
+
+    def _backfill(self, options):
+        articles = Article.objects.order_by("pk")
+        if not options["refresh"]:
+            articles = articles.filter(simhash__isnull=True)
+        ids = list(articles.values_list("pk", flat=True))
+        if not ids:
+            return 0
+        chunk_size = max(1, options["chunk_size"])
+        chunks = [
+            ids[start : start + chunk_size]
+            for start in range(0, len(ids), chunk_size)
+        ]
+        workers = max(1, min(options["workers"], len(chunks)))
+
+        if workers == 1:
+            results = map(_fingerprint_chunk, chunks)
+        else:
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker
+            )
+            results = pool.map(_fingerprint_chunk, chunks)
+
+        count = 0
+        try:
+            for chunk in results:
+                updates = []
+                for pk, value in chunk:
+                    article = Article(pk=pk)
+                    article.set_fingerprint(value)
+                    updates.append(article)
+                # bulk_update skips save(), so search hooks do not fire.
+                Article.objects.bulk_update(
+                    updates, sorted(Article.FINGERPRINT_FIELDS)
+                )
+                count += len(updates)
+        finally:
+            if workers > 1:
+                pool.shutdown()
+        return count
@@ -0,0 +1,145 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from wiki.models import Article, Revision, SavedSearch, SearchAlert
+from wiki.revisions import load_texts
+from wiki.search import get_index, tokenize
+from wiki.search.percolator import Percolator
+
+
+class Command(BaseCommand):
+    help = (
+        "Match new revisions against active saved searches in batches and "
+        "create alerts. Use --loop to keep running as a worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Revisions matched per transaction (default: 500).",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new revisions instead of exiting.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=10.0,
+            help="Seconds between polls with --loop (default: 10).",
+        )
+
+    def handle(self, *args, **options):
+        self._percolator = None
+        self._stamp = None
+        batch_size = max(1, options["batch_size"])
+        while True:
+            revisions = alerts = 0
+            while True:
+                matched, created = self._run_batch(batch_size)
+                revisions += matched
+                alerts += created
+                if matched < batch_size:
+                    break
+            if revisions or not options["loop"]:
+                self.stdout.write(
+                    f"Matched {revisions} revisions against "
+                    f"{len(self._percolator)} saved searches; "
+                    f"created {alerts} alerts."
+                )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
+
+    def _load_percolator(self):
+        searches = SavedSearch.objects.filter(is_active=True)
+        stamp = searches.aggregate(count=Count("id"), last=Max("updated_at"))
+        if stamp == self._stamp:
+            return self._percolator
+        index = get_index()
+        frequency = index.doc_frequency if index.doc_count else None
+        self._percolator = Percolator(
+            (
+                ((pk, user_id), terms)
+                for pk, user_id, terms in searches.values_list(
+                    "id", "user_id", "terms"
+                ).iterator(chunk_size=2000)
+            ),
+            frequency=frequency,
+        )
+        self._stamp = stamp
+        return self._percolator
+
+    def _run_batch(self, batch_size):
+        percolator = self._load_percolator()
+        with transaction.atomic():
+            # Concurrent workers on PostgreSQL take disjoint batches.
+            rows = list(
+                Revision.objects.filter(percolated=False)
+                .select_for_update(skip_locked=True, of=("self",))
+                .order_by("created_at")
+                .values_list(
+                    "id",
+                    "article_id",
+                    "editor_id",
+                    "title",
+                    "summary",
+                    "content_data",
+                    "delta_base",
+                    "article__status",
+                )[:batch_size]
+            )
+            if not rows:
+                return 0, 0
+            texts = load_texts([row[0] for row in rows if row[6] is not None])
+            rows = [
+                (*row[:5], texts.get(row[0], row[5]), row[7]) for row in rows
+            ]
+
+            # Latest matching revision per (saved search, article).
+            matches = {}
+            for pk, article_id, editor_id, *text, status in rows:
+                if status != Article.Status.PUBLISHED or not percolator:
+                    continue
+                terms = set(tokenize(" ".join(text)))
+                for search_id, user_id in percolator.match(terms):
+                    if user_id != editor_id:
+                        matches[search_id, article_id] = pk
+
+            if matches:
+                # Users already have an unread alert for these articles.
+                unread = set(
+                    SearchAlert.objects.filter(
+                        saved_search_id__in={s for s, _ in matches},
+                        article_id__in={a for _, a in matches},
+                        is_read=False,
+                    ).values_list("saved_search_id", "article_id")
+                )
+                SearchAlert.objects.bulk_create(
+                    [
+                        SearchAlert(
+                            saved_search_id=search_id,
+                            article_id=article_id,
+                            revision_id=revision_id,
+                        )
+                        for (search_id, article_id), revision_id in (
+                            matches.items()
+                        )
+                        if (search_id, article_id) not in unread
+                    ],
+                    ignore_conflicts=True,
+                )
+                created = len(matches.keys() - unread)
+            else:
+                created = 0
+
+            Revision.objects.filter(pk__in=[row[0] for row in rows]).update(
+                percolated=True
+            )
+        return len(rows), created
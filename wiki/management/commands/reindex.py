@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from wiki.models import Article
+from wiki.search import article_terms, get_index, get_search_backend
+from wiki.search.backends import InvertedIndexBackend
+from wiki.search.segments import write_segment
+
+
+def _build_segment(path, article_ids):
+    """Tokenize a chunk of articles into a new segment file at path."""
+    rows = (
+        Article.objects.filter(pk__in=article_ids)
+        .values_list("id", "title", "current_summary", "current_content")
+        .iterator(chunk_size=500)
+    )
+    return write_segment(
+        path,
+        (
+            (pk, article_terms(title, summary, content))
+            for pk, title, summary, content in rows
+        ),
+    )
+
+
+def _init_worker():
+    # Workers started with "spawn" need the app registry loaded.
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the article search index. The inverted index is built in "
+        "parallel; database backends are refreshed in place."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes (default: CPU count).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Articles per segment (default: 10000).",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if not isinstance(backend, InvertedIndexBackend):
+            backend.rebuild()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Rebuilt {type(backend).__name__} search index."
+                )
+            )
+            return
+
+        index = get_index()
+        ids = list(Article.objects.order_by("pk").values_list("pk", flat=True))
+        chunk_size = max(1, options["chunk_size"])
+        chunks = [
+            ids[start : start + chunk_size]
+            for start in range(0, len(ids), chunk_size)
+        ]
+        paths = [index.new_segment_path() for _ in chunks]
+        workers = max(1, min(options["workers"], len(chunks)))
+
+        if workers == 1:
+            counts = [_build_segment(p, c) for p, c in zip(paths, chunks)]
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker
+            ) as pool:
+                counts = list(pool.map(_build_segment, paths, chunks))
+
+        index.replace(paths)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {sum(counts)} articles into {len(paths)} "
+                f"segments using {workers} workers."
+            )
+        )
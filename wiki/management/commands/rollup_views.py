@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from wiki.analytics import rollup_mark, rollup_views
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll up article views into hourly and daily totals, continuing "
+        "from where the last run stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lag",
+            type=int,
+            default=10,
+            help=(
+                "Minutes to wait after an hour ends before rolling it up, "
+                "for views still buffered (default: 10)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        hours = rollup_views(lag=datetime.timedelta(minutes=options["lag"]))
+        self.stdout.write(
+            f"Rolled up {hours} hours; views are rolled up to "
+            f"{rollup_mark()}."
+        )
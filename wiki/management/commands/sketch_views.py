@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from wiki.analytics import add_viewers, viewer_key
+from wiki.models import ArticleView
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold the stored raw article views into the daily distinct-viewer "
+        "sketches, e.g. after upgrading. Views already counted are not "
+        "counted twice, so it is safe to run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Views folded per transaction (default: 10000).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        views = ArticleView.objects.order_by("id").values_list(
+            "id",
+            "article_id",
+            "user_id",
+            "session_key",
+            "ip_address",
+            "agent__value",
+            "viewed_at",
+        )
+        last = total = 0
+        while True:
+            rows = list(views.filter(id__gt=last)[:batch_size])
+            if not rows:
+                break
+            with transaction.atomic():
+                add_viewers(
+                    (
+                        article_id,
+                        viewer_key(user_id, session, ip_address, agent or ""),
+                        viewed_at,
+                    )
+                    for (
+                        _,
+                        article_id,
+                        user_id,
+                        session,
+                        ip_address,
+                        agent,
+                        viewed_at,
+                    ) in rows
+                )
+            last = rows[-1][0]
+            total += len(rows)
+        self.stdout.write(f"Folded {total} views into viewer sketches.")
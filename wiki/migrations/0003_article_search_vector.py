@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:40
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_FORWARD = """
+CREATE FUNCTION wiki_article_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A')
+        || setweight(
+            to_tsvector('english', coalesce(NEW.current_summary, '')), 'B'
+        )
+        || setweight(
+            to_tsvector('english', coalesce(NEW.current_content, '')), 'C'
+        );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER wiki_article_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, current_summary, current_content
+    ON wiki_article
+    FOR EACH ROW EXECUTE FUNCTION wiki_article_search_vector_update();
+
+UPDATE wiki_article SET title = title;
+
+CREATE INDEX wiki_article_search_vector_gin
+    ON wiki_article USING gin (search_vector);
+"""
+
+POSTGRES_REVERSE = """
+DROP INDEX IF EXISTS wiki_article_search_vector_gin;
+DROP TRIGGER IF EXISTS wiki_article_search_vector_trigger ON wiki_article;
+DROP FUNCTION IF EXISTS wiki_article_search_vector_update();
+"""
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE wiki_article_fts USING fts5(
+        article_id UNINDEXED,
+        title,
+        current_summary,
+        current_content,
+        tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    INSERT INTO wiki_article_fts (
+        article_id, title, current_summary, current_content
+    )
+    SELECT id, title, current_summary, current_content FROM wiki_article
+    """,
+]
+
+SQLITE_REVERSE = ["DROP TABLE IF EXISTS wiki_article_fts"]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(POSTGRES_FORWARD)
+    elif vendor == "sqlite":
+        for statement in SQLITE_FORWARD:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(POSTGRES_REVERSE)
+    elif vendor == "sqlite":
+        for statement in SQLITE_REVERSE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wiki", "0002_auto_20251007_0807"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
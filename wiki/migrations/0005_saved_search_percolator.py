@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:52
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0004_article_simhash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('query', models.CharField(max_length=200)),
+                ('terms', models.JSONField(default=list, editable=False)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchAlert',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_read', models.BooleanField(default=False)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        # Existing revisions predate every saved search: add the column as
+        # already percolated, then switch the default for new rows.
+        migrations.AddField(
+            model_name='revision',
+            name='percolated',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='revision',
+            name='percolated',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='revision',
+            index=models.Index(condition=models.Q(('percolated', False)), fields=['created_at'], name='wiki_revision_unpercolated'),
+        ),
+        migrations.AddField(
+            model_name='savedsearch',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='searchalert',
+            name='article',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_alerts', to='wiki.article'),
+        ),
+        migrations.AddField(
+            model_name='searchalert',
+            name='revision',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_alerts', to='wiki.revision'),
+        ),
+        migrations.AddField(
+            model_name='searchalert',
+            name='saved_search',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='wiki.savedsearch'),
+        ),
+        migrations.AddIndex(
+            model_name='savedsearch',
+            index=models.Index(fields=['user', '-created_at'], name='wiki_saveds_user_id_81e3c9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchalert',
+            index=models.Index(fields=['saved_search', 'is_read', '-created_at'], name='wiki_search_saved_s_aa86ee_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchalert',
+            unique_together={('saved_search', 'revision')},
+        ),
+    ]
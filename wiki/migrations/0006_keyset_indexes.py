@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0005_saved_search_percolator'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['-created_at', '-id'], name='wiki_articl_created_e5e90f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='revision',
+            index=models.Index(fields=['-created_at', '-id'], name='wiki_revisi_created_09348b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='revision',
+            index=models.Index(fields=['article', '-created_at', '-id'], name='wiki_revisi_article_a35c7a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='section',
+            index=models.Index(fields=['order', 'id'], name='wiki_sectio_order_62531f_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:07
+
+from django.db import migrations, models
+
+PATH_STEP = 10
+
+
+def number_sections(apps, schema_editor):
+    # Same walk as Section.renumber(), article by article.
+    Section = apps.get_model('wiki', 'Section')
+    children = {}
+    rows = Section.objects.order_by('article_id', 'order').only(
+        'id', 'article_id', 'parent_id', 'order'
+    )
+    for section in rows.iterator(chunk_size=2000):
+        key = (section.article_id, section.parent_id)
+        children.setdefault(key, []).append(section)
+    roots = [key for key in children if key[1] is None]
+    changed = []
+    for article_id, _ in roots:
+        pending = [(None, '', '', 0)]
+        while pending:
+            parent_id, path, number, depth = pending.pop()
+            siblings = children.get((article_id, parent_id), ())
+            for position, section in enumerate(siblings, 1):
+                section.path = f'{path}{section.order:0{PATH_STEP}d}'
+                section.depth = depth
+                section.number = (
+                    f'{number}.{position}' if number else str(position)
+                )
+                changed.append(section)
+                pending.append(
+                    (section.pk, section.path, section.number, depth + 1)
+                )
+    Section.objects.bulk_update(
+        changed, ['path', 'depth', 'number'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0007_counter_caches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='section',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='section',
+            name='number',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='section',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=250),
+        ),
+        migrations.AddIndex(
+            model_name='section',
+            index=models.Index(fields=['article', 'path'], name='wiki_sectio_article_ddd934_idx'),
+        ),
+        migrations.RunPython(number_sections, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:10
+
+from django.db import migrations, models
+
+from core.lexorank import DIGITS, spread
+
+RANK_WIDTH = 10
+
+
+def order_to_rank(apps, schema_editor):
+    # Rank siblings by their old order, then rebuild the outline paths
+    # from the ranks as Section.renumber() does.
+    Section = apps.get_model('wiki', 'Section')
+    children = {}
+    rows = Section.objects.order_by('article_id', 'order').only(
+        'id', 'article_id', 'parent_id', 'order'
+    )
+    for section in rows.iterator(chunk_size=2000):
+        key = (section.article_id, section.parent_id)
+        children.setdefault(key, []).append(section)
+    for siblings in children.values():
+        for section, rank in zip(siblings, spread(len(siblings))):
+            section.rank = rank
+    changed = []
+    for article_id, parent_id in children:
+        if parent_id is not None:
+            continue
+        pending = [(None, '')]
+        while pending:
+            parent_id, path = pending.pop()
+            for section in children.get((article_id, parent_id), ()):
+                section.path = path + section.rank.ljust(RANK_WIDTH, DIGITS[0])
+                changed.append(section)
+                pending.append((section.pk, section.path))
+    Section.objects.bulk_update(changed, ['rank', 'path'], batch_size=1000)
+
+
+def rank_to_order(apps, schema_editor):
+    Section = apps.get_model('wiki', 'Section')
+    changed = []
+    article_id = None
+    for section in Section.objects.order_by('article_id', 'path').only(
+        'id', 'article_id', 'path'
+    ):
+        if section.article_id != article_id:
+            article_id, order = section.article_id, 0
+        order += 1
+        section.order = order
+        changed.append(section)
+    Section.objects.bulk_update(changed, ['order'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0008_section_outline'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='section',
+            options={'ordering': ['path']},
+        ),
+        migrations.RemoveIndex(
+            model_name='section',
+            name='wiki_sectio_order_62531f_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='section',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='section',
+            name='rank',
+            field=models.CharField(default='', editable=False, max_length=10),
+            preserve_default=False,
+        ),
+        migrations.RunPython(order_to_rank, rank_to_order),
+        migrations.AddIndex(
+            model_name='section',
+            index=models.Index(fields=['path', 'id'], name='wiki_sectio_path_47b934_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='section',
+            index=models.Index(fields=['article', 'parent', 'rank'], name='wiki_sectio_article_49021f_idx'),
+        ),
+        migrations.RemoveField(
+            model_name='section',
+            name='order',
+        ),
+    ]
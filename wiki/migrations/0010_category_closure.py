@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_closure(apps, schema_editor):
+    Category = apps.get_model('wiki', 'Category')
+    CategoryClosure = apps.get_model('wiki', 'CategoryClosure')
+    Article = apps.get_model('wiki', 'Article')
+    categories = {category.pk: category for category in Category.objects.all()}
+    published = {}
+    for category_id in Article.objects.filter(
+        status='published', category__isnull=False
+    ).values_list('category_id', flat=True):
+        published[category_id] = published.get(category_id, 0) + 1
+
+    links = []
+    for category in categories.values():
+        chain = [category]
+        while chain[-1].parent_id is not None and len(chain) <= len(
+            categories
+        ):
+            chain.append(categories[chain[-1].parent_id])
+        links.extend(
+            CategoryClosure(
+                ancestor_id=ancestor.pk, descendant_id=category.pk, depth=depth
+            )
+            for depth, ancestor in enumerate(chain)
+        )
+        category.breadcrumbs = [
+            {'id': str(ancestor.pk), 'name': ancestor.name, 'slug': ancestor.slug}
+            for ancestor in reversed(chain)
+        ]
+        for ancestor in chain:
+            ancestor.subtree_published_count += published.get(category.pk, 0)
+    CategoryClosure.objects.bulk_create(links, batch_size=1000)
+    Category.objects.bulk_update(
+        categories.values(),
+        ['breadcrumbs', 'subtree_published_count'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0009_section_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='breadcrumbs',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='subtree_published_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='published articles in subtree'),
+        ),
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='wiki.category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='wiki.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='wiki_catego_descend_c1663a_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def encode_user_agents(apps, schema_editor):
+    ArticleView = apps.get_model('wiki', 'ArticleView')
+    UserAgent = apps.get_model('wiki', 'UserAgent')
+    values = (
+        ArticleView.objects.exclude(user_agent='')
+        .order_by()
+        .values_list('user_agent', flat=True)
+        .distinct()
+    )
+    for value in values.iterator():
+        agent, _ = UserAgent.objects.get_or_create(value=value[:512])
+        ArticleView.objects.filter(user_agent=value).update(agent=agent)
+
+
+def decode_user_agents(apps, schema_editor):
+    ArticleView = apps.get_model('wiki', 'ArticleView')
+    UserAgent = apps.get_model('wiki', 'UserAgent')
+    for agent in UserAgent.objects.iterator():
+        ArticleView.objects.filter(agent=agent).update(user_agent=agent.value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0011_article_view_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('position', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=512, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='articleview',
+            name='agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='wiki.useragent'),
+        ),
+        migrations.RunPython(encode_user_agents, decode_user_agents),
+        migrations.RemoveField(
+            model_name='articleview',
+            name='user_agent',
+        ),
+        migrations.CreateModel(
+            name='ArticleViewRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('viewer', models.CharField(choices=[('member', 'Signed-in user'), ('anonymous', 'Anonymous')], max_length=10)),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_rollups', to='wiki.article')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='wiki.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'period_start'], name='wiki_articl_granula_3b9546_idx'), models.Index(fields=['granularity', 'category', 'period_start'], name='wiki_articl_granula_69eeba_idx')],
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'article', 'period_start', 'viewer'), name='wiki_view_rollup_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0012_view_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleViewerSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sketch', models.BinaryField()),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='viewer_sketches', to='wiki.article')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='wiki_articl_day_4908b1_idx')],
+                'constraints': [models.UniqueConstraint(fields=('article', 'day'), name='wiki_viewer_sketch_unique')],
+            },
+        ),
+    ]
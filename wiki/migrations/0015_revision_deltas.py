@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0014_trending_scores'),
+    ]
+
+    # Existing rows become keyframes as they are; the compress_revisions
+    # command turns them into deltas in batches.
+    operations = [
+        migrations.RenameField(
+            model_name='revision',
+            old_name='content',
+            new_name='content_data',
+        ),
+        migrations.AlterField(
+            model_name='revision',
+            name='content_data',
+            field=models.TextField(editable=False),
+        ),
+        migrations.AddField(
+            model_name='revision',
+            name='delta_base',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='delta_dependents', to='wiki.revision'),
+        ),
+        migrations.AddField(
+            model_name='revision',
+            name='delta_depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:42
+
+import core.fields
+from django.db import migrations
+
+# The search vector trigger of migration 0003 cannot read compressed
+# content. For those rows it keeps the content lexemes already indexed:
+# compressing a value leaves its text as it was, and edited content is
+# indexed by DatabaseSearchBackend.index_articles() after the save.
+POSTGRES_SEARCH_VECTOR_UPDATE = """
+CREATE OR REPLACE FUNCTION wiki_article_search_vector_update()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A')
+        || setweight(
+            to_tsvector('english', coalesce(NEW.current_summary, '')), 'B'
+        )
+        || {content};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+PLAIN_CONTENT = """setweight(
+            to_tsvector('english', coalesce(NEW.current_content, '')), 'C'
+        )"""
+
+COMPRESSED_CONTENT = """CASE
+            WHEN left(coalesce(NEW.current_content, ''), 1) <> chr(31)
+                THEN """ + PLAIN_CONTENT + """
+            WHEN TG_OP = 'UPDATE'
+                THEN ts_filter(
+                    coalesce(OLD.search_vector, ''::tsvector), '{c}'
+                )
+            ELSE ''::tsvector
+        END"""
+
+TEXT_FIELDS = {
+    'Article': ['current_content'],
+    'Revision': ['content_data'],
+    'Section': ['content'],
+}
+
+
+def index_compressed_content(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            POSTGRES_SEARCH_VECTOR_UPDATE.format(content=COMPRESSED_CONTENT)
+        )
+
+
+def index_plain_content(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            POSTGRES_SEARCH_VECTOR_UPDATE.format(content=PLAIN_CONTENT)
+        )
+
+
+def compress_texts(apps, schema_editor):
+    # Batches commit one by one (the migration is not atomic), and the
+    # application reads both forms, so this can run while it serves.
+    for model_name, names in TEXT_FIELDS.items():
+        core.fields.recompress(apps.get_model('wiki', model_name), names)
+
+
+def expand_texts(apps, schema_editor):
+    for model_name, names in TEXT_FIELDS.items():
+        core.fields.recompress(
+            apps.get_model('wiki', model_name), names, expand=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('wiki', '0015_revision_deltas'),
+    ]
+
+    # The columns stay text columns, so only the model state changes.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='article',
+                    name='current_content',
+                    field=core.fields.CompressedTextField(blank=True),
+                ),
+                migrations.AlterField(
+                    model_name='revision',
+                    name='content_data',
+                    field=core.fields.CompressedTextField(editable=False),
+                ),
+                migrations.AlterField(
+                    model_name='section',
+                    name='content',
+                    field=core.fields.CompressedTextField(),
+                ),
+            ],
+        ),
+        migrations.RunPython(index_compressed_content, index_plain_content),
+        migrations.RunPython(compress_texts, expand_texts),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0016_compressed_texts'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='revision',
+            name='simhash',
+        ),
+    ]
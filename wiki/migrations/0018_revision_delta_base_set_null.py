@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0017_remove_revision_simhash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='revision',
+            name='delta_base',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='delta_dependents', to='wiki.revision'),
+        ),
+    ]
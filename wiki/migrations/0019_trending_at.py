@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:19
+
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+# Frozen copy of wiki.trending.EPOCH as of this migration
+EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def log_sum(values):
+    top = max(values)
+    return top + math.log(sum(math.exp(value - top) for value in values))
+
+
+def score_recent_views(apps, schema_editor):
+    # Scores are now decayed view counts as of trending_at; recompute
+    # them all from recent views with the configured half-life. Views
+    # older than ten half-lives weigh under 0.1% and are skipped; each
+    # hour's views are weighted as if seen mid-hour.
+    Article = apps.get_model('wiki', 'Article')
+    ArticleView = apps.get_model('wiki', 'ArticleView')
+    half_life = settings.TRENDING_HALF_LIFE
+    rate = math.log(2) / (half_life * 3600)
+    now = timezone.now()
+    Article.objects.update(trending_score=0.0, trending_at=0.0)
+    hours = (
+        ArticleView.objects.filter(
+            viewed_at__gte=now - timedelta(hours=10 * half_life)
+        )
+        .annotate(hour=TruncHour('viewed_at'))
+        .values_list('article', 'hour')
+        .annotate(views=Count('id'))
+        .order_by()
+    )
+    weights = {}
+    for article_id, hour, views in hours.iterator():
+        seen = min(hour + timedelta(minutes=30), now)
+        weight = -rate * (now - seen).total_seconds()
+        weights.setdefault(article_id, []).append(weight + math.log(views))
+    articles = list(Article.objects.filter(pk__in=weights).only('id'))
+    for article in articles:
+        article.trending_score = log_sum(weights[article.pk])
+        article.trending_at = (now - EPOCH).total_seconds()
+    Article.objects.bulk_update(
+        articles, ['trending_score', 'trending_at'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0018_revision_delta_base_set_null'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='article',
+            name='wiki_articl_categor_729c8c_idx',
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='trending_at',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.RunPython(
+            score_recent_views, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0019_trending_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewerGroupSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('site', 'All articles'), ('category', 'Category'), ('author', 'Author')], max_length=8)),
+                ('key', models.CharField(blank=True, max_length=36)),
+                ('day', models.DateField()),
+                ('sketch', models.BinaryField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'key', 'day'), name='wiki_viewer_group_sketch_unique')],
+            },
+        ),
+    ]
@@ -1,8 +1,35 @@
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models.signals import pre_delete
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.utils.text import slugify
+import copy
 import uuid
 
+from core.counters import (
+    CounterCacheMixin,
+    CounterField,
+    SubtreeCounterField,
+    update_counted,
+)
+from core.fields import CompressedTextField
+from core.lexorank import DIGITS, rank_between, spread
+from .search import get_suggest_index, index_articles, unindex_articles
+from .search.percolator import query_terms
+from .revisions import encode, get_text_cache, load_texts
+from .tracking import get_view_buffer
+from .search.simhash import (
+    MAX_DISTANCE,
+    bands,
+    distance,
+    simhash,
+    to_signed,
+    to_unsigned,
+)
+
 User = get_user_model()
 
 
@@ -17,8 +44,14 @@ class BaseModel(models.Model):
         abstract = True
 
 
-class Category(BaseModel):
-    """Categories for organizing articles."""
+class Category(CounterCacheMixin, BaseModel):
+    """Categories for organizing articles.
+
+    The tree is mirrored in ``CategoryClosure``, which links every
+    category to each of its ancestors, so subtrees and ancestor chains
+    are single queries. Both the closure rows and the ``breadcrumbs`` of
+    a category's subtree are maintained when it is created or moved.
+    """
 
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True, blank=True)
@@ -36,6 +69,21 @@ class Category(BaseModel):
         related_name="subcategories",
     )
 
+    # [{"id", "name", "slug"}, ...] from the root down to this category
+    breadcrumbs = models.JSONField(default=list, blank=True, editable=False)
+
+    # Denormalized counts (see core.counters)
+    article_count = CounterField(
+        "wiki.Article", "category", verbose_name="articles"
+    )
+    subtree_published_count = SubtreeCounterField(
+        "wiki.Article",
+        "category",
+        ancestors="ancestor_links__ancestor",
+        condition={"status": "published"},
+        verbose_name="published articles in subtree",
+    )
+
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ["name"]
@@ -43,21 +91,199 @@ class Category(BaseModel):
     def __str__(self):
         return self.name
 
+    # Fields that show up in breadcrumbs
+    BREADCRUMB_FIELDS = {"name", "slug", "parent"}
+
+    def clean(self):
+        super().clean()
+        self._check_parent()
+
+    def _check_parent(self):
+        if (
+            self.parent_id is not None
+            and not self._state.adding
+            and CategoryClosure.objects.filter(
+                ancestor_id=self.pk, descendant_id=self.parent_id
+            ).exists()
+        ):
+            raise ValidationError(
+                {"parent": "A category cannot be moved below itself."}
+            )
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        changed = set(update_fields) if update_fields is not None else None
+        adding = self._state.adding
+        with transaction.atomic():
+            old_parent_id = (
+                None
+                if adding
+                else Category.objects.filter(pk=self.pk)
+                .values_list("parent_id", flat=True)
+                .first()
+            )
+            if not adding and old_parent_id != self.parent_id:
+                self._check_parent()
+            super().save(*args, **kwargs)
+            if adding:
+                self._link()
+            elif old_parent_id != self.parent_id:
+                self._move(old_parent_id)
+            if changed is None or self.BREADCRUMB_FIELDS & changed:
+                self._refresh_breadcrumbs()
+        transaction.on_commit(
+            lambda: get_suggest_index().update_category(self), robust=True
+        )
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # Articles of the deleted subtree become uncategorized.
+            self._add_to_ancestors(
+                -self._stored_published_count(), exclude_self=True
+            )
+            subtree = list(
+                self.descendant_links.values_list("descendant_id", flat=True)
+            )
+            result = super().delete(*args, **kwargs)
+        transaction.on_commit(
+            lambda: get_suggest_index().delete(
+                ("category", pk) for pk in subtree
+            ),
+            robust=True,
+        )
+        return result
+
+    def _stored_published_count(self):
+        return (
+            Category.objects.filter(pk=self.pk)
+            .values_list("subtree_published_count", flat=True)
+            .first()
+            or 0
+        )
+
+    def _add_to_ancestors(self, delta, exclude_self=False):
+        if not delta:
+            return
+        ancestors = Category.objects.filter(descendant_links__descendant=self)
+        if exclude_self:
+            ancestors = ancestors.exclude(pk=self.pk)
+        if delta < 0:
+            ancestors = ancestors.filter(subtree_published_count__gte=-delta)
+        ancestors.update(
+            subtree_published_count=models.F("subtree_published_count") + delta
+        )
+
+    def _link(self):
+        """Add closure rows for a new leaf category."""
+        links = [CategoryClosure(ancestor=self, descendant=self, depth=0)]
+        if self.parent_id is not None:
+            links.extend(
+                CategoryClosure(
+                    ancestor_id=ancestor_id, descendant=self, depth=depth + 1
+                )
+                for ancestor_id, depth in CategoryClosure.objects.filter(
+                    descendant_id=self.parent_id
+                ).values_list("ancestor_id", "depth")
+            )
+        CategoryClosure.objects.bulk_create(links)
+
+    def _move(self, old_parent_id):
+        """Re-link the subtree of this category below its new parent."""
+        subtree = list(
+            CategoryClosure.objects.filter(ancestor=self).values_list(
+                "descendant_id", "depth"
+            )
+        )
+        subtree_ids = [pk for pk, _ in subtree]
+        published = self._stored_published_count()
+        self._add_to_ancestors(-published, exclude_self=True)
+        CategoryClosure.objects.filter(descendant_id__in=subtree_ids).exclude(
+            ancestor_id__in=subtree_ids
+        ).delete()
+        if self.parent_id is not None:
+            ancestors = CategoryClosure.objects.filter(
+                descendant_id=self.parent_id
+            ).values_list("ancestor_id", "depth")
+            CategoryClosure.objects.bulk_create(
+                CategoryClosure(
+                    ancestor_id=ancestor_id,
+                    descendant_id=descendant_id,
+                    depth=ancestor_depth + depth + 1,
+                )
+                for ancestor_id, ancestor_depth in ancestors
+                for descendant_id, depth in subtree
+            )
+        self._add_to_ancestors(published, exclude_self=True)
+
+    def _refresh_breadcrumbs(self):
+        """Recompute the breadcrumbs of this category and its subtree."""
+        links = (
+            CategoryClosure.objects.filter(
+                descendant__ancestor_links__ancestor=self
+            )
+            .order_by("-depth")
+            .values_list(
+                "descendant_id",
+                "ancestor_id",
+                "ancestor__name",
+                "ancestor__slug",
+            )
+        )
+        trails = {}
+        for descendant_id, pk, name, slug in links:
+            trails.setdefault(descendant_id, []).append(
+                {"id": str(pk), "name": name, "slug": slug}
+            )
+        self.breadcrumbs = trails.get(self.pk, [])
+        categories = Category.objects.filter(pk__in=trails).only(
+            "id", "breadcrumbs"
+        )
+        changed = []
+        for category in categories:
+            if category.breadcrumbs != trails[category.pk]:
+                category.breadcrumbs = trails[category.pk]
+                changed.append(category)
+        Category.objects.bulk_update(changed, ["breadcrumbs"])
 
     def get_full_path(self):
         """Get the full category path (parent > child)."""
-        if self.parent:
-            return f"{self.parent.get_full_path()} > {self.name}"
-        return self.name
+        if not self.breadcrumbs:
+            return self.name
+        return " > ".join(crumb["name"] for crumb in self.breadcrumbs)
+
+
+class CategoryClosure(models.Model):
+    """One row per (ancestor, descendant) pair of the category tree.
+
+    Every category is also its own ancestor at depth 0.
+    """
+
+    ancestor = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="descendant_links"
+    )
+    descendant = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="ancestor_links"
+    )
+    depth = models.PositiveSmallIntegerField()
 
+    class Meta:
+        unique_together = ["ancestor", "descendant"]
+        indexes = [
+            models.Index(fields=["descendant", "depth"]),
+        ]
 
-class Article(BaseModel):
+    def __str__(self):
+        return f"{self.ancestor_id} > {self.descendant_id} ({self.depth})"
+
+
+class Article(CounterCacheMixin, BaseModel):
     """Main article model with versioning support."""
 
+    # Raised by view tracking flushes (see wiki.trending)
+    atomic_fields = ("trending_score", "trending_at")
+
     class Status(models.TextChoices):
         DRAFT = "draft", "Draft"
         PUBLISHED = "published", "Published"
@@ -67,7 +293,7 @@ class Article(BaseModel):
     slug = models.SlugField(max_length=200, unique=True, blank=True)
 
     # Current version fields (for quick access)
-    current_content = models.TextField(blank=True)
+    current_content = CompressedTextField(blank=True)
     current_summary = models.TextField(
         max_length=500, blank=True, help_text="Brief summary of the article"
     )
@@ -99,6 +325,20 @@ class Article(BaseModel):
     # Analytics
     view_count = models.PositiveIntegerField(default=0)
     featured = models.BooleanField(default=False)
+    # Log of the decayed view count as of trending_at, in seconds since
+    # wiki.trending.EPOCH
+    trending_score = models.FloatField(default=0.0, editable=False)
+    trending_at = models.FloatField(default=0.0, editable=False)
+
+    # Denormalized counts (see core.counters)
+    section_count = CounterField("wiki.Section", "article")
+    revision_count = CounterField("wiki.Revision", "article")
+    comment_count = CounterField(
+        "comments.Comment",
+        "content_object",
+        # Comment.Status.ACTIVE
+        condition={"status": "active"},
+    )
 
     # Revision tracking
     current_revision = models.OneToOneField(
@@ -109,27 +349,179 @@ class Article(BaseModel):
         related_name="current_for_article",
     )
 
+    # Weighted full-text document, maintained by a database trigger on
+    # PostgreSQL (see DatabaseSearchBackend); unused elsewhere.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # SimHash of current_content, split into indexed bands for
+    # near-duplicate lookups (see wiki.search.simhash)
+    simhash = models.BigIntegerField(null=True, blank=True, editable=False)
+    simhash_band0 = models.IntegerField(null=True, editable=False)
+    simhash_band1 = models.IntegerField(null=True, editable=False)
+    simhash_band2 = models.IntegerField(null=True, editable=False)
+    simhash_band3 = models.IntegerField(null=True, editable=False)
+
     class Meta:
         ordering = ["-updated_at"]
         indexes = [
             models.Index(fields=["status", "featured"]),
             models.Index(fields=["category", "status"]),
             models.Index(fields=["-updated_at"]),
+            models.Index(fields=["-created_at", "-id"]),
+            models.Index(fields=["simhash_band0"]),
+            models.Index(fields=["simhash_band1"]),
+            models.Index(fields=["simhash_band2"]),
+            models.Index(fields=["simhash_band3"]),
         ]
 
     def __str__(self):
         return self.title
 
+    # Fields that feed the search index and the typeahead index
+    SEARCH_FIELDS = {"title", "current_summary", "current_content"}
+    SUGGEST_FIELDS = {"title", "slug", "tags", "featured"}
+    FINGERPRINT_FIELDS = {
+        "simhash",
+        "simhash_band0",
+        "simhash_band1",
+        "simhash_band2",
+        "simhash_band3",
+    }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        article = super().from_db(db, field_names, values)
+        # To skip suggestion updates when nothing they show has changed
+        article._stored_suggest = article._suggest_values()
+        article._stored_status = article.__dict__.get("status")
+        return article
+
+    def _suggest_values(self):
+        if self.get_deferred_fields() & self.SUGGEST_FIELDS:
+            return None
+        return [
+            copy.deepcopy(getattr(self, name))
+            for name in sorted(self.SUGGEST_FIELDS)
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+
+        update_fields = kwargs.get("update_fields")
+        changed = set(update_fields) if update_fields is not None else None
+        if changed is None or "current_content" in changed:
+            self.set_fingerprint(simhash(self.current_content))
+            if changed is not None:
+                kwargs["update_fields"] = changed | self.FINGERPRINT_FIELDS
+
         super().save(*args, **kwargs)
 
-    def increment_view_count(self):
-        """Increment view count atomically."""
-        Article.objects.filter(id=self.id).update(
-            view_count=models.F("view_count") + 1
+        if (
+            (changed is None or "status" in changed)
+            and self.__dict__.get("status") == self.Status.PUBLISHED
+            and getattr(self, "_stored_status", None) != self.Status.PUBLISHED
+            and self.current_revision_id is not None
+        ):
+            # Revisions of unpublished articles never raise alerts (see
+            # the percolate command); match the current one on publish.
+            Revision.objects.filter(pk=self.current_revision_id).update(
+                percolated=False
+            )
+        self._stored_status = self.__dict__.get("status")
+
+        if settings.SEARCH_INDEX_AUTOUPDATE and (
+            changed is None or self.SEARCH_FIELDS & changed
+        ):
+            transaction.on_commit(lambda: index_articles([self]), robust=True)
+        suggested = self._suggest_values()
+        if (changed is None or self.SUGGEST_FIELDS & changed) and (
+            suggested is None
+            or suggested != getattr(self, "_stored_suggest", None)
+        ):
+            transaction.on_commit(
+                lambda: get_suggest_index().update_article(self), robust=True
+            )
+        self._stored_suggest = suggested
+
+    def delete(self, *args, **kwargs):
+        article_id = self.id
+        result = super().delete(*args, **kwargs)
+        if settings.SEARCH_INDEX_AUTOUPDATE:
+            transaction.on_commit(
+                lambda: unindex_articles([article_id]), robust=True
+            )
+        transaction.on_commit(
+            lambda: get_suggest_index().delete([("article", article_id)]),
+            robust=True,
+        )
+        return result
+
+    def set_fingerprint(self, value):
+        """Store an unsigned SimHash and its bands on the instance."""
+        self.simhash = to_signed(value)
+        (
+            self.simhash_band0,
+            self.simhash_band1,
+            self.simhash_band2,
+            self.simhash_band3,
+        ) = bands(value)
+
+    def get_near_duplicates(self, max_distance=MAX_DISTANCE):
+        """Return (article, distance) pairs whose content nearly matches.
+
+        Candidates share at least one fingerprint band, which is a few
+        index lookups; exact Hamming distances are checked in Python.
+        """
+        if self.simhash is None:
+            return []
+        value = to_unsigned(self.simhash)
+        match = models.Q()
+        for band, band_value in enumerate(bands(value)):
+            match |= models.Q(**{f"simhash_band{band}": band_value})
+        candidates = (
+            Article.objects.filter(match)
+            .exclude(pk=self.pk)
+            .only("id", "title", "slug", "simhash")
+        )
+        found = [
+            (candidate, distance(value, candidate.simhash))
+            for candidate in candidates
+        ]
+        return sorted(
+            [item for item in found if item[1] <= max_distance],
+            key=lambda item: item[1],
+        )
+
+    def get_outline(self):
+        """Return the top-level sections, each with a ``children`` list.
+
+        The whole tree comes from one query on the (article, path) index.
+        """
+        roots = []
+        ancestors = []
+        sections = self.sections.order_by("path").only(
+            "id",
+            "article_id",
+            "parent_id",
+            "title",
+            "path",
+            "depth",
+            "number",
         )
+        for section in sections:
+            section.children = []
+            del ancestors[section.depth :]
+            if ancestors:
+                ancestors[-1].children.append(section)
+            else:
+                roots.append(section)
+            ancestors.append(section)
+        return roots
+
+    def increment_view_count(self):
+        """Count an anonymous view (buffered, see wiki.tracking)."""
+        get_view_buffer().record(self.id)
 
     def get_absolute_url(self):
         """Get the article URL."""
@@ -139,13 +531,14 @@ class Article(BaseModel):
     def is_published(self):
         return self.status == self.Status.PUBLISHED
 
-    @property
-    def revision_count(self):
-        return self.revisions.count()
-
 
 class Revision(BaseModel):
-    """Article revision for version control."""
+    """Article revision for version control.
+
+    The text is stored as a delta against the previous revision where
+    that saves space (see wiki.revisions); ``content`` reads and sets it
+    like a regular field, but the text cannot change once saved.
+    """
 
     article = models.ForeignKey(
         Article, on_delete=models.CASCADE, related_name="revisions"
@@ -154,11 +547,23 @@ class Revision(BaseModel):
 
     # Content
     title = models.CharField(max_length=200)
-    content = models.TextField()
     summary = models.TextField(
         max_length=500, blank=True, help_text="Brief summary of the article"
     )
 
+    # The full text, or a delta against the text of delta_base
+    content_data = CompressedTextField(editable=False)
+    delta_base = models.ForeignKey(
+        "self",
+        # store_dependents_in_full() has rewritten them by then
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="delta_dependents",
+    )
+    delta_depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
     # Change tracking
     change_message = models.TextField(
         blank=True, help_text="Description of what changed in this revision"
@@ -170,17 +575,67 @@ class Revision(BaseModel):
     # Metadata from article at time of revision
     tags = models.JSONField(default=list, blank=True)
 
+    # Set once the percolate command matched this revision against saved
+    # searches; the partial index keeps the pending queue cheap to scan.
+    percolated = models.BooleanField(default=False, editable=False)
+
     class Meta:
         ordering = ["-version_number"]
         unique_together = ["article", "version_number"]
         indexes = [
             models.Index(fields=["article", "-version_number"]),
+            models.Index(fields=["-created_at", "-id"]),
+            models.Index(fields=["article", "-created_at", "-id"]),
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(percolated=False),
+                name="wiki_revision_unpercolated",
+            ),
         ]
 
     def __str__(self):
         return f"{self.article.title} v{self.version_number}"
 
+    # Article columns a saved revision becomes the current version of
+    ARTICLE_FIELDS = [
+        "current_content",
+        "current_summary",
+        "title",
+        "tags",
+        "last_editor",
+        "current_revision",
+        "updated_at",
+    ]
+
+    _content = None
+    _content_changed = False
+
+    @property
+    def content(self):
+        if self._content is None:
+            if self.delta_base_id is None:
+                self._content = self.content_data
+            else:
+                self._content = load_texts([self.pk])[self.pk]
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+        self._content_changed = True
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._content = None
+        self._content_changed = False
+
     def save(self, *args, **kwargs):
+        if self._content_changed and not self._state.adding:
+            raise ValueError(
+                "The text of a saved revision cannot be changed; "
+                "create a new revision instead."
+            )
+        last_revision = None
         if not self.version_number:
             # Auto-increment version number
             last_revision = (
@@ -193,7 +648,18 @@ class Revision(BaseModel):
                 last_revision.version_number + 1 if last_revision else 1
             )
 
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "content" in update_fields:
+            kwargs["update_fields"] = set(update_fields) - {"content"}
+        adding = self._state.adding
+
+        with transaction.atomic():
+            if adding:
+                self._store_content(last_revision)
+            super().save(*args, **kwargs)
+        self._content_changed = False
+        if adding:
+            get_text_cache().set(self.pk, self.content)
 
         # Update article's current fields
         self.article.current_content = self.content
@@ -202,22 +668,84 @@ class Revision(BaseModel):
         self.article.tags = self.tags
         self.article.last_editor = self.editor
         self.article.current_revision = self
-        self.article.save()
+        self.article.save(update_fields=self.ARTICLE_FIELDS)
 
     @property
     def is_current(self):
         return self.article.current_revision == self
 
+    def _store_content(self, previous=None):
+        """Encode the text after the previous revision's (or in full)."""
+        if previous is None:
+            previous = (
+                Revision.objects.filter(
+                    article_id=self.article_id,
+                    version_number__lt=self.version_number,
+                )
+                .order_by("-version_number")
+                .first()
+            )
+        data, is_delta = (
+            encode(self.content, previous.content, previous.delta_depth)
+            if previous is not None
+            else encode(self.content)
+        )
+        self.content_data = data
+        self.delta_base = previous if is_delta else None
+        self.delta_depth = previous.delta_depth + 1 if is_delta else 0
+
+    def _detach_dependents(self):
+        """Store the revisions based on this one in full."""
+        if self._state.adding:
+            return
+        dependents = list(
+            Revision.objects.filter(delta_base=self).values_list(
+                "pk", flat=True
+            )
+        )
+        for pk, text in load_texts(dependents).items():
+            Revision.objects.filter(pk=pk).update(
+                content_data=text, delta_base=None, delta_depth=0
+            )
+
+
+def store_dependents_in_full(sender, instance, origin=None, **kwargs):
+    # Deletes send pre_delete for every row before removing any, so the
+    # texts based on this revision can still be rebuilt, whichever way it
+    # is deleted (instance, queryset or cascade from a user or article).
+    if isinstance(origin, Article) and origin.pk == instance.article_id:
+        # The article's whole history goes with it.
+        return
+    instance._detach_dependents()
+
+
+pre_delete.connect(store_dependents_in_full, sender=Revision)
+
 
 class Section(BaseModel):
-    """Sections within articles for better organization."""
+    """Sections within articles for better organization.
+
+    Siblings are ordered by ``rank``, a lexicographic key (see
+    core.lexorank), so placing a section between two others writes only
+    that section's key. ``path`` concatenates the padded ranks of the
+    section and its ancestors, so ordering an article's sections by path
+    yields its outline depth-first. ``path``, ``depth`` and the
+    hierarchical ``number`` ("2.1") are recomputed for the article
+    whenever a section is added, moved or deleted. A section moved to
+    another article takes its subsections along and goes last among its
+    new siblings unless placed otherwise.
+    """
+
+    # Longest rank, which is also the width of a path segment
+    RANK_WIDTH = 10
+    MAX_DEPTH = 25
 
     article = models.ForeignKey(
         Article, on_delete=models.CASCADE, related_name="sections"
     )
     title = models.CharField(max_length=200)
-    content = models.TextField()
-    order = models.PositiveIntegerField(default=0)
+    content = CompressedTextField()
+    rank = models.CharField(max_length=RANK_WIDTH, editable=False)
 
     # Optional parent section for nested structure
     parent = models.ForeignKey(
@@ -228,42 +756,191 @@ class Section(BaseModel):
         related_name="subsections",
     )
 
+    # Position in the article outline (see renumber())
+    path = models.CharField(
+        max_length=RANK_WIDTH * MAX_DEPTH, blank=True, editable=False
+    )
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    number = models.CharField(max_length=100, blank=True, editable=False)
+
     class Meta:
-        ordering = ["order", "title"]
-        unique_together = ["article", "order"]
+        ordering = ["path"]
+        indexes = [
+            models.Index(fields=["path", "id"]),
+            models.Index(fields=["article", "path"]),
+            models.Index(fields=["article", "parent", "rank"]),
+        ]
 
     def __str__(self):
         return f"{self.article.title} - {self.title}"
 
+    # Fields that change a section's place in the outline
+    OUTLINE_FIELDS = {"article", "parent", "rank"}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        section = super().from_db(db, field_names, values)
+        # To notice moves to other articles without a query
+        section._stored_article_id = section.__dict__.get("article_id")
+        return section
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        moved_from = None
+        if not self._state.adding and (
+            update_fields is None or "article" in update_fields
+        ):
+            moved_from = self._moved_from()
+        if moved_from is not None:
+            if self.parent_id is not None and (
+                self.parent.article_id != self.article_id
+            ):
+                raise ValidationError(
+                    {"parent": "The parent must belong to the same article."}
+                )
+            if "_respaced" not in self.__dict__:
+                self.place()
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {"rank"}
+        if not self.rank:
+            self.place()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if moved_from is not None:
+                article_id, path = moved_from
+                # Subsections share the path of the section as a prefix.
+                update_counted(
+                    Section.objects.filter(
+                        article_id=article_id, path__startswith=path
+                    ).exclude(pk=self.pk),
+                    article_id=self.article_id,
+                )
+                Section.renumber(article_id)
+            if update_fields is None or self.OUTLINE_FIELDS & set(
+                update_fields
+            ):
+                respaced = self.__dict__.pop("_respaced", None)
+                placed = Section.renumber(self.article_id, respaced).get(
+                    self.pk
+                )
+                if placed is not None:
+                    self.path, self.depth, self.number = (
+                        placed.path,
+                        placed.depth,
+                        placed.number,
+                    )
+        self._stored_article_id = self.article_id
+
+    def _moved_from(self):
+        """Return the stored ``(article_id, path)`` if article changed."""
+        if getattr(self, "_stored_article_id", None) == self.article_id:
+            return None
+        stored = (
+            Section.objects.filter(pk=self.pk)
+            .values_list("article_id", "path")
+            .first()
+        )
+        if stored is None or stored[0] == self.article_id:
+            return None
+        return stored
+
+    def delete(self, *args, **kwargs):
+        article_id = self.article_id
+        result = super().delete(*args, **kwargs)
+        Section.renumber(article_id)
+        return result
+
+    def place(self, after=None, before=None):
+        """Give the section a rank right after or before a sibling.
+
+        Without either, the section goes last among its siblings. Only
+        ``rank`` is set; the caller saves. When the neighbours' keys
+        leave no room, every sibling gets a fresh key, written by the
+        next save() in the same bulk update as the outline.
+        """
+        siblings = list(
+            Section.objects.filter(
+                article_id=self.article_id, parent_id=self.parent_id
+            )
+            .exclude(pk=self.pk)
+            .order_by("rank")
+            .values_list("pk", "rank")
+        )
+        pks = [pk for pk, _ in siblings]
+        if after is not None:
+            index = pks.index(after.pk) + 1
+        elif before is not None:
+            index = pks.index(before.pk)
+        else:
+            index = len(siblings)
+        rank = rank_between(
+            siblings[index - 1][1] if index else None,
+            siblings[index][1] if index < len(siblings) else None,
+        )
+        self._respaced = None
+        if len(rank) > self.RANK_WIDTH:
+            keys = spread(len(siblings) + 1)
+            rank = keys.pop(index)
+            self._respaced = dict(zip(pks, keys))
+        self.rank = rank
+
+    @classmethod
+    def renumber(cls, article_id, ranks=None):
+        """Recompute the outline of an article and save what changed.
+
+        ``ranks`` optionally maps section pks to new ranks, applied in
+        the same statement. Costs one query for the article's sections
+        plus one bulk update of the rows whose position changed. Returns
+        the sections by pk.
+        """
+        ranks = ranks or {}
+        sections = list(
+            cls.objects.filter(article_id=article_id)
+            .order_by()
+            .only("id", "parent_id", "rank", "path", "depth", "number")
+        )
+        children = {}
+        changed = {}
+        for section in sections:
+            children.setdefault(section.parent_id, []).append(section)
+            rank = ranks.get(section.pk, section.rank)
+            if rank != section.rank:
+                section.rank = rank
+                changed[section.pk] = section
+
+        pending = [(None, "", "", 0)]
+        while pending:
+            parent_id, path, number, depth = pending.pop()
+            siblings = sorted(
+                children.get(parent_id, ()), key=lambda s: s.rank
+            )
+            for position, section in enumerate(siblings, 1):
+                section_path = path + section.rank.ljust(
+                    cls.RANK_WIDTH, DIGITS[0]
+                )
+                section_number = (
+                    f"{number}.{position}" if number else str(position)
+                )
+                placement = (section_path, depth, section_number)
+                if placement != (section.path, section.depth, section.number):
+                    section.path, section.depth, section.number = placement
+                    changed[section.pk] = section
+                pending.append(
+                    (section.pk, section_path, section_number, depth + 1)
+                )
+        if changed:
+            cls.objects.bulk_update(
+                changed.values(), ["rank", "path", "depth", "number"]
+            )
+        return {section.pk: section for section in sections}
+
     def get_level(self):
         """Get nesting level (0 for top-level)."""
-        level = 0
-        parent = self.parent
-        while parent:
-            level += 1
-            parent = parent.parent
-        return level
+        return self.depth
 
     def get_section_number(self):
         """Get hierarchical section numbering."""
-        if self.parent:
-            parent_num = self.parent.get_section_number()
-            siblings = Section.objects.filter(
-                article=self.article, parent=self.parent
-            ).order_by("order")
-
-            for i, section in enumerate(siblings, 1):
-                if section.id == self.id:
-                    return f"{parent_num}.{i}"
-        else:
-            siblings = Section.objects.filter(
-                article=self.article, parent__isnull=True
-            ).order_by("order")
-
-            for i, section in enumerate(siblings, 1):
-                if section.id == self.id:
-                    return str(i)
-        return "1"
+        return self.number
 
 
 class ArticleCollaborator(BaseModel):
@@ -299,8 +976,47 @@ class ArticleCollaborator(BaseModel):
         )
 
 
+class UserAgent(models.Model):
+    """A distinct user agent string.
+
+    Views refer to it instead of repeating the string (dictionary
+    encoding), which keeps raw ``ArticleView`` rows small.
+    """
+
+    value = models.CharField(max_length=512, unique=True)
+
+    def __str__(self):
+        return self.value
+
+    @classmethod
+    def ids_for(cls, values):
+        """Map user agent strings to their ids, adding the new ones."""
+        values = {value for value in values if value}
+        if not values:
+            return {}
+        ids = dict(
+            cls.objects.filter(value__in=values).values_list("value", "id")
+        )
+        missing = values - ids.keys()
+        if missing:
+            cls.objects.bulk_create(
+                [cls(value=value) for value in missing],
+                ignore_conflicts=True,
+            )
+            ids.update(
+                cls.objects.filter(value__in=missing).values_list(
+                    "value", "id"
+                )
+            )
+        return ids
+
+
 class ArticleView(models.Model):
-    """Track article views for analytics."""
+    """Track article views for analytics.
+
+    Raw views are rolled up into ``ArticleViewRollup`` and archived after
+    ``VIEW_RETENTION_DAYS`` (see wiki.analytics).
+    """
 
     article = models.ForeignKey(
         Article, on_delete=models.CASCADE, related_name="article_views"
@@ -309,8 +1025,15 @@ class ArticleView(models.Model):
         User, on_delete=models.SET_NULL, null=True, blank=True
     )
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.TextField(blank=True)
-    viewed_at = models.DateTimeField(auto_now_add=True)
+    agent = models.ForeignKey(
+        UserAgent,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    # Set when the view happens, not when the buffer is flushed
+    viewed_at = models.DateTimeField(default=timezone.now, editable=False)
     session_key = models.CharField(max_length=40, blank=True)
 
     class Meta:
@@ -321,3 +1044,170 @@ class ArticleView(models.Model):
 
     def __str__(self):
         return f"View: {self.article.title} at {self.viewed_at}"
+
+
+class ArticleViewRollup(models.Model):
+    """Views of an article in one hour or day, by type of viewer."""
+
+    class Granularity(models.TextChoices):
+        HOUR = "hour", "Hour"
+        DAY = "day", "Day"
+
+    class Viewer(models.TextChoices):
+        MEMBER = "member", "Signed-in user"
+        ANONYMOUS = "anonymous", "Anonymous"
+
+    granularity = models.CharField(max_length=4, choices=Granularity.choices)
+    period_start = models.DateTimeField()
+    article = models.ForeignKey(
+        Article, on_delete=models.CASCADE, related_name="view_rollups"
+    )
+    # The article's category when the period was rolled up
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    viewer = models.CharField(max_length=10, choices=Viewer.choices)
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["granularity", "article", "period_start", "viewer"],
+                name="wiki_view_rollup_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["granularity", "period_start"]),
+            models.Index(fields=["granularity", "category", "period_start"]),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.views} {self.viewer} views of {self.article_id} "
+            f"({self.granularity} of {self.period_start})"
+        )
+
+
+class ArticleViewerSketch(models.Model):
+    """HyperLogLog sketch of the distinct viewers of an article on a day.
+
+    Sketches of any set of article-days merge into the distinct viewers
+    of all of them (see wiki.analytics.unique_viewers()).
+    """
+
+    article = models.ForeignKey(
+        Article, on_delete=models.CASCADE, related_name="viewer_sketches"
+    )
+    day = models.DateField()
+    sketch = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["article", "day"], name="wiki_viewer_sketch_unique"
+            ),
+        ]
+        indexes = [models.Index(fields=["day"])]
+
+    def __str__(self):
+        return f"Viewers of {self.article_id} on {self.day}"
+
+
+class ViewerGroupSketch(models.Model):
+    """HyperLogLog sketch of the distinct viewers of a group on a day.
+
+    Groups are the whole site, the articles of one category and those of
+    one author, as of the views, so counting the viewers of a category
+    subtree or of an author merges one sketch per category and day
+    instead of one per article.
+    """
+
+    class Scope(models.TextChoices):
+        SITE = "site", "All articles"
+        CATEGORY = "category", "Category"
+        AUTHOR = "author", "Author"
+
+    scope = models.CharField(max_length=8, choices=Scope.choices)
+    # Category or author id; empty for the site and uncategorized articles
+    key = models.CharField(max_length=36, blank=True)
+    day = models.DateField()
+    sketch = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["scope", "key", "day"],
+                name="wiki_viewer_group_sketch_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Viewers of {self.scope} {self.key} on {self.day}"
+
+
+class AnalyticsCheckpoint(models.Model):
+    """How far an incremental analytics job has processed its input."""
+
+    name = models.CharField(max_length=50, unique=True)
+    position = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.position}"
+
+
+class SavedSearch(BaseModel):
+    """A query a user wants to be alerted about when new content matches."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="saved_searches"
+    )
+    name = models.CharField(max_length=100, blank=True)
+    query = models.CharField(max_length=200)
+    # Tokenized query; a revision matches when it contains every term.
+    terms = models.JSONField(default=list, editable=False)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["user", "-created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.name or self.query}"
+
+    def save(self, *args, **kwargs):
+        self.terms = query_terms(self.query)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "query" in update_fields:
+            kwargs["update_fields"] = set(update_fields) | {"terms"}
+        super().save(*args, **kwargs)
+
+
+class SearchAlert(BaseModel):
+    """A revision that matched a saved search."""
+
+    saved_search = models.ForeignKey(
+        SavedSearch, on_delete=models.CASCADE, related_name="alerts"
+    )
+    article = models.ForeignKey(
+        Article, on_delete=models.CASCADE, related_name="search_alerts"
+    )
+    revision = models.ForeignKey(
+        Revision, on_delete=models.CASCADE, related_name="search_alerts"
+    )
+    is_read = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ["-created_at"]
+        unique_together = ["saved_search", "revision"]
+        indexes = [
+            models.Index(fields=["saved_search", "is_read", "-created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.saved_search} -> {self.article.title}"
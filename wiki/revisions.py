@@ -0,0 +1,139 @@
+"""Delta-compressed storage of revision texts.
+
+Most edits change a few lines of a long article, so instead of a full
+copy a revision usually stores a line delta (see core.delta) against the
+article's previous revision, its ``delta_base``. Every
+``REVISION_KEYFRAME_INTERVAL`` versions, and whenever a delta would not
+be much smaller than the text, a revision is stored in full instead (a
+keyframe), which bounds the deltas applied to rebuild any text.
+``delta_depth`` counts the deltas between a revision and its keyframe.
+
+Rebuilt texts are kept in a per-process LRU cache of at most
+``REVISION_CACHE_SIZE`` characters. A revision's text never changes once
+saved, so cached texts stay valid in every process without any
+invalidation. Deleting a revision in any way (a ``pre_delete`` handler)
+first stores the revisions based on it in full.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Q
+
+from core.delta import apply_delta, make_delta
+from core.lru import LRUCache
+
+# Deltas longer than this share of their text are stored in full.
+MAX_DELTA_RATIO = 0.5
+
+StoredText = namedtuple(
+    "StoredText",
+    ["id", "article_id", "version_number", "base_id", "depth", "data"],
+)
+STORED_COLUMNS = (
+    "id",
+    "article_id",
+    "version_number",
+    "delta_base_id",
+    "delta_depth",
+    "content_data",
+)
+
+
+@lru_cache(maxsize=None)
+def get_text_cache():
+    """Return this process's cache of revision texts."""
+    return LRUCache(settings.REVISION_CACHE_SIZE)
+
+
+def encode(text, base_text=None, base_depth=0):
+    """Return ``(data, is_delta)`` storing text after a base text.
+
+    base_text is the text of the previous revision, None for the first.
+    """
+    if base_text is None or base_depth + 1 >= (
+        settings.REVISION_KEYFRAME_INTERVAL
+    ):
+        return text, False
+    delta = make_delta(base_text, text)
+    if len(delta) > MAX_DELTA_RATIO * len(text):
+        return text, False
+    return delta, True
+
+
+def load_texts(pks):
+    """Return a dict mapping revision pks to their full texts."""
+    from .models import Revision
+
+    cache = get_text_cache()
+    texts = {}
+    for pk in pks:
+        text = cache.get(pk)
+        if text is not None:
+            texts[pk] = text
+    missing = set(pks) - set(texts)
+    if not missing:
+        return texts
+
+    rows = {}
+    # Cached bases the chains rely on, kept here because rebuilding
+    # other texts may evict them from the cache.
+    known = {}
+    query = Q(pk__in=missing)
+    while query is not None:
+        fetched = [
+            StoredText(*row)
+            for row in Revision.objects.filter(query)
+            .order_by()
+            .values_list(*STORED_COLUMNS)
+            if row[0] not in rows
+        ]
+        rows.update((row.id, row) for row in fetched)
+        wanted = []
+        for row in fetched:
+            if row.base_id is None or row.base_id in rows:
+                continue
+            if row.base_id not in known:
+                text = cache.get(row.base_id)
+                if text is None:
+                    wanted.append(row)
+                    continue
+                known[row.base_id] = text
+        query = None
+        if wanted:
+            # A chain usually consists of the preceding versions, so
+            # fetching them at once saves a query per delta.
+            query = Q(pk__in={row.base_id for row in wanted})
+            for row in wanted:
+                query |= Q(
+                    article_id=row.article_id,
+                    version_number__gte=row.version_number - row.depth,
+                    version_number__lt=row.version_number,
+                )
+
+    for pk in missing:
+        texts[pk] = _rebuild(pk, rows, known, cache)
+    return texts
+
+
+def _rebuild(pk, rows, known, cache):
+    chain = []
+    text = known.get(pk)
+    while text is None:
+        text = cache.get(pk)
+        if text is not None:
+            break
+        row = rows[pk]
+        if row.base_id is None:
+            text = row.data
+            cache.set(pk, text)
+            break
+        chain.append(row)
+        pk = row.base_id
+        text = known.get(pk)
+    for row in reversed(chain):
+        text = apply_delta(text, row.data)
+        known[row.id] = text
+        cache.set(row.id, text)
+    return text
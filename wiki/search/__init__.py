@@ -0,0 +1,90 @@
+"""Full-text search for wiki articles."""
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .backends import SearchUnavailable
+from .index import InvertedIndex
+from .suggest import SuggestIndex
+from .vectors import VectorIndex
+from .tokenizer import highlight, tokenize
+
+# Field boosts applied by repeating terms, a cheap approximation of BM25F.
+TITLE_BOOST = 3
+SUMMARY_BOOST = 2
+
+
+@lru_cache(maxsize=None)
+def get_index():
+    """Return this process's handle on the shared article index."""
+    return InvertedIndex(
+        settings.SEARCH_INDEX_DIR,
+        max_segments=settings.SEARCH_INDEX_MAX_SEGMENTS,
+        merge_threshold=settings.SEARCH_INDEX_MERGE_THRESHOLD,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_suggest_index():
+    """Return this process's typeahead index."""
+    return SuggestIndex(settings.SEARCH_INDEX_DIR)
+
+
+@lru_cache(maxsize=None)
+def get_vector_index():
+    """Return this process's handle on the shared embedding store."""
+    return VectorIndex(settings.VECTOR_INDEX_DIR)
+
+
+def article_terms(title, summary, content):
+    """Return the weighted term list indexed for an article."""
+    return (
+        tokenize(title) * TITLE_BOOST
+        + tokenize(summary) * SUMMARY_BOOST
+        + tokenize(content)
+    )
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """Return the backend configured by ``SEARCH_BACKEND``."""
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+def index_articles(articles):
+    """Add or refresh articles in the search backend and vector index."""
+    articles = list(articles)
+    get_search_backend().index_articles(articles)
+    get_vector_index().update(
+        (
+            article.id,
+            article_terms(
+                article.title,
+                article.current_summary,
+                article.current_content,
+            ),
+        )
+        for article in articles
+    )
+
+
+def unindex_articles(article_ids):
+    """Remove articles from the search backend and vector index."""
+    article_ids = list(article_ids)
+    get_search_backend().unindex_articles(article_ids)
+    get_vector_index().delete(article_ids)
+
+
+__all__ = [
+    "SearchUnavailable",
+    "get_index",
+    "get_search_backend",
+    "get_suggest_index",
+    "get_vector_index",
+    "highlight",
+    "index_articles",
+    "tokenize",
+    "unindex_articles",
+]
@@ -0,0 +1,235 @@
+"""Pluggable search backends.
+
+A backend turns a free-text query into a filtered article queryset,
+annotated with ``search_rank`` and ordered best match first, and is told
+when articles change. Select one with the ``SEARCH_BACKEND`` setting.
+"""
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .tokenizer import tokenize
+
+# Text search configuration used by the Postgres trigger (see
+# wiki/migrations/0003_article_search_vector.py).
+SEARCH_CONFIG = "english"
+
+# Relative weights of title, summary and content for SQLite's bm25().
+FTS5_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+class SearchUnavailable(Exception):
+    """Raised when a backend cannot answer queries (e.g. not built yet)."""
+
+
+class BaseSearchBackend:
+    """Interface implemented by every search backend."""
+
+    def search(self, queryset, query):
+        """Return queryset narrowed to matches and ordered by relevance."""
+        raise NotImplementedError
+
+    def index_articles(self, articles):
+        """Called after articles were created or edited."""
+
+    def unindex_articles(self, article_ids):
+        """Called after articles were deleted."""
+
+    def rebuild(self):
+        """Recompute the whole index from the database."""
+        raise NotImplementedError
+
+    @staticmethod
+    def order_by_ids(queryset, ids):
+        """Restrict queryset to ids and rank rows in the given order."""
+        rank = Case(
+            *[When(pk=pk, then=Value(i)) for i, pk in enumerate(ids)],
+            output_field=IntegerField(),
+        )
+        return (
+            queryset.filter(pk__in=ids)
+            .annotate(search_rank=rank)
+            .order_by("search_rank")
+        )
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """BM25 over the memory-mapped segment index in ``wiki.search.index``."""
+
+    def search(self, queryset, query):
+        from . import get_index
+
+        index = get_index()
+        if not index.doc_count:
+            raise SearchUnavailable("The search index has not been built.")
+        hits = index.search(query, limit=settings.SEARCH_MAX_RESULTS)
+        return self.order_by_ids(queryset, [doc_id for doc_id, _ in hits])
+
+    def index_articles(self, articles):
+        from . import article_terms, get_index
+
+        get_index().update(
+            (
+                article.id,
+                article_terms(
+                    article.title,
+                    article.current_summary,
+                    article.current_content,
+                ),
+            )
+            for article in articles
+        )
+
+    def unindex_articles(self, article_ids):
+        from . import get_index
+
+        get_index().delete(article_ids)
+
+
+class VectorSearchBackend(BaseSearchBackend):
+    """Semantic search by embedding similarity (``wiki.search.vectors``).
+
+    Used for ``search_mode=semantic``; the vector index is maintained by
+    ``index_articles`` regardless of the configured keyword backend.
+    """
+
+    def search(self, queryset, query):
+        from . import get_vector_index
+
+        index = get_vector_index()
+        if not index.ready:
+            raise SearchUnavailable("The vector index has not been built.")
+        hits = index.search(query, limit=settings.SEARCH_MAX_RESULTS)
+        return self.order_by_ids(queryset, [doc_id for doc_id, _ in hits])
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Full-text search inside the database.
+
+    On PostgreSQL, ``Article.search_vector`` is a weighted ``tsvector``
+    (title A, summary B, content C) kept current by a trigger, indexed with
+    GIN and ranked with ``ts_rank``. On SQLite, an FTS5 shadow table
+    ``wiki_article_fts`` is maintained from the application and ranked with
+    its built-in ``bm25()``. Both are created by migration 0003.
+
+    The trigger cannot read compressed content (see core.fields), so
+    ``index_articles`` also writes the vectors of changed articles from
+    their decompressed text.
+    """
+
+    FTS_TABLE = "wiki_article_fts"
+    # Articles read per query by rebuild()
+    REBUILD_BATCH_SIZE = 500
+
+    def search(self, queryset, query):
+        if connection.vendor == "postgresql":
+            return self._search_postgres(queryset, query)
+        if connection.vendor == "sqlite":
+            return self._search_sqlite(queryset, query)
+        raise SearchUnavailable(
+            f"No full-text support for the {connection.vendor} backend."
+        )
+
+    def _search_postgres(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        ts_query = SearchQuery(
+            query, search_type="websearch", config=SEARCH_CONFIG
+        )
+        return (
+            queryset.filter(search_vector=ts_query)
+            .annotate(search_rank=SearchRank(F("search_vector"), ts_query))
+            .order_by("-search_rank")
+        )
+
+    def _search_sqlite(self, queryset, query):
+        terms = tokenize(query)
+        if not terms:
+            return queryset.none()
+        # Quote every term so user input is never parsed as FTS5 syntax.
+        match = " ".join(
+            '"{}"'.format(term.replace('"', "")) for term in terms
+        )
+        weights = ", ".join(str(weight) for weight in FTS5_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT article_id FROM {self.FTS_TABLE} "
+                f"WHERE {self.FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({self.FTS_TABLE}, 0, {weights}) LIMIT %s",
+                [match, settings.SEARCH_MAX_RESULTS],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        return self.order_by_ids(queryset, ids)
+
+    def index_articles(self, articles):
+        self.index_rows(
+            [
+                (
+                    article.id,
+                    article.title,
+                    article.current_summary,
+                    article.current_content,
+                )
+                for article in articles
+            ]
+        )
+
+    def index_rows(self, rows):
+        """Index ``(id, title, summary, content)`` rows."""
+        if connection.vendor == "postgresql":
+            weighted = " || ".join(
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+                f"coalesce(%s, '')), '{weight}')"
+                for weight in "ABC"
+            )
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"UPDATE wiki_article SET search_vector = {weighted} "
+                    "WHERE id = %s",
+                    [(*texts, pk) for pk, *texts in rows],
+                )
+            return
+        if connection.vendor != "sqlite":
+            return
+        self.unindex_articles([row[0] for row in rows])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.FTS_TABLE} (article_id, title, "
+                "current_summary, current_content) VALUES (%s, %s, %s, %s)",
+                [(pk.hex, *texts) for pk, *texts in rows],
+            )
+
+    def unindex_articles(self, article_ids):
+        if connection.vendor != "sqlite":
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {self.FTS_TABLE} WHERE article_id = %s",
+                [(article_id.hex,) for article_id in article_ids],
+            )
+
+    def rebuild(self):
+        from ..models import Article
+
+        if connection.vendor not in ("postgresql", "sqlite"):
+            raise SearchUnavailable(
+                f"No full-text support for the {connection.vendor} backend."
+            )
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.FTS_TABLE}")
+        # Contents are decompressed in Python, so rows pass through here
+        # rather than being copied in SQL.
+        rows = (
+            Article.objects.order_by()
+            .values_list("id", "title", "current_summary", "current_content")
+            .iterator(chunk_size=self.REBUILD_BATCH_SIZE)
+        )
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.REBUILD_BATCH_SIZE:
+                self.index_rows(batch)
+                batch = []
+        self.index_rows(batch)
@@ -0,0 +1,55 @@
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from . import SearchUnavailable, get_search_backend
+from .backends import VectorSearchBackend
+
+
+class RankedSearchFilter(filters.SearchFilter):
+    """Search articles through the configured backend, best match first.
+
+    Falls back to the ``icontains`` lookups of ``SearchFilter`` while the
+    backend cannot serve queries, e.g. before ``manage.py reindex`` has
+    built the inverted index. Leave compressed columns (see core.fields)
+    out of the view's ``search_fields``: pattern lookups miss their long
+    values, so only some bodies would match. An explicit ``ordering``
+    parameter takes precedence over relevance; list this backend after
+    ``OrderingFilter``.
+
+    ``search_mode=semantic`` ranks by embedding similarity instead of
+    keyword matches.
+    """
+
+    search_mode_param = "search_mode"
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "").strip()
+        if not query:
+            return queryset
+
+        if request.query_params.get(self.search_mode_param) == "semantic":
+            backend = VectorSearchBackend()
+        else:
+            backend = get_search_backend()
+        try:
+            results = backend.search(queryset, query)
+        except SearchUnavailable:
+            return super().filter_queryset(request, queryset, view)
+
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            results = results.order_by(*queryset.query.order_by)
+        return results
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.search_mode_param,
+                "required": False,
+                "in": "query",
+                "description": (
+                    "Set to `semantic` to rank by meaning instead of "
+                    "keywords."
+                ),
+                "schema": {"type": "string", "enum": ["keyword", "semantic"]},
+            }
+        ]
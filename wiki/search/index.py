@@ -0,0 +1,302 @@
+"""Segmented inverted index with BM25 ranking.
+
+The index lives in a directory of immutable segment files plus a
+``manifest.json`` that lists the live segments and the ordinals deleted
+from each of them. Writers take an exclusive ``flock`` on the directory,
+write new segments and atomically replace the manifest; readers in every
+worker process mmap the same files and pick up a new manifest on their next
+query, so the postings are shared through the page cache rather than
+rebuilt per process.
+"""
+
+import fcntl
+import heapq
+import json
+import math
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+from .segments import Segment, SegmentError, merge_segments, write_segment
+from .tokenizer import tokenize
+
+MANIFEST = "manifest.json"
+LOCK = ".lock"
+SEGMENT_SUFFIX = ".kix"
+BUILD_SUFFIX = ".kix.part"
+
+# BM25 parameters; see Robertson & Zaragoza, "The Probabilistic Relevance
+# Framework: BM25 and Beyond".
+K1 = 1.2
+B = 0.75
+
+
+class InvertedIndex:
+    """Process-local handle on an on-disk segmented index."""
+
+    def __init__(self, directory, max_segments=8, merge_threshold=5000):
+        self.directory = str(directory)
+        self.max_segments = max_segments
+        self.merge_threshold = merge_threshold
+        self._segments = {}
+        self._live = []
+        self._stats = (0, 0)
+        self._stamp = None
+        self._reload_lock = threading.Lock()
+
+    # Manifest handling -------------------------------------------------
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_manifest(self):
+        try:
+            with open(self._path(MANIFEST)) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {"generation": 0, "segments": []}
+
+    def _write_manifest(self, manifest):
+        tmp_path = self._path(f"{MANIFEST}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as fh:
+            json.dump(manifest, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self._path(MANIFEST))
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(LOCK), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield self._read_manifest()
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _new_segment_name(self, generation):
+        return f"seg-{generation:08d}-{uuid.uuid4().hex[:8]}{SEGMENT_SUFFIX}"
+
+    def _refresh(self):
+        """Re-open segments if another process published a new manifest."""
+        try:
+            stat = os.stat(self._path(MANIFEST))
+            stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._stamp:
+            return
+
+        with self._reload_lock:
+            if stamp == self._stamp:
+                return
+            manifest = self._read_manifest()
+            names = {entry["name"] for entry in manifest["segments"]}
+            segments = {}
+            for name in names:
+                segment = self._segments.get(name)
+                if segment is None:
+                    try:
+                        segment = Segment(self._path(name))
+                    except SegmentError:
+                        # Superseded between reading the manifest and
+                        # opening the file; the next query reloads.
+                        return
+                segments[name] = segment
+            for name, segment in self._segments.items():
+                if name not in names:
+                    segment.close()
+            live = []
+            doc_count = total_length = 0
+            for entry in manifest["segments"]:
+                segment = segments[entry["name"]]
+                deleted = frozenset(entry["deleted"])
+                live.append((segment, deleted))
+                doc_count += segment.doc_count - len(deleted)
+                total_length += segment.total_length - sum(
+                    segment.doc_length(ordinal) for ordinal in deleted
+                )
+            self._segments = segments
+            self._live = live
+            self._stats = (doc_count, total_length)
+            self._stamp = stamp
+
+    def _live_segments(self):
+        self._refresh()
+        return self._live
+
+    # Reading -----------------------------------------------------------
+
+    @property
+    def doc_count(self):
+        self._refresh()
+        return self._stats[0]
+
+    def doc_frequency(self, term):
+        """Number of segment documents containing term (incl. deleted)."""
+        return sum(
+            segment.doc_frequency(term) for segment, _ in self._live_segments()
+        )
+
+    def search(self, query, limit=100):
+        """Return up to limit ``(doc_id, score)`` pairs, best first."""
+        terms = set(tokenize(query))
+        segments = self._live_segments()
+        if not terms or not segments:
+            return []
+
+        doc_count, total_length = self._stats
+        if doc_count <= 0:
+            return []
+        avg_length = total_length / doc_count
+
+        idf = {}
+        for term in terms:
+            freq = sum(segment.doc_frequency(term) for segment, _ in segments)
+            if freq:
+                idf[term] = math.log(
+                    1 + (doc_count - freq + 0.5) / (freq + 0.5)
+                )
+
+        hits = []
+        for segment, deleted in segments:
+            scores = {}
+            for term, weight in idf.items():
+                for ordinal, freq in segment.postings(term):
+                    if ordinal in deleted:
+                        continue
+                    norm = K1 * (
+                        1 - B + B * segment.doc_length(ordinal) / avg_length
+                    )
+                    scores[ordinal] = scores.get(ordinal, 0.0) + weight * (
+                        freq * (K1 + 1) / (freq + norm)
+                    )
+            hits.extend(
+                (score, segment, ordinal) for ordinal, score in scores.items()
+            )
+
+        best = heapq.nlargest(limit, hits, key=lambda hit: hit[0])
+        return [
+            (segment.doc_id(ordinal), score)
+            for score, segment, ordinal in best
+        ]
+
+    # Writing -----------------------------------------------------------
+
+    def _delete_from(self, manifest, doc_ids):
+        for entry in manifest["segments"]:
+            segment = self._segments.get(entry["name"]) or Segment(
+                self._path(entry["name"])
+            )
+            deleted = set(entry["deleted"])
+            for doc_id in doc_ids:
+                ordinal = segment.ordinal(doc_id)
+                if ordinal is not None:
+                    deleted.add(ordinal)
+            entry["deleted"] = sorted(deleted)
+            if segment is not self._segments.get(entry["name"]):
+                segment.close()
+        manifest["segments"] = [
+            entry
+            for entry in manifest["segments"]
+            if len(entry["deleted"]) < entry["docs"]
+        ]
+
+    def update(self, documents):
+        """Add or replace documents given as ``(doc_id, terms)`` pairs."""
+        documents = list(documents)
+        if not documents:
+            return
+        self._refresh()
+        with self._write_lock() as manifest:
+            self._delete_from(manifest, {doc_id for doc_id, _ in documents})
+            manifest["generation"] += 1
+            name = self._new_segment_name(manifest["generation"])
+            count = write_segment(self._path(name), documents)
+            manifest["segments"].append(
+                {"name": name, "docs": count, "deleted": []}
+            )
+            self._maybe_merge(manifest)
+            self._publish(manifest)
+
+    def delete(self, doc_ids):
+        """Remove documents from the index."""
+        doc_ids = set(doc_ids)
+        if not doc_ids:
+            return
+        self._refresh()
+        with self._write_lock() as manifest:
+            self._delete_from(manifest, doc_ids)
+            manifest["generation"] += 1
+            self._publish(manifest)
+
+    def replace(self, paths):
+        """Atomically swap the whole index for freshly built segments.
+
+        ``paths`` are segment files written with ``new_segment_path()``,
+        e.g. by the parallel ``reindex`` command. They are renamed into
+        place under the write lock.
+        """
+        with self._write_lock() as manifest:
+            manifest["generation"] += 1
+            entries = []
+            for path in paths:
+                segment = Segment(path)
+                count = segment.doc_count
+                segment.close()
+                if not count:
+                    os.unlink(path)
+                    continue
+                name = self._new_segment_name(manifest["generation"])
+                os.replace(path, self._path(name))
+                entries.append({"name": name, "docs": count, "deleted": []})
+            manifest["segments"] = entries
+            self._publish(manifest)
+
+    def _maybe_merge(self, manifest):
+        if len(manifest["segments"]) <= self.max_segments:
+            return
+        small = [
+            entry
+            for entry in manifest["segments"]
+            if entry["docs"] - len(entry["deleted"]) < self.merge_threshold
+        ]
+        if len(small) < 2:
+            return
+
+        sources = []
+        for entry in small:
+            sources.append(
+                (Segment(self._path(entry["name"])), set(entry["deleted"]))
+            )
+        name = self._new_segment_name(manifest["generation"])
+        try:
+            count = merge_segments(self._path(name), sources)
+        finally:
+            for segment, _ in sources:
+                segment.close()
+
+        merged = {entry["name"] for entry in small}
+        manifest["segments"] = [
+            entry
+            for entry in manifest["segments"]
+            if entry["name"] not in merged
+        ]
+        manifest["segments"].append(
+            {"name": name, "docs": count, "deleted": []}
+        )
+
+    def _publish(self, manifest):
+        self._write_manifest(manifest)
+        live = {entry["name"] for entry in manifest["segments"]}
+        # Unlinking is safe for readers that still have the old files
+        # mapped; the pages stay valid until they unmap them.
+        for filename in os.listdir(self.directory):
+            if filename.endswith(SEGMENT_SUFFIX) and filename not in live:
+                os.unlink(self._path(filename))
+
+    def new_segment_path(self):
+        """Return a fresh path for a segment built outside the write lock."""
+        os.makedirs(self.directory, exist_ok=True)
+        return self._path(f"build-{uuid.uuid4().hex}{BUILD_SUFFIX}")
@@ -0,0 +1,61 @@
+"""Reverse index of saved searches ("percolator").
+
+Instead of running every saved query against each new revision, queries
+are indexed by one of their own terms and a revision is only checked
+against the queries filed under terms it contains. A saved search
+matches when the revision contains all of its terms, so any single term
+is a valid key; the least common one (approximated by the longest, when
+no document frequencies are available) keeps candidate lists short.
+"""
+
+from collections import namedtuple
+
+from .tokenizer import tokenize
+
+SavedQuery = namedtuple("SavedQuery", ["key", "terms"])
+
+
+def query_terms(query):
+    """Return the sorted, de-duplicated terms a saved query requires."""
+    return sorted(set(tokenize(query)))
+
+
+class Percolator:
+    """Match documents against many saved term queries at once."""
+
+    def __init__(self, queries=(), frequency=None):
+        self._frequency = frequency or (lambda term: -len(term))
+        self._anchors = {}
+        self._size = 0
+        for key, terms in queries:
+            self.add(key, terms)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key, terms):
+        terms = frozenset(terms)
+        if not terms:
+            return
+        anchor = min(terms, key=lambda term: (self._frequency(term), term))
+        self._anchors.setdefault(anchor, []).append(SavedQuery(key, terms))
+        self._size += 1
+
+    def match(self, terms):
+        """Return the keys of saved queries whose terms all occur."""
+        terms = terms if isinstance(terms, (set, frozenset)) else set(terms)
+        if len(terms) <= len(self._anchors):
+            buckets = (self._anchors.get(term) for term in terms)
+        else:
+            buckets = (
+                queries
+                for anchor, queries in self._anchors.items()
+                if anchor in terms
+            )
+        return [
+            query.key
+            for queries in buckets
+            if queries
+            for query in queries
+            if query.terms <= terms
+        ]
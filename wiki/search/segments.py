@@ -0,0 +1,240 @@
+"""Immutable, memory-mapped inverted index segments.
+
+A segment file holds the postings for a fixed set of documents:
+
+    header      magic, version, doc_count, term_count (4 x uint32)
+    doc ids     doc_count x 16-byte UUID
+    doc lengths doc_count x uint32
+    term starts (term_count + 1) x uint32, offsets into the term blob
+    post starts (term_count + 1) x uint32, offsets into the postings
+    term blob   sorted UTF-8 terms, padded to a multiple of four bytes
+    postings    (doc ordinal, term frequency) uint32 pairs
+
+Integers use the host byte order so the arrays can be viewed in place
+through ``memoryview.cast``; segments are meant to be shared between the
+worker processes of a single host, not copied between machines.
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import uuid
+from array import array
+from collections import Counter, defaultdict
+
+MAGIC = b"KHIX"
+VERSION = 1
+HEADER = struct.Struct("=4sIII")
+UUID_SIZE = 16
+
+if array("I").itemsize != 4:  # pragma: no cover - exotic platforms only
+    raise ImportError("Search segments require a 32-bit unsigned array type")
+
+
+class SegmentError(Exception):
+    """Raised when a segment file is missing or malformed."""
+
+
+def write_segment(path, documents):
+    """Write documents to a new segment file at path.
+
+    ``documents`` is an iterable of ``(doc_id, terms)`` pairs where
+    ``doc_id`` is a UUID and ``terms`` a list of normalized terms. The file
+    is written next to its destination and renamed into place, so readers
+    never observe a partially written segment. Returns the document count.
+    """
+    doc_ids = []
+    lengths = array("I")
+    postings = defaultdict(list)
+
+    for ordinal, (doc_id, terms) in enumerate(documents):
+        doc_ids.append(doc_id)
+        lengths.append(len(terms))
+        for term, freq in Counter(terms).items():
+            postings[term].append((ordinal, freq))
+
+    _write(path, doc_ids, lengths, postings)
+    return len(doc_ids)
+
+
+def merge_segments(path, sources):
+    """Merge existing segments into a new one at path.
+
+    ``sources`` is a sequence of ``(segment, deleted_ordinals)`` pairs;
+    deleted documents are dropped and the remaining ordinals renumbered.
+    Returns the document count of the merged segment.
+    """
+    doc_ids = []
+    lengths = array("I")
+    postings = defaultdict(list)
+
+    for segment, deleted in sources:
+        remap = {}
+        for ordinal in range(segment.doc_count):
+            if ordinal in deleted:
+                continue
+            remap[ordinal] = len(doc_ids)
+            doc_ids.append(segment.doc_id(ordinal))
+            lengths.append(segment.doc_length(ordinal))
+        for term, entries in segment.iter_postings():
+            target = postings[term]
+            for ordinal, freq in entries:
+                if ordinal in remap:
+                    target.append((remap[ordinal], freq))
+
+    _write(path, doc_ids, lengths, postings)
+    return len(doc_ids)
+
+
+def _write(path, doc_ids, lengths, postings):
+    terms = sorted(term for term, entries in postings.items() if entries)
+    encoded = [term.encode("utf-8") for term in terms]
+
+    term_starts = array("I", [0])
+    post_starts = array("I", [0])
+    flat = array("I")
+    for term, raw in zip(terms, encoded):
+        term_starts.append(term_starts[-1] + len(raw))
+        for ordinal, freq in sorted(postings[term]):
+            flat.append(ordinal)
+            flat.append(freq)
+        post_starts.append(len(flat) // 2)
+
+    blob = b"".join(encoded)
+    blob += b"\0" * (-len(blob) % 4)
+
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(HEADER.pack(MAGIC, VERSION, len(doc_ids), len(terms)))
+            for doc_id in doc_ids:
+                fh.write(doc_id.bytes)
+            lengths.tofile(fh)
+            term_starts.tofile(fh)
+            post_starts.tofile(fh)
+            fh.write(blob)
+            flat.tofile(fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class Segment:
+    """Read-only view over a memory-mapped segment file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        try:
+            with open(path, "rb") as fh:
+                self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as exc:
+            raise SegmentError(f"Cannot open segment {path}: {exc}")
+
+        magic, version, doc_count, term_count = HEADER.unpack_from(
+            self._mmap, 0
+        )
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise SegmentError(f"{path} is not a version {VERSION} segment")
+
+        self.doc_count = doc_count
+        self.term_count = term_count
+
+        view = memoryview(self._mmap)
+        offset = HEADER.size
+        self._ids = view[offset : offset + doc_count * UUID_SIZE]
+        offset += doc_count * UUID_SIZE
+        self._lengths = view[offset : offset + doc_count * 4].cast("I")
+        offset += doc_count * 4
+        self._term_starts = view[offset : offset + (term_count + 1) * 4]
+        self._term_starts = self._term_starts.cast("I")
+        offset += (term_count + 1) * 4
+        self._post_starts = view[offset : offset + (term_count + 1) * 4]
+        self._post_starts = self._post_starts.cast("I")
+        offset += (term_count + 1) * 4
+        blob_size = self._term_starts[term_count]
+        self._blob = view[offset : offset + blob_size]
+        offset += blob_size + (-blob_size % 4)
+        self._postings = view[offset:].cast("I")
+
+        self.total_length = sum(self._lengths)
+        self._ordinals = None
+
+    def close(self):
+        for name in (
+            "_ids",
+            "_lengths",
+            "_term_starts",
+            "_post_starts",
+            "_blob",
+            "_postings",
+        ):
+            getattr(self, name).release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # A caller still holds a postings view; the mapping is released
+            # once that view is garbage collected.
+            pass
+
+    def doc_id(self, ordinal):
+        start = ordinal * UUID_SIZE
+        return uuid.UUID(bytes=bytes(self._ids[start : start + UUID_SIZE]))
+
+    def doc_length(self, ordinal):
+        return self._lengths[ordinal]
+
+    def ordinal(self, doc_id):
+        """Return the ordinal of doc_id in this segment, or None."""
+        if self._ordinals is None:
+            self._ordinals = {
+                self.doc_id(ordinal): ordinal
+                for ordinal in range(self.doc_count)
+            }
+        return self._ordinals.get(doc_id)
+
+    def _term(self, index):
+        start = self._term_starts[index]
+        return bytes(self._blob[start : self._term_starts[index + 1]])
+
+    def _find(self, raw):
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < raw:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.term_count and self._term(lo) == raw:
+            return lo
+        return -1
+
+    def _entries(self, index):
+        start = self._post_starts[index] * 2
+        stop = self._post_starts[index + 1] * 2
+        chunk = self._postings[start:stop]
+        return zip(chunk[::2], chunk[1::2])
+
+    def postings(self, term):
+        """Return (ordinal, frequency) pairs for term, or an empty list."""
+        index = self._find(term.encode("utf-8"))
+        if index < 0:
+            return []
+        return self._entries(index)
+
+    def doc_frequency(self, term):
+        index = self._find(term.encode("utf-8"))
+        if index < 0:
+            return 0
+        return self._post_starts[index + 1] - self._post_starts[index]
+
+    def iter_postings(self):
+        for index in range(self.term_count):
+            yield self._term(index).decode("utf-8"), self._entries(index)
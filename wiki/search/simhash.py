@@ -0,0 +1,96 @@
+"""SimHash fingerprints for near-duplicate detection.
+
+A fingerprint is the 64-bit SimHash (Charikar, 2002) of the word 3-gram
+shingles of a text: texts that share most shingles get fingerprints that
+differ in only a few bits. The fingerprint is cut into ``BANDS`` bands
+that are stored as indexed columns; by the pigeonhole principle two
+fingerprints within ``BANDS - 1`` bits of each other agree exactly on at
+least one band, so candidates are found with a handful of index lookups
+regardless of corpus size.
+"""
+
+import hashlib
+
+import numpy as np
+
+from .tokenizer import tokenize
+
+BITS = 64
+BANDS = 4
+BAND_BITS = BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Largest Hamming distance reported as a near-duplicate; must stay below
+# BANDS for the banded lookup to be exhaustive.
+MAX_DISTANCE = BANDS - 1
+
+SHINGLE_SIZE = 3
+
+_BIT_POSITIONS = np.arange(BITS, dtype=np.uint64)
+
+
+def _shingles(terms):
+    if len(terms) < SHINGLE_SIZE:
+        return [" ".join(terms)] if terms else []
+    return [
+        " ".join(terms[i : i + SHINGLE_SIZE])
+        for i in range(len(terms) - SHINGLE_SIZE + 1)
+    ]
+
+
+def simhash(text):
+    """Return the unsigned 64-bit SimHash of text, or None if it is empty."""
+    shingles, weights = np.unique(
+        np.array(_shingles(tokenize(text)), dtype=object), return_counts=True
+    )
+    if not len(shingles):
+        return None
+    hashes = np.fromiter(
+        (
+            int.from_bytes(
+                hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(),
+                "little",
+            )
+            for s in shingles
+        ),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    bits = (hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)
+    votes = (np.where(bits, 1, -1) * weights[:, None]).sum(axis=0)
+    return int(((votes > 0).astype(np.uint64) << _BIT_POSITIONS).sum())
+
+
+def to_signed(value):
+    """Map an unsigned 64-bit value onto a signed BIGINT column."""
+    if value is None:
+        return None
+    return value - (1 << BITS) if value >= 1 << (BITS - 1) else value
+
+
+def to_unsigned(value):
+    if value is None:
+        return None
+    return value & ((1 << BITS) - 1)
+
+
+def bands(value):
+    """Split an unsigned fingerprint into BANDS integers."""
+    if value is None:
+        return [None] * BANDS
+    return [(value >> (band * BAND_BITS)) & BAND_MASK for band in range(BANDS)]
+
+
+def distance(a, b):
+    """Hamming distance between two fingerprints."""
+    return (to_unsigned(a) ^ to_unsigned(b)).bit_count()
+
+
+def popcount64(values):
+    """Vectorized population count of a uint64 array."""
+    values = values.astype(np.uint64, copy=False)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    # NumPy < 2.0: count bits of each byte through a lookup table.
+    table = np.array([bin(i).count("1") for i in range(256)], np.uint8)
+    return table[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
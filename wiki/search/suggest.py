@@ -0,0 +1,386 @@
+"""Typo-tolerant typeahead over article titles, categories and tags.
+
+Every worker keeps an in-memory index of short strings with two access
+paths: a sorted list of word-start suffixes for prefix matches, and
+trigram postings for fuzzy matches. Fuzzy lookups use prefix filtering:
+a candidate that reaches the similarity threshold must share at least
+``T`` trigrams with the query, so it has to appear in one of the
+``n - T + 1`` rarest query trigram lists and the longer lists are never
+scanned.
+
+Workers stay in sync through a small stamp file next to the search index.
+Saves bump its generation and every worker then pulls the rows whose
+``updated_at`` moved since its last sync. Deletions also append the
+deleted keys, tagged with their generation, to a journal file that
+workers read from where they left off. Once the journal grows past
+``MAX_JOURNAL_BYTES`` it is emptied and the rebuild counter bumped,
+which makes every worker reload in full.
+"""
+
+import bisect
+import fcntl
+import math
+import os
+import threading
+import unicodedata
+import uuid
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from django.utils import timezone
+
+STAMP = "suggest.stamp"
+JOURNAL = "suggest.deleted"
+
+# Journal size past which workers reload rather than replay deletions.
+MAX_JOURNAL_BYTES = 1 << 20
+
+# How far back incremental syncs look for rows committed out of order.
+SYNC_MARGIN = timedelta(minutes=1)
+
+# Trigram lists longer than this are not scanned for fuzzy candidates.
+MAX_POSTINGS = 2000
+
+# Minimum Dice coefficient between trigram sets for a fuzzy match.
+SIMILARITY_THRESHOLD = 0.35
+
+Suggestion = namedtuple(
+    "Suggestion",
+    ["kind", "key", "text", "slug", "weight", "normalized", "grams"],
+)
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.lower().split())
+
+
+def trigrams(text):
+    """Return the pg_trgm-style trigram set of normalized text."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def _word_starts(text):
+    yield 0
+    for i, ch in enumerate(text):
+        if ch == " ":
+            yield i + 1
+
+
+class SuggestIndex:
+    """In-memory prefix and trigram index of suggestion strings."""
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        self._entries = {}
+        self._prefixes = []
+        self._postings = {}
+        self._article_tags = {}
+        self._tag_counts = Counter()
+        self._stamp = None
+        self._synced_at = None
+        self._journal_offset = 0
+        self._loading = False
+        self._lock = threading.RLock()
+
+    # Mutation ----------------------------------------------------------
+
+    def _add(self, suggestion):
+        self._remove(suggestion.key)
+        self._entries[suggestion.key] = suggestion
+        text = suggestion.normalized
+        for start in _word_starts(text):
+            item = (text[start:], suggestion.key)
+            if self._loading:
+                self._prefixes.append(item)
+            else:
+                bisect.insort(self._prefixes, item)
+        for gram in suggestion.grams:
+            self._postings.setdefault(gram, set()).add(suggestion.key)
+
+    def _remove(self, key):
+        suggestion = self._entries.pop(key, None)
+        if suggestion is None:
+            return
+        text = suggestion.normalized
+        for start in _word_starts(text):
+            item = (text[start:], key)
+            i = bisect.bisect_left(self._prefixes, item)
+            if i < len(self._prefixes) and self._prefixes[i] == item:
+                del self._prefixes[i]
+        for gram in suggestion.grams:
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def _make(self, kind, key, text, slug, weight):
+        normalized = normalize(text)
+        return Suggestion(
+            kind, key, text, slug, weight, normalized, trigrams(normalized)
+        )
+
+    def _set_article(self, pk, title, slug, view_count, featured, tags):
+        weight = math.log1p(view_count) + (1.0 if featured else 0.0)
+        self._add(self._make("article", ("article", pk), title, slug, weight))
+
+        self._set_tags(pk, tags)
+
+    def _set_tags(self, pk, tags):
+        tags = {tag for tag in tags or [] if isinstance(tag, str) and tag}
+        old = self._article_tags.get(pk, set())
+        for tag in old - tags:
+            self._tag_counts[tag] -= 1
+            if self._tag_counts[tag] <= 0:
+                del self._tag_counts[tag]
+                self._remove(("tag", tag))
+        for tag in tags - old:
+            self._tag_counts[tag] += 1
+        if tags:
+            self._article_tags[pk] = tags
+        else:
+            self._article_tags.pop(pk, None)
+        if not self._loading:
+            for tag in tags ^ old:
+                if tag in self._tag_counts:
+                    self._set_tag(tag)
+
+    def _delete(self, key):
+        kind, pk = key
+        self._remove(key)
+        if kind == "article":
+            self._set_tags(pk, ())
+
+    def _set_tag(self, tag):
+        weight = math.log1p(self._tag_counts[tag])
+        self._add(self._make("tag", ("tag", tag), tag, None, weight))
+
+    def _set_category(self, pk, name, slug):
+        self._add(self._make("category", ("category", pk), name, slug, 1.0))
+
+    def _clear(self):
+        self._entries.clear()
+        self._prefixes.clear()
+        self._postings.clear()
+        self._article_tags.clear()
+        self._tag_counts.clear()
+        self._synced_at = None
+
+    # Synchronisation ---------------------------------------------------
+
+    def _read_stamp(self):
+        try:
+            with open(os.path.join(self.directory, STAMP)) as fh:
+                generation, rebuild = fh.read().split()
+                return int(generation), int(rebuild)
+        except (FileNotFoundError, ValueError):
+            return 0, 0
+
+    def bump(self, rebuild=False, deleted=()):
+        """Tell every worker that suggestions changed.
+
+        deleted lists the ``(kind, pk)`` keys of deleted rows.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, STAMP)
+        with open(path, "a+") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                generation, rebuilds = self._read_stamp()
+                generation += 1
+                # The journal is written first, so workers that see the
+                # new stamp find every deletion up to it.
+                with open(os.path.join(self.directory, JOURNAL), "a") as log:
+                    log.writelines(
+                        f"{generation} {kind} {pk}\n" for kind, pk in deleted
+                    )
+                    if log.tell() > MAX_JOURNAL_BYTES:
+                        log.truncate(0)
+                        rebuild = True
+                fh.seek(0)
+                fh.truncate()
+                fh.write(f"{generation} {rebuilds + int(rebuild)}")
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _read_journal(self, after, until):
+        """Return the keys deleted in generations after..until."""
+        keys = []
+        try:
+            with open(os.path.join(self.directory, JOURNAL), "rb") as fh:
+                fh.seek(self._journal_offset)
+                for line in fh:
+                    if not line.endswith(b"\n"):
+                        break
+                    generation, kind, pk = line.decode().split()
+                    if int(generation) > until:
+                        break
+                    self._journal_offset += len(line)
+                    if int(generation) > after:
+                        keys.append((kind, uuid.UUID(pk)))
+        except FileNotFoundError:
+            pass
+        return keys
+
+    def sync(self):
+        """Load or incrementally refresh the index from the database."""
+        from wiki.models import Article, Category
+
+        stamp = self._read_stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            full = self._stamp is None or stamp[1] != self._stamp[1]
+            articles = Article.objects.all()
+            categories = Category.objects.all()
+            if full:
+                self._clear()
+                self._journal_offset = 0
+                # Append prefixes unsorted and sort once at the end.
+                self._loading = True
+            else:
+                # Rows can commit a little after their updated_at was set,
+                # so look back a margin; re-applying a row is harmless.
+                since = self._synced_at - SYNC_MARGIN
+                articles = articles.filter(updated_at__gte=since)
+                categories = categories.filter(updated_at__gte=since)
+
+            synced_at = self._synced_at
+            try:
+                for row in articles.values_list(
+                    "id",
+                    "title",
+                    "slug",
+                    "view_count",
+                    "featured",
+                    "tags",
+                    "updated_at",
+                ).iterator(chunk_size=2000):
+                    self._set_article(*row[:-1])
+                    synced_at = max(synced_at or row[-1], row[-1])
+                for pk, name, slug, updated_at in categories.values_list(
+                    "id", "name", "slug", "updated_at"
+                ):
+                    self._set_category(pk, name, slug)
+                    synced_at = max(synced_at or updated_at, updated_at)
+                if self._loading:
+                    for tag in self._tag_counts:
+                        self._set_tag(tag)
+                # A full load only skips the deletions it already saw.
+                after = stamp[0] if full else self._stamp[0]
+                for key in self._read_journal(after, stamp[0]):
+                    self._delete(key)
+            finally:
+                if self._loading:
+                    self._prefixes.sort()
+                    self._loading = False
+
+            self._synced_at = synced_at or timezone.now()
+            self._stamp = stamp
+
+    def update_article(self, article):
+        """Apply a saved article to this worker and notify the others."""
+        with self._lock:
+            if self._stamp is not None:
+                self._set_article(
+                    article.pk,
+                    article.title,
+                    article.slug,
+                    article.view_count,
+                    article.featured,
+                    article.tags,
+                )
+        self.bump()
+
+    def update_category(self, category):
+        """Apply a saved category to this worker and notify the others."""
+        with self._lock:
+            if self._stamp is not None:
+                self._set_category(category.pk, category.name, category.slug)
+        self.bump()
+
+    def delete(self, keys):
+        """Drop deleted ``(kind, pk)`` rows here and in other workers."""
+        keys = list(keys)
+        with self._lock:
+            if self._stamp is not None:
+                for key in keys:
+                    self._delete(key)
+        self.bump(deleted=keys)
+
+    def invalidate(self):
+        """Force every worker to reload."""
+        self.bump(rebuild=True)
+
+    # Querying ----------------------------------------------------------
+
+    def suggest(self, query, limit=10, kinds=None):
+        """Return up to limit ``(score, Suggestion)`` pairs, best first."""
+        self.sync()
+        text = normalize(query)
+        if not text:
+            return []
+
+        with self._lock:
+            scores = {}
+            self._prefix_matches(text, limit * 5, scores)
+            # Typo tolerance is only needed when completions run short.
+            if len(scores) < limit and len(text) >= 3:
+                self._fuzzy_matches(text, scores)
+
+            results = []
+            for key, score in scores.items():
+                suggestion = self._entries[key]
+                if kinds and suggestion.kind not in kinds:
+                    continue
+                results.append((score + 0.1 * suggestion.weight, suggestion))
+
+        results.sort(key=lambda item: (-item[0], item[1].text))
+        return results[:limit]
+
+    def _prefix_matches(self, text, cap, scores):
+        i = bisect.bisect_left(self._prefixes, (text,))
+        found = 0
+        while i < len(self._prefixes) and found < cap:
+            suffix, key = self._prefixes[i]
+            if not suffix.startswith(text):
+                break
+            full = self._entries[key].normalized
+            # Whole-string prefixes outrank matches on a later word.
+            score = 2.0 if full.startswith(text) else 1.5
+            scores[key] = max(scores.get(key, 0.0), score)
+            found += 1
+            i += 1
+
+    def _fuzzy_matches(self, text, scores):
+        grams = trigrams(text)
+        if not grams:
+            return
+        needed = max(1, math.ceil(SIMILARITY_THRESHOLD * len(grams) / 2))
+        lists = sorted(
+            (self._postings.get(gram, ()) for gram in grams), key=len
+        )
+        candidates = set()
+        for keys in lists[: len(grams) - needed + 1]:
+            # Grams shared by a large part of the corpus (word starts such
+            # as "  a") say little about similarity; skip them like stop
+            # words so short queries stay cheap.
+            if len(keys) > MAX_POSTINGS:
+                break
+            candidates.update(keys)
+
+        for key in candidates:
+            entry_grams = self._entries[key].grams
+            shared = len(grams & entry_grams)
+            similarity = 2 * shared / (len(grams) + len(entry_grams))
+            if similarity >= SIMILARITY_THRESHOLD:
+                scores[key] = max(scores.get(key, 0.0), similarity)
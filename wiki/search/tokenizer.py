@@ -0,0 +1,58 @@
+import re
+
+from django.utils.html import escape
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+STOP_WORDS = frozenset("""
+    a an and are as at be but by for from has have in into is it its of on
+    or that the their then there these this to was were will with
+    """.split())
+
+
+def iter_tokens(text):
+    """Yield (term, start, end) for every indexable token in text."""
+    for match in TOKEN_RE.finditer(text or ""):
+        term = match.group().lower()
+        if len(term) < 2 or term in STOP_WORDS:
+            continue
+        yield term, match.start(), match.end()
+
+
+def tokenize(text):
+    """Split text into a list of normalized terms."""
+    return [term for term, _, _ in iter_tokens(text)]
+
+
+def highlight(text, query, width=200, tag="mark"):
+    """Return an HTML-escaped snippet of text with query terms wrapped.
+
+    The window opens shortly before the first matching term; if nothing
+    matches, the start of the text is returned.
+    """
+    text = text or ""
+    terms = set(tokenize(query))
+    matches = [
+        (start, end) for term, start, end in iter_tokens(text) if term in terms
+    ]
+    if matches:
+        first = matches[0][0]
+        start = max(0, first - width // 4)
+    else:
+        start = 0
+    stop = min(len(text), start + width)
+
+    parts = ["…" if start > 0 else ""]
+    cursor = start
+    for match_start, match_end in matches:
+        if match_start < start:
+            continue
+        if match_end > stop:
+            break
+        parts.append(escape(text[cursor:match_start]))
+        parts.append(f"<{tag}>{escape(text[match_start:match_end])}</{tag}>")
+        cursor = match_end
+    parts.append(escape(text[cursor:stop]))
+    if stop < len(text):
+        parts.append("…")
+    return "".join(parts)
@@ -0,0 +1,588 @@
+"""Dense article embeddings and an approximate nearest-neighbour index.
+
+Embeddings are latent semantic vectors: a hashed TF-IDF representation of
+the article text projected onto the top singular vectors of a corpus
+sample (truncated SVD computed with NumPy's randomized range finder).
+``manage.py build_vectors`` fits the projection and embeds every article;
+afterwards each article save re-embeds just that article.
+
+On disk, a generation directory holds
+
+    model.npz        idf weights, SVD projection and LSH hyperplanes
+    vectors.f32      (capacity, dim) float32 unit vectors
+    ids.u8           (capacity, 16) article UUID bytes, zeros when free
+    signatures.u32   (capacity, tables) LSH bucket keys
+    meta.json        row count, capacity, free rows and a journal of
+                     recent writes
+
+and ``CURRENT`` names the live generation. The arrays are memory-mapped,
+so all workers share one copy. Queries use random-hyperplane LSH with
+multi-probe lookups: each worker keeps the bucket keys of every table
+sorted for ``searchsorted`` and scans rows written since its last sort
+from the journal, then re-ranks candidates by exact cosine similarity.
+Rows freed by deletions are reused by later inserts, so the arrays only
+grow with the number of live articles.
+"""
+
+import fcntl
+import json
+import math
+import os
+import shutil
+import threading
+import uuid
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+from .tokenizer import tokenize
+
+CURRENT = "CURRENT"
+LOCK = ".lock"
+META = "meta.json"
+
+DEFAULT_FEATURES = 2**15
+DEFAULT_DIM = 128
+DEFAULT_TABLES = 8
+MAX_BITS = 24
+
+# Writes remembered in meta.json so readers can catch up without
+# re-sorting their LSH tables after every single save.
+JOURNAL_SIZE = 512
+
+# Rows per chunk when multiplying sparse TF-IDF blocks with dense arrays.
+CHUNK_ROWS = 256
+
+
+def hash_terms(terms, features):
+    """Map terms to stable hashed feature counts."""
+    counts = Counter(
+        zlib.crc32(term.encode("utf-8")) % features for term in terms
+    )
+    return counts
+
+
+class SparseRows:
+    """Minimal CSR matrix of L2-normalized TF-IDF rows."""
+
+    def __init__(self, indptr, indices, data, features):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.features = features
+
+    @classmethod
+    def from_counts(cls, rows, idf, features):
+        indptr = [0]
+        indices = []
+        data = []
+        for counts in rows:
+            cols = np.fromiter(
+                counts.keys(), dtype=np.int64, count=len(counts)
+            )
+            tf = np.fromiter(
+                counts.values(), dtype=np.float32, count=len(counts)
+            )
+            weights = (1 + np.log(tf)) * idf[cols]
+            norm = np.linalg.norm(weights)
+            if norm:
+                weights /= norm
+            indices.append(cols)
+            data.append(weights)
+            indptr.append(indptr[-1] + len(cols))
+        return cls(
+            np.asarray(indptr, dtype=np.int64),
+            np.concatenate(indices) if indices else np.empty(0, np.int64),
+            (
+                np.concatenate(data).astype(np.float32)
+                if data
+                else np.empty(0, np.float32)
+            ),
+            features,
+        )
+
+    @property
+    def shape(self):
+        return len(self.indptr) - 1, self.features
+
+    def _chunks(self):
+        for start in range(0, self.shape[0], CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, self.shape[0])
+            lo, hi = self.indptr[start], self.indptr[stop]
+            rows = np.repeat(
+                np.arange(start, stop), np.diff(self.indptr[start : stop + 1])
+            )
+            yield start, stop, rows, self.indices[lo:hi], self.data[lo:hi]
+
+    def dot(self, dense):
+        """Return self @ dense for a (features, r) dense array."""
+        out = np.zeros((self.shape[0], dense.shape[1]), dtype=np.float32)
+        for _, _, rows, cols, vals in self._chunks():
+            np.add.at(out, rows, vals[:, None] * dense[cols])
+        return out
+
+    def tdot(self, dense):
+        """Return self.T @ dense for a (rows, r) dense array."""
+        out = np.zeros((self.features, dense.shape[1]), dtype=np.float32)
+        for _, _, rows, cols, vals in self._chunks():
+            np.add.at(out, cols, vals[:, None] * dense[rows])
+        return out
+
+
+def randomized_svd(matrix, rank, oversample=10, power_iterations=2, seed=0):
+    """Return the top right singular vectors of a SparseRows matrix.
+
+    Halko, Martinsson & Tropp, "Finding structure with randomness", with
+    a few power iterations since TF-IDF spectra decay slowly.
+    """
+    rng = np.random.default_rng(seed)
+    width = min(rank + oversample, *matrix.shape)
+    omega = rng.standard_normal((matrix.features, width)).astype(np.float32)
+    sample = matrix.dot(omega)
+    q, _ = np.linalg.qr(sample)
+    for _ in range(power_iterations):
+        q, _ = np.linalg.qr(matrix.tdot(q))
+        q, _ = np.linalg.qr(matrix.dot(q))
+    projected = matrix.tdot(q).T  # (width, features)
+    _, _, vt = np.linalg.svd(projected, full_matrices=False)
+    return np.ascontiguousarray(vt[:rank].T, dtype=np.float32)
+
+
+class EmbeddingModel:
+    """Fitted TF-IDF weights, SVD projection and LSH hyperplanes."""
+
+    def __init__(self, idf, components, planes, bits):
+        self.idf = idf
+        self.components = components
+        self.planes = planes
+        self.bits = bits
+
+    @property
+    def features(self):
+        return len(self.idf)
+
+    @property
+    def dim(self):
+        return self.components.shape[1]
+
+    @property
+    def tables(self):
+        return self.planes.shape[0] // MAX_BITS
+
+    @classmethod
+    def fit(cls, sample, doc_freq, doc_count, dim, tables, bits, seed=0):
+        """Fit the model from hashed term counts of a corpus sample."""
+        features = len(doc_freq)
+        idf = (np.log((1 + doc_count) / (1 + doc_freq)) + 1).astype(np.float32)
+        matrix = SparseRows.from_counts(sample, idf, features)
+        components = randomized_svd(matrix, dim, seed=seed)
+        if components.shape[1] < dim:
+            components = np.pad(
+                components, ((0, 0), (0, dim - components.shape[1]))
+            )
+        rng = np.random.default_rng(seed + 1)
+        planes = rng.standard_normal((tables * MAX_BITS, dim)).astype(
+            np.float32
+        )
+        return cls(idf, components, planes, bits)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["idf"],
+                data["components"],
+                data["planes"],
+                int(data["bits"]),
+            )
+
+    def save(self, path):
+        with open(path, "wb") as fh:
+            np.savez(
+                fh,
+                idf=self.idf,
+                components=self.components,
+                planes=self.planes,
+                bits=np.int64(self.bits),
+            )
+
+    def embed(self, term_lists):
+        """Return unit-length float32 embeddings, one row per term list."""
+        counts = [hash_terms(terms, self.features) for terms in term_lists]
+        vectors = SparseRows.from_counts(counts, self.idf, self.features).dot(
+            self.components
+        )
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def signatures(self, vectors):
+        """Return the (rows, tables) LSH bucket keys of unit vectors."""
+        bits = (vectors @ self.planes.T) > 0
+        bits = bits.reshape(len(vectors), self.tables, MAX_BITS)[
+            :, :, : self.bits
+        ]
+        weights = (1 << np.arange(self.bits, dtype=np.uint32)).astype(
+            np.uint32
+        )
+        return (bits * weights).sum(axis=2, dtype=np.uint32)
+
+
+def bits_for(count, bucket_size=64):
+    """Bits per LSH key so that buckets hold about bucket_size rows."""
+    return int(
+        min(MAX_BITS, max(4, round(math.log2(max(count, 1) / bucket_size))))
+    )
+
+
+class VectorIndex:
+    """Process-local handle on the shared, memory-mapped vector store."""
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._generation_dir = None
+        self.model = None
+        self._meta = None
+        self._vectors = None
+        self._ids = None
+        self._signatures = None
+        self._rows = {}
+        self._row_ids = {}
+        self._seen = 0
+        self._tables = []
+        self._sorted_at = 0
+
+    # Files ---------------------------------------------------------------
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def _current(self):
+        try:
+            with open(self._path(CURRENT)) as fh:
+                return fh.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _read_meta(directory):
+        with open(os.path.join(directory, META)) as fh:
+            return json.load(fh)
+
+    @staticmethod
+    def _write_meta(directory, meta):
+        tmp_path = os.path.join(directory, f"{META}.tmp")
+        with open(tmp_path, "w") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp_path, os.path.join(directory, META))
+
+    @staticmethod
+    def _open_arrays(directory, meta, mode="r"):
+        capacity = meta["capacity"]
+        return (
+            np.memmap(
+                os.path.join(directory, "vectors.f32"),
+                dtype=np.float32,
+                mode=mode,
+                shape=(capacity, meta["dim"]),
+            ),
+            np.memmap(
+                os.path.join(directory, "ids.u8"),
+                dtype=np.uint8,
+                mode=mode,
+                shape=(capacity, 16),
+            ),
+            np.memmap(
+                os.path.join(directory, "signatures.u32"),
+                dtype=np.uint32,
+                mode=mode,
+                shape=(capacity, meta["tables"]),
+            ),
+        )
+
+    @staticmethod
+    def _allocate(directory, meta):
+        for name, row_bytes in (
+            ("vectors.f32", meta["dim"] * 4),
+            ("ids.u8", 16),
+            ("signatures.u32", meta["tables"] * 4),
+        ):
+            with open(os.path.join(directory, name), "ab") as fh:
+                fh.truncate(meta["capacity"] * row_bytes)
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(LOCK), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    # Reading -------------------------------------------------------------
+
+    @property
+    def ready(self):
+        self._refresh()
+        return self.model is not None
+
+    def _refresh(self):
+        name = self._current()
+        if name is None:
+            return
+        directory = self._path(name)
+        try:
+            stat = os.stat(os.path.join(directory, META))
+        except FileNotFoundError:
+            return
+        stamp = (name, stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if stamp == self._stamp:
+            return
+
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            meta = self._read_meta(directory)
+            new_generation = directory != self._generation_dir
+            if new_generation:
+                self.model = EmbeddingModel.load(
+                    os.path.join(directory, "model.npz")
+                )
+            if new_generation or meta["capacity"] != self._meta["capacity"]:
+                arrays = self._open_arrays(directory, meta)
+                self._vectors, self._ids, self._signatures = arrays
+
+            journal_start = meta["generation"] - len(meta["journal"])
+            if new_generation or self._seen < journal_start:
+                self._load_rows(meta)
+            else:
+                for generation, row in meta["journal"]:
+                    if generation > self._seen:
+                        self._set_row(row)
+            self._seen = meta["generation"]
+
+            if (
+                new_generation
+                or self._sorted_at < journal_start
+                or meta["generation"] - self._sorted_at > JOURNAL_SIZE // 2
+            ):
+                self._sort_tables(meta)
+
+            self._generation_dir = directory
+            self._meta = meta
+            self._stamp = stamp
+
+    def _load_rows(self, meta):
+        ids = np.array(self._ids[: meta["count"]])
+        live = np.flatnonzero(ids.any(axis=1))
+        self._row_ids = {
+            int(row): uuid.UUID(bytes=ids[row].tobytes()) for row in live
+        }
+        self._rows = {
+            article_id: row for row, article_id in self._row_ids.items()
+        }
+
+    def _set_row(self, row):
+        old = self._row_ids.pop(row, None)
+        if old is not None and self._rows.get(old) == row:
+            del self._rows[old]
+        raw = self._ids[row]
+        if raw.any():
+            article_id = uuid.UUID(bytes=raw.tobytes())
+            self._row_ids[row] = article_id
+            self._rows[article_id] = row
+
+    def _sort_tables(self, meta):
+        count = meta["count"]
+        signatures = np.array(self._signatures[:count])
+        tables = []
+        for table in range(signatures.shape[1]):
+            order = np.argsort(signatures[:, table], kind="stable")
+            tables.append((signatures[order, table], order))
+        self._tables = tables
+        self._sorted_at = meta["generation"]
+
+    def _candidates(self, vector):
+        meta = self._meta
+        signature = self.model.signatures(vector[None, :])[0]
+        flips = np.concatenate(
+            [[0], 1 << np.arange(self.model.bits, dtype=np.uint32)]
+        ).astype(np.uint32)
+        found = []
+        for table, (keys, order) in enumerate(self._tables):
+            probes = signature[table] ^ flips
+            lo = np.searchsorted(keys, probes, side="left")
+            hi = np.searchsorted(keys, probes, side="right")
+            for start, stop in zip(lo, hi):
+                if stop > start:
+                    found.append(order[start:stop])
+        # Rows written since the tables were last sorted.
+        recent = [
+            row
+            for generation, row in meta["journal"]
+            if generation > self._sorted_at
+        ]
+        found.append(np.asarray(recent, dtype=np.int64))
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found).astype(np.int64))
+
+    def _nearest(self, vector, limit, exclude=None):
+        candidates = self._candidates(vector)
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        if not len(candidates):
+            return []
+        scores = self._vectors[candidates] @ vector
+        live = self._ids[candidates].any(axis=1) & (scores > 0)
+        candidates, scores = candidates[live], scores[live]
+        top = np.argsort(-scores)[:limit]
+        return [
+            (
+                uuid.UUID(bytes=self._ids[candidates[i]].tobytes()),
+                float(scores[i]),
+            )
+            for i in top
+        ]
+
+    def related(self, article_id, limit=10):
+        """Return ``(article_id, similarity)`` pairs closest to an article."""
+        self._refresh()
+        with self._lock:
+            row = self._rows.get(article_id)
+            if row is None:
+                return []
+            vector = np.array(self._vectors[row])
+            return self._nearest(vector, limit, exclude=row)
+
+    def search(self, query, limit=100):
+        """Return ``(article_id, similarity)`` pairs closest to a query."""
+        self._refresh()
+        with self._lock:
+            if self.model is None:
+                return []
+            vector = self.model.embed([tokenize(query)])[0]
+            if not vector.any():
+                return []
+            return self._nearest(vector, limit)
+
+    # Writing -------------------------------------------------------------
+
+    def update(self, documents):
+        """Embed and store ``(article_id, terms)`` pairs."""
+        documents = list(documents)
+        self._refresh()
+        if self.model is None or not documents:
+            return
+        vectors = self.model.embed([terms for _, terms in documents])
+        signatures = self.model.signatures(vectors)
+        with self._write_lock(), self._lock:
+            directory, meta, arrays = self._open_for_write()
+            if directory is None:
+                return
+            for (article_id, _), vector, signature in zip(
+                documents, vectors, signatures
+            ):
+                row = self._rows.get(article_id)
+                if row is None and meta.get("free"):
+                    row = meta["free"].pop()
+                    self._rows[article_id] = row
+                elif row is None:
+                    if meta["count"] == meta["capacity"]:
+                        for array in arrays:
+                            array.flush()
+                        meta["capacity"] *= 2
+                        self._allocate(directory, meta)
+                        arrays = self._open_arrays(directory, meta, "r+")
+                    row = meta["count"]
+                    meta["count"] += 1
+                    self._rows[article_id] = row
+                arrays[0][row] = vector
+                arrays[1][row] = np.frombuffer(article_id.bytes, np.uint8)
+                arrays[2][row] = signature
+                self._journal(meta, row)
+            for array in arrays:
+                array.flush()
+            self._write_meta(directory, meta)
+
+    def delete(self, article_ids):
+        """Free the rows of deleted articles for reuse."""
+        self._refresh()
+        if self.model is None:
+            return
+        with self._write_lock(), self._lock:
+            directory, meta, arrays = self._open_for_write()
+            if directory is None:
+                return
+            free = meta.setdefault("free", [])
+            for article_id in article_ids:
+                row = self._rows.pop(article_id, None)
+                if row is not None:
+                    arrays[0][row] = 0
+                    arrays[1][row] = 0
+                    free.append(row)
+                    self._journal(meta, row)
+            for array in arrays:
+                array.flush()
+            self._write_meta(directory, meta)
+
+    def _open_for_write(self):
+        # Catch up with writes from other processes while holding the
+        # lock, so the row map is current.
+        self._refresh()
+        directory = self._generation_dir
+        if directory is None:
+            return None, None, None
+        meta = self._read_meta(directory)
+        return directory, meta, self._open_arrays(directory, meta, "r+")
+
+    @staticmethod
+    def _journal(meta, row):
+        meta["generation"] += 1
+        meta["journal"].append((meta["generation"], row))
+        del meta["journal"][:-JOURNAL_SIZE]
+
+    def publish(self, model, article_ids, vectors):
+        """Install a freshly built generation and drop the old ones."""
+        name = f"gen-{uuid.uuid4().hex[:12]}"
+        directory = self._path(name)
+        os.makedirs(directory)
+        count = len(article_ids)
+        meta = {
+            "count": count,
+            "capacity": max(1024, 2 ** math.ceil(math.log2(count + 1))),
+            "dim": model.dim,
+            "tables": model.tables,
+            "generation": 0,
+            "journal": [],
+            "free": [],
+        }
+        model.save(os.path.join(directory, "model.npz"))
+        self._allocate(directory, meta)
+        arrays = self._open_arrays(directory, meta, mode="r+")
+        if count:
+            arrays[0][:count] = vectors
+            arrays[1][:count] = np.frombuffer(
+                b"".join(article_id.bytes for article_id in article_ids),
+                dtype=np.uint8,
+            ).reshape(count, 16)
+            arrays[2][:count] = model.signatures(vectors)
+        for array in arrays:
+            array.flush()
+        del arrays
+        self._write_meta(directory, meta)
+
+        with self._write_lock():
+            tmp_path = self._path(f"{CURRENT}.tmp")
+            with open(tmp_path, "w") as fh:
+                fh.write(name)
+            os.replace(tmp_path, self._path(CURRENT))
+            # Workers that still map the old arrays keep valid pages.
+            for entry in os.listdir(self.directory):
+                if entry.startswith("gen-") and entry != name:
+                    shutil.rmtree(self._path(entry), ignore_errors=True)
@@ -1,16 +1,52 @@
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
-from .models import Article, Section, Revision
+from core.fieldsets import SparseFieldsetMixin
+from users.serializers import full_name
+from .models import (
+    Article,
+    Category,
+    Section,
+    Revision,
+    SavedSearch,
+    SearchAlert,
+)
+from .revisions import load_texts
+from .search import highlight
+from .search.percolator import query_terms
 
 
-class ArticleSerializer(serializers.ModelSerializer):
-    """Serializer for Article model."""
+class CategorySerializer(serializers.ModelSerializer):
+    """Serializer for Category model."""
+
+    class Meta:
+        model = Category
+        fields = [
+            "id",
+            "name",
+            "slug",
+            "description",
+            "color",
+            "parent",
+            "breadcrumbs",
+            "article_count",
+            "subtree_published_count",
+        ]
+        read_only_fields = fields
+
+
+class ArticleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Serializer for Article model.
+
+    Supports ``?fields=`` and ``?expand=`` (see core.fieldsets).
+    """
 
     author_name = serializers.CharField(
         source="author.get_full_name", read_only=True
     )
     total_sections = serializers.IntegerField(
-        source="sections.count", read_only=True
+        source="section_count", read_only=True
     )
+    search_highlight = serializers.SerializerMethodField()
 
     class Meta:
         model = Article
@@ -25,9 +61,12 @@ class ArticleSerializer(serializers.ModelSerializer):
             "status",
             "featured",
             "total_sections",
+            "revision_count",
+            "comment_count",
             "current_revision",
             "category",
             "tags",
+            "search_highlight",
             "created_at",
             "updated_at",
         ]
@@ -36,9 +75,39 @@ class ArticleSerializer(serializers.ModelSerializer):
             "slug",
             "created_at",
             "updated_at",
+            "revision_count",
+            "comment_count",
             "current_revision",
             "author",
         ]
+        expandable_fields = {
+            "author": "users.serializers.UserSummarySerializer",
+            "category": "wiki.serializers.CategorySerializer",
+            "sections": "wiki.serializers.SectionSerializer",
+            "current_revision": "wiki.serializers.RevisionSerializer",
+        }
+        field_requirements = {
+            "search_highlight": {"only": ["current_content"]},
+        }
+        # Columns read by the values() fast path (see core.values)
+        values_mappers = {
+            "author_name": ["author__first_name", "author__last_name"],
+            "search_highlight": ["current_content"],
+        }
+
+    @extend_schema_field(serializers.CharField(allow_null=True))
+    def get_search_highlight(self, obj):
+        """Snippet of the content around the search terms, if searching."""
+        return self.map_search_highlight(obj.current_content)
+
+    def map_author_name(self, first_name, last_name):
+        return full_name(first_name, last_name)
+
+    def map_search_highlight(self, current_content):
+        query = self.context.get("search_query")
+        if not query:
+            return None
+        return highlight(current_content, query)
 
     def create(self, validated_data):
         # Set the author to the current user
@@ -46,12 +115,21 @@ class ArticleSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class SectionSerializer(serializers.ModelSerializer):
-    """Serializer for Section model."""
+class SectionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Serializer for Section model.
 
-    section_level = serializers.CharField(source="get_level", read_only=True)
-    section_number = serializers.CharField(
-        source="get_section_number", read_only=True
+    New sections go last among their siblings unless ``after`` or
+    ``before`` names the sibling to place them next to; sending either on
+    update moves the section.
+    """
+
+    section_level = serializers.CharField(source="depth", read_only=True)
+    section_number = serializers.CharField(source="number", read_only=True)
+    after = serializers.PrimaryKeyRelatedField(
+        queryset=Section.objects.all(), write_only=True, required=False
+    )
+    before = serializers.PrimaryKeyRelatedField(
+        queryset=Section.objects.all(), write_only=True, required=False
     )
 
     class Meta:
@@ -61,8 +139,10 @@ class SectionSerializer(serializers.ModelSerializer):
             "article",
             "title",
             "content",
-            "order",
+            "rank",
             "parent",
+            "after",
+            "before",
             "section_level",
             "section_number",
             "created_at",
@@ -70,16 +150,116 @@ class SectionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = [
             "id",
+            "rank",
             "section_level",
             "section_number",
             "created_at",
             "updated_at",
         ]
+        expandable_fields = {
+            "article": "wiki.serializers.ArticleSerializer",
+        }
+
+    def validate(self, attrs):
+        article = attrs.get("article", getattr(self.instance, "article", None))
+        parent = attrs.get("parent", getattr(self.instance, "parent", None))
+        if parent is not None:
+            if parent.article_id != article.pk:
+                raise serializers.ValidationError(
+                    {"parent": "The parent must belong to the same article."}
+                )
+            if self.instance is not None and (
+                parent.pk == self.instance.pk
+                or self.instance.path
+                and parent.path.startswith(self.instance.path)
+            ):
+                raise serializers.ValidationError(
+                    {"parent": "A section cannot be nested in itself."}
+                )
+            if parent.depth + 1 >= Section.MAX_DEPTH:
+                raise serializers.ValidationError(
+                    {"parent": "Sections cannot be nested any deeper."}
+                )
+        if "after" in attrs and "before" in attrs:
+            raise serializers.ValidationError(
+                "Give either after or before, not both."
+            )
+        for name in ("after", "before"):
+            sibling = attrs.get(name)
+            if sibling is None:
+                continue
+            if (
+                sibling.article_id != article.pk
+                or sibling.parent_id != getattr(parent, "pk", None)
+                or self.instance is not None
+                and sibling.pk == self.instance.pk
+            ):
+                raise serializers.ValidationError(
+                    {name: "Must be another section with the same parent."}
+                )
+        return attrs
+
+    def create(self, validated_data):
+        after = validated_data.pop("after", None)
+        before = validated_data.pop("before", None)
+        section = Section(**validated_data)
+        section.place(after=after, before=before)
+        section.save()
+        return section
+
+    def update(self, instance, validated_data):
+        after = validated_data.pop("after", None)
+        before = validated_data.pop("before", None)
+        moved = any(
+            name in validated_data
+            and validated_data[name] != getattr(instance, name)
+            for name in ("article", "parent")
+        )
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if moved or after is not None or before is not None:
+            instance.place(after=after, before=before)
+        instance.save()
+        return instance
+
 
+class SectionOutlineSerializer(serializers.Serializer):
+    """Read-only serializer for a section and its subsections."""
 
-class RevisionSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField()
+    title = serializers.CharField()
+    level = serializers.IntegerField(source="depth")
+    number = serializers.CharField()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields["children"] = SectionOutlineSerializer(many=True)
+        return fields
+
+
+class RevisionListSerializer(serializers.ListSerializer):
+    """Rebuild the delta-compressed texts of a page in bulk."""
+
+    def to_representation(self, data):
+        revisions = list(data.all() if hasattr(data, "all") else data)
+        if "content" in self.child.fields:
+            texts = load_texts(
+                [
+                    revision.pk
+                    for revision in revisions
+                    if revision.delta_base_id is not None
+                ]
+            )
+            for revision in revisions:
+                if revision.pk in texts:
+                    revision._content = texts[revision.pk]
+        return super().to_representation(revisions)
+
+
+class RevisionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Revision model."""
 
+    content = serializers.CharField()
     editor_name = serializers.CharField(
         source="editor.get_full_name", read_only=True
     )
@@ -107,8 +287,175 @@ class RevisionSerializer(serializers.ModelSerializer):
             "updated_at",
             "editor",
         ]
+        expandable_fields = {
+            "article": "wiki.serializers.ArticleSerializer",
+            "editor": "users.serializers.UserSummarySerializer",
+        }
+        field_requirements = {
+            "content": {"only": ["content_data", "delta_base"]},
+        }
+        list_serializer_class = RevisionListSerializer
+        values_mappers = {
+            "content": ["id", "delta_base", "content_data"],
+            "editor_name": ["editor__first_name", "editor__last_name"],
+        }
+
+    def prepare_values(self, rows):
+        # Deltas need their chains; full texts are used as they are.
+        self._texts = {}
+        if "content" in self.fields:
+            self._texts = load_texts(
+                [row["id"] for row in rows if row["delta_base"] is not None]
+            )
+
+    def validate_content(self, value):
+        # The field trims whitespace, so the stored text is trimmed too.
+        if (
+            self.instance is not None
+            and value != self.instance.content.strip()
+        ):
+            raise serializers.ValidationError(
+                "The text of a saved revision cannot be changed; "
+                "create a new revision instead."
+            )
+        return value
+
+    def map_content(self, pk, delta_base, content_data):
+        return content_data if delta_base is None else self._texts[pk]
+
+    def map_editor_name(self, first_name, last_name):
+        return full_name(first_name, last_name)
 
     def create(self, validated_data):
         # Set the editor to the current user
         validated_data["editor"] = self.context["request"].user
         return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        # validate_content() only lets the unchanged text through.
+        validated_data.pop("content", None)
+        return super().update(instance, validated_data)
+
+
+class SuggestionSerializer(serializers.Serializer):
+    """Read-only serializer for typeahead suggestions."""
+
+    type = serializers.CharField(source="kind")
+    text = serializers.CharField()
+    slug = serializers.CharField(allow_null=True)
+    score = serializers.FloatField()
+
+
+class NearDuplicateSerializer(serializers.Serializer):
+    """Read-only serializer for near-duplicate article matches."""
+
+    id = serializers.UUIDField()
+    slug = serializers.CharField()
+    title = serializers.CharField()
+    distance = serializers.IntegerField()
+
+
+class TrendingArticleSerializer(serializers.Serializer):
+    """Read-only serializer for trending articles."""
+
+    id = serializers.UUIDField()
+    slug = serializers.CharField()
+    title = serializers.CharField()
+    category = serializers.UUIDField(source="category_id", allow_null=True)
+    score = serializers.FloatField(
+        help_text="Views, each weighted by its decay since it happened"
+    )
+
+
+class DiffChangeSerializer(serializers.Serializer):
+    """Read-only serializer for a run of kept, deleted or inserted text."""
+
+    op = serializers.ChoiceField(choices=["equal", "delete", "insert"])
+    text = serializers.CharField()
+
+
+class DiffHunkSerializer(serializers.Serializer):
+    """Read-only serializer for a changed passage and its context."""
+
+    from_start = serializers.IntegerField()
+    from_lines = serializers.IntegerField()
+    to_start = serializers.IntegerField()
+    to_lines = serializers.IntegerField()
+    changes = DiffChangeSerializer(many=True)
+
+
+class RevisionDiffSerializer(serializers.Serializer):
+    """Read-only serializer for the diff between two revisions."""
+
+    from_version = serializers.IntegerField()
+    to_version = serializers.IntegerField()
+    style = serializers.ChoiceField(choices=["unified", "structured"])
+    insertions = serializers.IntegerField(help_text="Lines added")
+    deletions = serializers.IntegerField(help_text="Lines removed")
+    diff = serializers.CharField(
+        required=False, help_text="Unified diff (unified style only)"
+    )
+    hunks = DiffHunkSerializer(
+        many=True,
+        required=False,
+        help_text="Word-level changes (structured style only)",
+    )
+
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    """Serializer for SavedSearch model."""
+
+    class Meta:
+        model = SavedSearch
+        fields = [
+            "id",
+            "name",
+            "query",
+            "terms",
+            "is_active",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = ["id", "terms", "created_at", "updated_at"]
+
+    def validate_query(self, value):
+        if not query_terms(value):
+            raise serializers.ValidationError(
+                "The query must contain at least one searchable word."
+            )
+        return value
+
+
+class SearchAlertSerializer(serializers.ModelSerializer):
+    """Serializer for SearchAlert model."""
+
+    saved_search_name = serializers.CharField(
+        source="saved_search.name", read_only=True
+    )
+    article_title = serializers.CharField(
+        source="article.title", read_only=True
+    )
+    article_slug = serializers.CharField(source="article.slug", read_only=True)
+
+    class Meta:
+        model = SearchAlert
+        fields = [
+            "id",
+            "saved_search",
+            "saved_search_name",
+            "article",
+            "article_title",
+            "article_slug",
+            "revision",
+            "is_read",
+            "created_at",
+        ]
+        read_only_fields = fields
+
+
+class UniqueViewersSerializer(serializers.Serializer):
+    """Approximate distinct viewers over a range of days."""
+
+    start = serializers.DateField()
+    end = serializers.DateField()
+    unique_viewers = serializers.IntegerField()
@@ -1,3 +1,1676 @@
-from django.test import TestCase
+import gzip
+import importlib
+import json
+import math
+import os
+import random
+import tempfile
+import uuid
+from datetime import UTC, datetime, timedelta
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .admin import RevisionAdminForm
+from .analytics import (
+    add_viewers,
+    archive_views,
+    compact_rollups,
+    rollup_mark,
+    rollup_views,
+)
+from .management.commands import find_duplicates
+from .models import (
+    AnalyticsCheckpoint,
+    Article,
+    ArticleView,
+    ArticleViewRollup,
+    Category,
+    CategoryClosure,
+    Revision,
+    SavedSearch,
+    SearchAlert,
+    Section,
+    UserAgent,
+)
+from core.lru import LRUCache
+
+from .revisions import get_text_cache, load_texts
+from .search import SearchUnavailable
+from .search.backends import DatabaseSearchBackend
+from .search.index import MANIFEST, SEGMENT_SUFFIX, InvertedIndex
+from .search.percolator import Percolator
+from .search.segments import write_segment
+from .search.suggest import JOURNAL, SuggestIndex
+from .search.vectors import (
+    JOURNAL_SIZE,
+    META,
+    EmbeddingModel,
+    VectorIndex,
+    bits_for,
+    hash_terms,
+)
+from .search.tokenizer import tokenize
+from .tracking import ViewBuffer
+from .trending import get_trending_board, seconds
+
+
+class InvertedIndexTests(SimpleTestCase):
+    """Segment writing, deletes, merges and BM25 ranking."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        self.index = InvertedIndex(self.directory, max_segments=3)
+
+    def manifest(self):
+        with open(os.path.join(self.directory, MANIFEST)) as fh:
+            return json.load(fh)
+
+    def segment_files(self):
+        return sorted(
+            name
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def doc(self, text, doc_id=None):
+        return doc_id or uuid.uuid4(), tokenize(text)
+
+    def test_search_ranks_by_bm25(self):
+        often, once, other = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        self.index.update(
+            [
+                self.doc("zebra zebra zebra stripes", often),
+                self.doc("a zebra among many horses in the field", once),
+                self.doc("horses in the field", other),
+            ]
+        )
+        hits = self.index.search("zebra")
+        self.assertEqual([doc_id for doc_id, _ in hits], [often, once])
+        self.assertGreater(hits[0][1], hits[1][1])
+        self.assertEqual(self.index.doc_count, 3)
+        self.assertEqual(self.index.search("giraffe"), [])
+        self.assertEqual(self.index.search(""), [])
+
+    def test_rare_terms_weigh_more(self):
+        common, rare = uuid.uuid4(), uuid.uuid4()
+        self.index.update(
+            [
+                self.doc("horse horse", common),
+                self.doc("okapi horse", rare),
+                self.doc("horse field"),
+                self.doc("horse barn"),
+            ]
+        )
+        hits = self.index.search("okapi horse")
+        self.assertEqual(hits[0][0], rare)
+
+    def test_update_replaces_documents(self):
+        doc_id = uuid.uuid4()
+        self.index.update([self.doc("zebra", doc_id)])
+        self.index.update([self.doc("okapi", doc_id)])
+        self.assertEqual(self.index.search("zebra"), [])
+        self.assertEqual([d for d, _ in self.index.search("okapi")], [doc_id])
+        self.assertEqual(self.index.doc_count, 1)
+        # The first segment only held the replaced document.
+        self.assertEqual(len(self.manifest()["segments"]), 1)
+        self.assertEqual(len(self.segment_files()), 1)
+
+    def test_delete(self):
+        kept, gone = uuid.uuid4(), uuid.uuid4()
+        self.index.update([self.doc("zebra", kept), self.doc("zebra", gone)])
+        self.index.delete([gone])
+        self.assertEqual([d for d, _ in self.index.search("zebra")], [kept])
+        (entry,) = self.manifest()["segments"]
+        self.assertEqual(entry["deleted"], [1])
+        self.assertEqual(self.index.doc_count, 1)
+
+        self.index.delete([kept])
+        self.assertEqual(self.manifest()["segments"], [])
+        self.assertEqual(self.segment_files(), [])
+        self.assertEqual(self.index.search("zebra"), [])
+
+    def test_merge_past_max_segments(self):
+        ids = [uuid.uuid4() for _ in range(5)]
+        self.index.update(
+            [self.doc("zebra", ids[0]), self.doc("zebra", ids[1])]
+        )
+        for doc_id in ids[2:4]:
+            self.index.update([self.doc("zebra stripes", doc_id)])
+        self.index.delete(ids[:1])
+        self.assertEqual(len(self.manifest()["segments"]), 3)
+        self.index.update([self.doc("zebra", ids[4])])
+
+        (entry,) = self.manifest()["segments"]
+        self.assertEqual(len(self.segment_files()), 1)
+        # Merging drops deleted documents for good.
+        self.assertEqual((entry["docs"], entry["deleted"]), (4, []))
+        found = {doc_id for doc_id, _ in self.index.search("zebra")}
+        self.assertEqual(found, set(ids[1:]))
+        self.assertEqual(self.index.doc_count, 4)
+
+    def test_replace(self):
+        old = uuid.uuid4()
+        self.index.update([self.doc("zebra", old)])
+        fresh = [uuid.uuid4(), uuid.uuid4()]
+        paths = [self.index.new_segment_path() for _ in range(3)]
+        write_segment(paths[0], [self.doc("zebra", fresh[0])])
+        write_segment(paths[1], [self.doc("zebra okapi", fresh[1])])
+        write_segment(paths[2], [])
+        self.index.replace(paths)
+
+        self.assertEqual(
+            {doc_id for doc_id, _ in self.index.search("zebra")}, set(fresh)
+        )
+        self.assertEqual(len(self.manifest()["segments"]), 2)
+        self.assertEqual(len(self.segment_files()), 2)
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+    def test_other_handles_see_new_manifest(self):
+        reader = InvertedIndex(self.directory)
+        self.assertEqual(reader.search("zebra"), [])
+        doc_id = uuid.uuid4()
+        self.index.update([self.doc("zebra", doc_id)])
+        self.assertEqual([d for d, _ in reader.search("zebra")], [doc_id])
+
+
+# Keeps the on-commit hooks run here out of the shared search indexes
+@override_settings(SEARCH_INDEX_AUTOUPDATE=False)
+class VectorIndexTests(SimpleTestCase):
+    """LSH recall, growth, deletes and catching up between workers."""
+
+    TOPICS = {
+        "animals": "zebra okapi giraffe horse stripes savanna herd hooves",
+        "cars": "engine wheel brake gearbox fuel piston clutch exhaust",
+        "cooking": "flour butter oven recipe sugar whisk dough simmer",
+    }
+    FEATURES = 1024
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        self.rng = random.Random(3)
+        self.topics = {}
+        documents = [
+            self.document(topic) for topic in self.TOPICS for _ in range(10)
+        ]
+        counts = [hash_terms(terms, self.FEATURES) for _, terms in documents]
+        doc_freq = np.zeros(self.FEATURES, dtype=np.int64)
+        for row in counts:
+            doc_freq[list(row)] += 1
+        model = EmbeddingModel.fit(
+            counts,
+            doc_freq,
+            len(counts),
+            dim=8,
+            tables=4,
+            bits=bits_for(len(counts)),
+        )
+        self.index = VectorIndex(self.directory)
+        self.index.publish(
+            model,
+            [pk for pk, _ in documents],
+            model.embed([terms for _, terms in documents]),
+        )
+
+    def document(self, topic):
+        pk = uuid.uuid4()
+        self.topics[pk] = topic
+        words = self.TOPICS[topic].split()
+        return pk, [self.rng.choice(words) for _ in range(12)]
+
+    def meta(self):
+        with open(
+            os.path.join(self.directory, self.index._current(), META)
+        ) as fh:
+            return json.load(fh)
+
+    def assertRelated(self, index, pk, limit=5):
+        results = index.related(pk, limit)
+        self.assertEqual(len(results), limit)
+        self.assertEqual(
+            {self.topics[found] for found, _ in results}, {self.topics[pk]}
+        )
+        return results
+
+    def test_related_and_search(self):
+        for pk in list(self.topics)[:6]:
+            self.assertRelated(self.index, pk)
+        results = self.index.search("okapi and zebra herds", limit=10)
+        self.assertEqual(len(results), 10)
+        self.assertEqual({self.topics[pk] for pk, _ in results}, {"animals"})
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(self.index.search("unrelated words"), [])
+
+    def test_growth_deletes_and_reuse(self):
+        added = [self.document("cars") for _ in range(1100)]
+        self.index.update(added)
+        meta = self.meta()
+        self.assertEqual((meta["count"], meta["capacity"]), (1130, 2048))
+        self.assertRelated(self.index, added[-1][0])
+
+        gone = [pk for pk, _ in added[:20]]
+        self.index.delete(gone)
+        self.assertEqual(len(self.meta()["free"]), 20)
+        for pk, _ in self.index.related(added[-1][0], limit=50):
+            self.assertNotIn(pk, gone)
+        self.assertEqual(self.index.related(gone[0]), [])
+
+        new = [self.document("cooking") for _ in range(20)]
+        self.index.update(new)
+        meta = self.meta()
+        self.assertEqual((meta["count"], meta["free"]), (1130, []))
+        self.assertRelated(self.index, new[0][0])
+
+    def test_other_workers_catch_up(self):
+        other = VectorIndex(self.directory)
+        first = next(iter(self.topics))
+        self.assertRelated(other, first)
+
+        # Within the journal, and then past it
+        for count in (10, JOURNAL_SIZE + 10):
+            with self.subTest(writes=count):
+                added = [self.document("cooking") for _ in range(count)]
+                self.index.update(added)
+                self.index.delete([first])
+                self.assertEqual(other.related(first), [])
+                self.assertRelated(other, added[0][0])
+                results = other.search(
+                    "whisk the dough", limit=len(self.topics)
+                )
+                found = {pk for pk, _ in results}
+                self.assertGreater(
+                    len(found & {pk for pk, _ in added}), count * 0.9
+                )
+                first = added[0][0]
+
+
+class SuggestTests(TestCase):
+    """Typeahead matching and syncing between workers."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        self.index = SuggestIndex(self.directory)
+        patcher = patch("wiki.models.get_suggest_index", lambda: self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user(
+            username="writer", email="writer@example.com", password="x"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.zebra = Article.objects.create(
+                title="Zebra crossing", author=self.user
+            )
+            self.okapi = Article.objects.create(
+                title="Okapi facts", tags=["mammals"], author=self.user
+            )
+            self.animals = Category.objects.create(name="Animals")
+            self.horses = Category.objects.create(
+                name="Horses", parent=self.animals
+            )
+
+    def texts(self, query, index=None, **kwargs):
+        results = (index or self.index).suggest(query, **kwargs)
+        return [suggestion.text for _, suggestion in results]
+
+    def test_prefix_matches(self):
+        self.assertEqual(self.texts("zeb"), ["Zebra crossing"])
+        self.assertEqual(self.texts("Cross"), ["Zebra crossing"])
+        self.assertEqual(self.texts("ho", kinds={"category"}), ["Horses"])
+        self.assertEqual(self.texts("ho", kinds={"article"}), [])
+        # Whole-title prefixes outrank later words.
+        with self.captureOnCommitCallbacks(execute=True):
+            Article.objects.create(title="Crossword", author=self.user)
+        self.assertEqual(self.texts("cross"), ["Crossword", "Zebra crossing"])
+
+    def test_typos(self):
+        self.assertEqual(self.texts("okapy"), ["Okapi facts"])
+        self.assertEqual(self.texts("mamals")[0], "mammals")
+        self.assertEqual(self.texts("hroses"), ["Horses"])
+        self.assertEqual(self.texts("xylophone"), [])
+
+    def test_other_workers_apply_changes_and_deletions(self):
+        other = SuggestIndex(self.directory)
+        self.assertEqual(self.texts("zeb", other), ["Zebra crossing"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.zebra.title = "Quagga crossing"
+            self.zebra.save()
+        self.assertEqual(self.texts("zeb", other), [])
+        self.assertEqual(self.texts("quag", other), ["Quagga crossing"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.okapi.delete()
+            self.animals.delete()
+        for index in (self.index, other):
+            self.assertEqual(self.texts("oka", index), [])
+            self.assertEqual(self.texts("mamm", index), [])
+            self.assertEqual(self.texts("ho", index), [])
+            self.assertEqual(self.texts("ani", index), [])
+        # Deletions were replayed, not reloaded.
+        self.assertEqual(self.index._read_stamp()[1], 0)
+
+    def test_only_suggested_fields_bump_the_stamp(self):
+        stamp = self.index._read_stamp()
+        article = Article.objects.get(pk=self.okapi.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            article.save()
+            article.current_content = "The okapi lives in the forest."
+            article.save()
+            Revision.objects.create(
+                article=article,
+                title="Okapi facts",
+                content="Okapis are shy.",
+                tags=["mammals"],
+                editor=self.user,
+            )
+        self.assertEqual(self.index._read_stamp(), stamp)
+        with self.captureOnCommitCallbacks(execute=True):
+            article.tags.append("forest")
+            article.save()
+        self.assertEqual(self.index._read_stamp()[0], stamp[0] + 1)
+        self.assertEqual(self.texts("fores"), ["forest"])
+
+    def test_long_journal_forces_a_reload(self):
+        other = SuggestIndex(self.directory)
+        self.assertEqual(self.texts("oka", other), ["Okapi facts"])
+        with patch("wiki.search.suggest.MAX_JOURNAL_BYTES", 100):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.zebra.delete()
+                self.okapi.delete()
+                self.horses.delete()
+        self.assertEqual(self.index._read_stamp()[1], 1)
+        self.assertEqual(
+            os.path.getsize(os.path.join(self.directory, JOURNAL)), 0
+        )
+        self.assertEqual(self.texts("a", other), ["Animals"])
+
+
+class CategoryTreeTests(TestCase):
+    """Closure rows, breadcrumbs and subtree counts follow the tree."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="writer", email="writer@example.com", password="x"
+        )
+
+    def setUp(self):
+        self.animals = Category.objects.create(name="Animals")
+        self.mammals = Category.objects.create(
+            name="Mammals", parent=self.animals
+        )
+        self.horses = Category.objects.create(
+            name="Horses", parent=self.mammals
+        )
+        self.places = Category.objects.create(name="Places")
+        self.zebras = Article.objects.create(
+            title="Zebras",
+            category=self.horses,
+            status=Article.Status.PUBLISHED,
+            author=self.user,
+        )
+
+    def closure(self):
+        return set(
+            CategoryClosure.objects.values_list(
+                "ancestor__name", "descendant__name", "depth"
+            )
+        )
+
+    def crumbs(self, category):
+        category.refresh_from_db()
+        return [crumb["name"] for crumb in category.breadcrumbs]
+
+    def counts(self):
+        return dict(
+            Category.objects.values_list("name", "subtree_published_count")
+        )
+
+    def subtree(self, category):
+        response = APIClient().get(
+            "/api/wiki/articles/", {"category__subtree": category.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [article["title"] for article in response.data["results"]]
+
+    def test_insert(self):
+        self.assertEqual(
+            self.closure(),
+            {
+                ("Animals", "Animals", 0),
+                ("Mammals", "Mammals", 0),
+                ("Horses", "Horses", 0),
+                ("Places", "Places", 0),
+                ("Animals", "Mammals", 1),
+                ("Mammals", "Horses", 1),
+                ("Animals", "Horses", 2),
+            },
+        )
+        self.assertEqual(
+            self.crumbs(self.horses), ["Animals", "Mammals", "Horses"]
+        )
+        self.assertEqual(
+            self.counts(),
+            {"Animals": 1, "Mammals": 1, "Horses": 1, "Places": 0},
+        )
+        self.assertEqual(self.subtree(self.animals), ["Zebras"])
+        self.assertEqual(self.subtree(self.places), [])
+
+    def test_move(self):
+        self.mammals.parent = self.places
+        self.mammals.save()
+        self.assertEqual(
+            self.closure(),
+            {
+                ("Animals", "Animals", 0),
+                ("Mammals", "Mammals", 0),
+                ("Horses", "Horses", 0),
+                ("Places", "Places", 0),
+                ("Places", "Mammals", 1),
+                ("Mammals", "Horses", 1),
+                ("Places", "Horses", 2),
+            },
+        )
+        self.assertEqual(
+            self.crumbs(self.horses), ["Places", "Mammals", "Horses"]
+        )
+        self.assertEqual(
+            self.counts(),
+            {"Animals": 0, "Mammals": 1, "Horses": 1, "Places": 1},
+        )
+        self.assertEqual(self.subtree(self.animals), [])
+        self.assertEqual(self.subtree(self.places), ["Zebras"])
+
+        self.places.name = "Habitats"
+        self.places.save()
+        self.assertEqual(
+            self.crumbs(self.horses), ["Habitats", "Mammals", "Horses"]
+        )
+
+    def test_move_below_itself(self):
+        for parent in (self.horses, self.animals):
+            with self.subTest(parent=parent.name):
+                self.animals.parent = parent
+                with self.assertRaises(ValidationError):
+                    self.animals.save()
+                with self.assertRaises(ValidationError):
+                    self.animals.full_clean()
+        self.assertEqual(len(self.closure()), 7)
+        self.animals.refresh_from_db()
+        self.assertIsNone(self.animals.parent_id)
+
+    def test_delete(self):
+        self.mammals.delete()
+        self.assertEqual(
+            self.closure(),
+            {("Animals", "Animals", 0), ("Places", "Places", 0)},
+        )
+        self.assertEqual(self.counts(), {"Animals": 0, "Places": 0})
+        self.zebras.refresh_from_db()
+        self.assertIsNone(self.zebras.category_id)
+        self.assertEqual(self.subtree(self.animals), [])
+
+
+class PercolatorTests(SimpleTestCase):
+    """Saved queries match documents containing all of their terms."""
+
+    def test_match(self):
+        percolator = Percolator(
+            [
+                ("both", ["okapi", "forest"]),
+                ("okapi", ["okapi"]),
+                ("zebra", ["zebra", "okapi"]),
+                ("empty", []),
+            ]
+        )
+        self.assertEqual(len(percolator), 3)
+        self.assertEqual(
+            sorted(percolator.match({"the", "okapi", "forest"})),
+            ["both", "okapi"],
+        )
+        self.assertEqual(percolator.match(["forest"]), [])
+        # Many more document terms than anchors scans the anchors.
+        terms = {f"word{n}" for n in range(100)} | {"zebra", "okapi"}
+        self.assertEqual(sorted(percolator.match(terms)), ["okapi", "zebra"])
+
+    def test_rarest_term_anchors_a_query(self):
+        frequency = {"okapi": 3, "forest": 90}.get
+        percolator = Percolator([("both", ["okapi", "forest"])], frequency)
+        self.assertEqual(list(percolator._anchors), ["okapi"])
+        # Without frequencies the longest term is taken.
+        percolator = Percolator([("both", ["okapi", "forest"])])
+        self.assertEqual(list(percolator._anchors), ["forest"])
+
+
+class PercolateCommandTests(TestCase):
+    """The percolate command turns matching revisions into alerts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.editor, cls.reader, cls.other = [
+            User.objects.create_user(
+                username=name, email=f"{name}@example.com", password="x"
+            )
+            for name in ("editor", "reader", "other")
+        ]
+        cls.searches = {
+            user.username: SavedSearch.objects.create(user=user, query=query)
+            for user, query in [
+                (cls.editor, "okapi"),
+                (cls.reader, "Okapi forest"),
+                (cls.other, "zebra"),
+            ]
+        }
+
+    def article(self, title="Okapis", status=Article.Status.PUBLISHED):
+        return Article.objects.create(
+            title=title, status=status, author=self.editor
+        )
+
+    def revise(self, article, content, editor=None):
+        return Revision.objects.create(
+            article=article,
+            title=article.title,
+            content=content,
+            editor=editor or self.editor,
+        )
+
+    def percolate(self):
+        call_command("percolate", stdout=StringIO())
+        self.assertFalse(Revision.objects.filter(percolated=False).exists())
+
+    def alerts(self):
+        return sorted(
+            SearchAlert.objects.values_list(
+                "saved_search__user__username", "revision_id"
+            )
+        )
+
+    def test_alerts(self):
+        revision = self.revise(
+            self.article(), "The okapi lives in the forest."
+        )
+        self.revise(self.article("Zebras"), "Zebras on the savanna.")
+        self.percolate()
+        # Nobody is alerted about their own edits.
+        self.assertEqual(self.alerts(), [("reader", revision.pk)])
+
+    def test_one_unread_alert_per_article(self):
+        article = self.article()
+        first = self.revise(article, "An okapi in the forest.")
+        self.percolate()
+        self.revise(article, "Two okapis in the forest.")
+        self.percolate()
+        self.assertEqual(self.alerts(), [("reader", first.pk)])
+        SearchAlert.objects.update(is_read=True)
+        self.revise(article, "An okapi left the forest.")
+        last = self.revise(article, "The okapi came back to the forest.")
+        self.percolate()
+        self.assertEqual(
+            self.alerts(),
+            sorted([("reader", first.pk), ("reader", last.pk)]),
+        )
+
+    def test_drafts_are_matched_on_publish(self):
+        article = self.article(status=Article.Status.DRAFT)
+        self.revise(article, "A draft about an okapi.")
+        revision = self.revise(article, "The okapi lives in the forest.")
+        self.percolate()
+        self.assertEqual(self.alerts(), [])
+
+        article = Article.objects.get(pk=article.pk)
+        article.title = "Okapis (draft)"
+        article.save()
+        self.assertFalse(Revision.objects.filter(percolated=False).exists())
+        article.status = Article.Status.PUBLISHED
+        article.save()
+        self.percolate()
+        self.assertEqual(self.alerts(), [("reader", revision.pk)])
+        article.save()
+        self.assertFalse(Revision.objects.filter(percolated=False).exists())
+
+
+class SectionOrderTests(TestCase):
+    """Placing sections with after/before and reordering siblings."""
+
+    url = "/api/wiki/sections/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="writer", email="writer@example.com", password="x"
+        )
+        cls.article = Article.objects.create(title="Zebras", author=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, title, **data):
+        response = self.client.post(
+            self.url,
+            {
+                "article": str(self.article.pk),
+                "title": title,
+                "content": "Text",
+                **data,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return Section.objects.get(pk=response.data["id"])
+
+    def titles(self, parent=None):
+        return list(
+            Section.objects.filter(article=self.article, parent=parent)
+            .order_by("rank")
+            .values_list("title", flat=True)
+        )
+
+    def reorder(self, sections):
+        return self.client.post(
+            f"{self.url}reorder/",
+            {"sections": [str(section.pk) for section in sections]},
+            format="json",
+        )
+
+    def test_after_and_before(self):
+        first = self.create("First")
+        last = self.create("Last")
+        self.create("Middle", after=str(first.pk))
+        self.create("Start", before=str(first.pk))
+        self.assertEqual(self.titles(), ["Start", "First", "Middle", "Last"])
+        numbers = dict(
+            Section.objects.values_list("title", "number").order_by()
+        )
+        self.assertEqual(numbers["Middle"], "3")
+
+        response = self.client.patch(
+            f"{self.url}{last.pk}/", {"before": str(first.pk)}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.titles(), ["Start", "Last", "First", "Middle"])
+
+        response = self.client.post(
+            self.url,
+            {
+                "article": str(self.article.pk),
+                "title": "Both",
+                "content": "Text",
+                "after": str(first.pk),
+                "before": str(last.pk),
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_repeated_inserts_at_one_spot(self):
+        first = self.create("First")
+        self.create("Second")
+        previous = first
+        for position in range(80):
+            previous = self.create(f"Inserted {position}", after=previous.pk)
+        titles = self.titles()
+        self.assertEqual(titles[0], "First")
+        self.assertEqual(titles[-1], "Second")
+        self.assertEqual(
+            titles[1:-1], [f"Inserted {position}" for position in range(80)]
+        )
+        ranks = Section.objects.values_list("rank", flat=True)
+        self.assertTrue(all(len(rank) <= Section.RANK_WIDTH for rank in ranks))
+
+    def test_reorder(self):
+        a, b, c = self.create("A"), self.create("B"), self.create("C")
+        response = self.reorder([c, a, b])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.titles(), ["C", "A", "B"])
+        numbers = {
+            item["title"]: item["section_number"] for item in response.data
+        }
+        self.assertEqual(numbers, {"C": "1", "A": "2", "B": "3"})
+
+    def test_reorder_rejects_partial_duplicate_and_mixed_lists(self):
+        a, b = self.create("A"), self.create("B")
+        child = self.create("Child", parent=str(a.pk))
+        for sections in ([a], [a, b, a], [a, child], []):
+            response = self.reorder(sections)
+            self.assertEqual(response.status_code, 400, sections)
+        response = self.client.post(
+            f"{self.url}reorder/", {"sections": ["nope"]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.titles(), ["A", "B"])
+
+    def test_move_to_another_article(self):
+        moved, kept = self.create("Moved"), self.create("Kept")
+        child = self.create("Child", parent=str(moved.pk))
+        other = Article.objects.create(title="Okapis", author=self.user)
+        Section.objects.create(article=other, title="Existing")
+
+        response = self.client.patch(
+            f"{self.url}{moved.pk}/", {"article": str(other.pk)}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        outline = {
+            section.title: (section.article_id, section.number, section.rank)
+            for section in Section.objects.all()
+        }
+        self.assertEqual(
+            {title: place[:2] for title, place in outline.items()},
+            {
+                "Kept": (self.article.pk, "1"),
+                "Existing": (other.pk, "1"),
+                "Moved": (other.pk, "2"),
+                "Child": (other.pk, "2.1"),
+            },
+        )
+        self.assertNotEqual(outline["Moved"][2], outline["Existing"][2])
+        child.refresh_from_db()
+        self.assertEqual(child.parent_id, moved.pk)
+        self.article.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(
+            (self.article.section_count, other.section_count), (1, 3)
+        )
+
+        # Back before the kept section; a parent elsewhere is refused.
+        response = self.client.patch(
+            f"{self.url}{moved.pk}/",
+            {"article": str(self.article.pk), "before": str(kept.pk)},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.titles(), ["Moved", "Kept"])
+        self.assertEqual(self.titles(parent=moved), ["Child"])
+        response = self.client.patch(
+            f"{self.url}{kept.pk}/",
+            {"article": str(other.pk), "parent": str(moved.pk)},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        kept.article = other
+        kept.parent = moved
+        with self.assertRaises(ValidationError):
+            kept.save()
+
+    def test_outline(self):
+        def outline(sections):
+            return [
+                (section.number, section.title, outline(section.children))
+                for section in sections
+            ]
+
+        intro = self.create("Intro")
+        body = self.create("Body")
+        first = self.create("First", parent=str(body.pk))
+        self.create("Detail", parent=str(first.pk))
+        self.create("Second", parent=str(body.pk))
+        self.create("Outro")
+        self.create("Zeroth", parent=str(body.pk), before=str(first.pk))
+        with self.assertNumQueries(1):
+            sections = self.article.get_outline()
+        self.assertEqual(
+            outline(sections),
+            [
+                ("1", "Intro", []),
+                (
+                    "2",
+                    "Body",
+                    [
+                        ("2.1", "Zeroth", []),
+                        ("2.2", "First", [("2.2.1", "Detail", [])]),
+                        ("2.3", "Second", []),
+                    ],
+                ),
+                ("3", "Outro", []),
+            ],
+        )
+
+        # Removing and reordering sections renumbers the rest.
+        intro.delete()
+        self.reorder([body, self.article.sections.get(title="Outro")])
+        self.reorder(list(body.subsections.order_by("-rank")))
+        response = self.client.get(
+            f"/api/wiki/articles/{self.article.slug}/outline/"
+        )
+        self.assertEqual(response.status_code, 200)
+
+        def numbers(items):
+            return [
+                (item["number"], item["level"], numbers(item["children"]))
+                for item in items
+            ]
+
+        self.assertEqual(
+            numbers(response.data),
+            [
+                (
+                    "1",
+                    0,
+                    [
+                        ("1.1", 1, []),
+                        ("1.2", 1, [("1.2.1", 2, [])]),
+                        ("1.3", 1, []),
+                    ],
+                ),
+                ("2", 0, []),
+            ],
+        )
+        self.assertEqual(
+            [item["title"] for item in response.data[0]["children"]],
+            ["Second", "First", "Zeroth"],
+        )
+
+
+class RevisionStorageTests(TestCase):
+    """Revision texts stored as delta chains survive edits and deletes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.editor = User.objects.create_user(
+            username="editor", email="editor@example.com", password="x"
+        )
+        cls.other = User.objects.create_user(
+            username="other", email="other@example.com", password="x"
+        )
+
+    def setUp(self):
+        get_text_cache().clear()
+        self.addCleanup(get_text_cache().clear)
+        self.article = Article.objects.create(
+            title="Zebras", author=self.other
+        )
+
+    def body(self, version, lines=50):
+        return "".join(
+            f"Line {line} of version {version if line == version else 0}\n"
+            for line in range(lines)
+        )
+
+    def revise(self, version, editor=None, article=None):
+        return Revision.objects.create(
+            article=article or self.article,
+            title="Zebras",
+            content=self.body(version),
+            editor=editor or self.editor,
+        )
+
+    def assertTexts(self, versions):
+        get_text_cache().clear()
+        for revision in Revision.objects.filter(article=self.article):
+            self.assertEqual(
+                revision.content, self.body(versions[revision.version_number])
+            )
+
+    def depths(self):
+        return list(
+            Revision.objects.filter(article=self.article)
+            .order_by("version_number")
+            .values_list("delta_depth", flat=True)
+        )
+
+    @override_settings(REVISION_KEYFRAME_INTERVAL=4)
+    def test_keyframes(self):
+        for version in range(1, 10):
+            self.revise(version)
+        self.assertEqual(self.depths(), [0, 1, 2, 3, 0, 1, 2, 3, 0])
+        revision = Revision.objects.get(version_number=2)
+        self.assertEqual(revision.delta_base.version_number, 1)
+        self.assertLess(len(revision.content_data), len(self.body(2)) / 2)
+
+        # A rewrite would not be much smaller as a delta.
+        rewrite = "Zebras are African equines.\n" * 20
+        Revision.objects.create(
+            article=self.article,
+            title="Zebras",
+            content=rewrite,
+            editor=self.editor,
+        )
+        self.assertEqual(self.depths()[-1], 0)
+        get_text_cache().clear()
+        self.assertEqual(
+            Revision.objects.get(version_number=10).content, rewrite
+        )
+        revision = Revision.objects.get(version_number=8)
+        self.assertEqual(revision.content, self.body(8))
+
+    def test_chains_are_fetched_together(self):
+        revisions = [self.revise(version) for version in range(1, 7)]
+        self.assertEqual(self.depths(), [0, 1, 2, 3, 4, 5])
+        get_text_cache().clear()
+        # The revision, then its whole chain at once
+        with self.assertNumQueries(2):
+            texts = load_texts([revisions[-1].pk])
+        self.assertEqual(texts, {revisions[-1].pk: self.body(6)})
+        with self.assertNumQueries(0):
+            load_texts([revisions[-1].pk, revisions[2].pk])
+
+        get_text_cache().clear()
+        with self.assertNumQueries(1):
+            texts = load_texts([revision.pk for revision in revisions])
+        self.assertEqual(
+            texts,
+            {
+                revision.pk: self.body(n)
+                for n, revision in enumerate(revisions, 1)
+            },
+        )
+
+    def test_compress_revisions_round_trip(self):
+        for version in range(1, 6):
+            self.revise(version)
+        out = StringIO()
+        call_command("compress_revisions", "--expand", stdout=out)
+        self.assertEqual(out.getvalue(), "Rewrote 4 of 5 revisions.\n")
+        self.assertEqual(self.depths(), [0, 0, 0, 0, 0])
+        self.assertFalse(
+            Revision.objects.filter(delta_base__isnull=False).exists()
+        )
+        self.assertTexts({version: version for version in range(1, 6)})
+
+        out = StringIO()
+        call_command("compress_revisions", "--batch-size", "2", stdout=out)
+        self.assertEqual(out.getvalue(), "Rewrote 4 of 5 revisions.\n")
+        self.assertEqual(self.depths(), [0, 1, 2, 3, 4])
+        self.assertTexts({version: version for version in range(1, 6)})
+
+        out = StringIO()
+        call_command("compress_revisions", stdout=out)
+        self.assertEqual(out.getvalue(), "Rewrote 0 of 5 revisions.\n")
+
+    def test_deleting_a_user_keeps_other_revisions(self):
+        self.revise(1, self.other)
+        self.revise(2, self.editor)
+        third = self.revise(3, self.other)
+        self.assertIsNotNone(third.delta_base_id)
+
+        self.editor.delete()
+        self.assertEqual(
+            sorted(Revision.objects.values_list("version_number", flat=True)),
+            [1, 3],
+        )
+        self.assertTexts({1: 1, 3: 3})
+
+    def test_queryset_delete(self):
+        for version in range(1, 6):
+            self.revise(version)
+        Revision.objects.filter(version_number__in=[2, 4]).delete()
+        self.assertTexts({1: 1, 3: 3, 5: 5})
+
+    def test_instance_delete(self):
+        for version in range(1, 4):
+            self.revise(version)
+        Revision.objects.get(version_number=2).delete()
+        self.assertTexts({1: 1, 3: 3})
+
+    def test_deleting_the_article_deletes_its_history(self):
+        for version in range(1, 4):
+            self.revise(version)
+        self.article.delete()
+        self.assertFalse(Revision.objects.exists())
+
+    def test_texts_cannot_be_changed(self):
+        first = self.revise(1)
+        self.revise(2)
+        first.content = self.body(5)
+        with self.assertRaises(ValueError):
+            first.save()
+
+        first = Revision.objects.get(pk=first.pk)
+        first.summary = "Stripes"
+        first.save()
+        self.assertTexts({1: 1, 2: 2})
+
+        client = APIClient()
+        client.force_authenticate(self.editor)
+        url = f"/api/wiki/revisions/{first.pk}/"
+        response = client.patch(url, {"content": self.body(5)}, format="json")
+        self.assertEqual(response.status_code, 400)
+        response = client.patch(
+            url,
+            {"content": self.body(1), "change_message": "Typo"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTexts({1: 1, 2: 2})
+        form = RevisionAdminForm(instance=first)
+        self.assertTrue(form.fields["content"].disabled)
+
+    def test_cached_bases_survive_evictions(self):
+        other = Article.objects.create(title="Okapis", author=self.other)
+        for version in range(1, 5):
+            self.revise(version)
+            self.revise(version, article=other)
+        pks = [
+            Revision.objects.get(article=article, version_number=4).pk
+            for article in (self.article, other)
+        ]
+        for first, second in (pks, pks[::-1]):
+            # Room for two texts, so rebuilding the second chain evicts
+            # the cached base of the first.
+            cache = LRUCache(2 * len(self.body(0)))
+            base = Revision.objects.get(delta_dependents__pk=first)
+            cache.set(base.pk, self.body(3))
+            with patch("wiki.revisions.get_text_cache", lambda: cache):
+                texts = load_texts([first, second])
+            self.assertEqual(texts, {pk: self.body(4) for pk in pks})
+
+
+class StubBackend:
+    """Finds the articles with the given titles; unavailable without."""
+
+    def __init__(self, *titles):
+        self.titles = titles
+
+    def search(self, queryset, query):
+        if not self.titles:
+            raise SearchUnavailable("Not built.")
+        return queryset.filter(title__in=self.titles)
+
+
+class SearchFallbackTests(TestCase):
+    """Searches never rely on icontains over compressed columns."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="writer", email="writer@example.com", password="x"
+        )
+        long_body = "The okapi lives in the forest.\n" * 100
+        for title, summary, body in [
+            ("Okapi facts", "", "Short."),
+            ("Zebras", "Cousins of okapis", "Short."),
+            ("Giraffes", "", "The okapi is a relative."),
+            ("Horses", "", long_body),
+        ]:
+            article = Article.objects.create(
+                title=title,
+                current_summary=summary,
+                current_content=body,
+                author=cls.user,
+            )
+            Section.objects.create(
+                article=article, title="Intro", content=body
+            )
+        cls.request = RequestFactory().get("/admin/")
+
+    def titles(self, queryset, field="title"):
+        return sorted(queryset.values_list(field, flat=True))
+
+    def test_api_falls_back_to_titles_and_summaries(self):
+        with patch("wiki.search.filters.get_search_backend", StubBackend):
+            response = APIClient().get(
+                "/api/wiki/articles/", {"search": "okapi", "fields": "title"}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(article["title"] for article in response.data["results"]),
+            ["Okapi facts", "Zebras"],
+        )
+
+    def test_article_admin(self):
+        model_admin = admin.site._registry[Article]
+        queryset = Article.objects.all()
+        for backend, expected in [
+            (StubBackend("Horses"), ["Horses"]),
+            (StubBackend(), ["Okapi facts"]),
+        ]:
+            with patch("wiki.admin.get_search_backend", lambda: backend):
+                results, _ = model_admin.get_search_results(
+                    self.request, queryset, "okapi"
+                )
+            self.assertEqual(self.titles(results), expected)
+
+    def test_section_admin(self):
+        model_admin = admin.site._registry[Section]
+        queryset = Section.objects.all()
+        for backend, expected in [
+            (StubBackend("Horses"), ["Horses", "Okapi facts"]),
+            (StubBackend(), ["Okapi facts"]),
+        ]:
+            with patch("wiki.admin.get_search_backend", lambda: backend):
+                results, _ = model_admin.get_search_results(
+                    self.request, queryset, "okapi"
+                )
+            self.assertEqual(self.titles(results, "article__title"), expected)
+        results, _ = model_admin.get_search_results(
+            self.request, queryset, " "
+        )
+        self.assertEqual(results.count(), 4)
+
+
+class ViewTrackingTests(TestCase):
+    """Buffered views reach the database in one write per flush."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x"
+        )
+        cls.zebras, cls.okapis = [
+            Article.objects.create(title=title, author=cls.user)
+            for title in ("Zebras", "Okapis")
+        ]
+
+    def setUp(self):
+        # No flusher thread or exit hook outlives a test.
+        self.registered = []
+        for target, replacement in [
+            ("wiki.tracking.atexit.register", self.registered.append),
+            ("wiki.tracking.threading.Thread", MagicMock()),
+        ]:
+            patcher = patch(target, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def record_views(self, buffer):
+        buffer.record(self.zebras.pk, user_id=self.user.pk)
+        buffer.record(self.zebras.pk, user_id=self.user.pk)
+        buffer.record(self.zebras.pk, ip_address="10.0.0.1", user_agent="X")
+        buffer.record(self.okapis.pk, session_key="abc")
+        # Deleted before the flush
+        buffer.record(uuid.uuid4())
+
+    def assertFlushed(self):
+        counts = dict(Article.objects.values_list("title", "view_count"))
+        self.assertEqual(counts, {"Zebras": 3, "Okapis": 1})
+        self.assertEqual(ArticleView.objects.count(), 4)
+        now = seconds(timezone.now())
+        for article, views in ((self.zebras, 3), (self.okapis, 1)):
+            article.refresh_from_db()
+            # Log of the views, decayed by the few moments since
+            self.assertAlmostEqual(
+                article.trending_score, math.log(views), places=3
+            )
+            self.assertAlmostEqual(article.trending_at, now, delta=5)
+
+    def test_flush(self):
+        buffer = ViewBuffer(flush_interval=60, max_size=100)
+        self.record_views(buffer)
+        self.assertEqual(ArticleView.objects.count(), 0)
+        self.assertEqual(buffer.flush(), 5)
+        self.assertFlushed()
+        self.assertEqual(buffer.flush(), 0)
+        response = APIClient().get(
+            f"/api/wiki/articles/{self.zebras.slug}/unique_viewers/"
+        )
+        self.assertEqual(response.data["unique_viewers"], 2)
+
+    def test_full_buffer_flushes_inline(self):
+        buffer = ViewBuffer(flush_interval=60, max_size=2)
+        buffer.record(self.zebras.pk)
+        self.assertEqual(ArticleView.objects.count(), 0)
+        buffer.record(self.okapis.pk)
+        self.assertEqual(ArticleView.objects.count(), 2)
+        self.assertEqual(buffer._views, [])
+
+    def test_flush_at_exit(self):
+        buffer = ViewBuffer(flush_interval=60, max_size=100)
+        self.record_views(buffer)
+        self.assertEqual(self.registered, [buffer.flush])
+        self.assertEqual(ArticleView.objects.count(), 0)
+        self.registered[0]()
+        self.assertFlushed()
+
+    def test_unbuffered(self):
+        buffer = ViewBuffer(flush_interval=0)
+        self.record_views(buffer)
+        self.assertEqual(self.registered, [])
+        self.assertFlushed()
+
+
+class DatabaseSearchTests(TestCase):
+    """Full-text search in the database: FTS5 on SQLite, tsvector on PG."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="writer", email="writer@example.com", password="x"
+        )
+        cls.articles = {
+            title: Article.objects.create(
+                title=title,
+                current_summary=summary,
+                current_content=content,
+                author=cls.user,
+            )
+            for title, summary, content in [
+                ("Forest life", "", "An okapi was seen. " * 100),
+                ("Okapi facts", "", "Short."),
+                ("Zebras", "Cousins of okapis and okapi", "Stripes."),
+                ("Horses", "", "Hooves and manes."),
+            ]
+        }
+
+    def setUp(self):
+        self.backend = DatabaseSearchBackend()
+        if connection.vendor == "sqlite":
+            # Articles are indexed after commit, which tests never reach.
+            self.backend.rebuild()
+
+    def titles(self, query):
+        return [
+            article.title
+            for article in self.backend.search(Article.objects.all(), query)
+        ]
+
+    @skipUnless(connection.vendor == "sqlite", "FTS5 is SQLite-only")
+    def test_fts5_ranks_title_then_summary_then_content(self):
+        self.assertEqual(
+            self.titles("okapi"), ["Okapi facts", "Zebras", "Forest life"]
+        )
+        results = self.backend.search(Article.objects.all(), "okapi")
+        self.assertEqual(
+            [article.search_rank for article in results], [0, 1, 2]
+        )
+        # Terms are quoted, never parsed as FTS5 syntax.
+        self.assertEqual(self.titles('okapi OR "zebras" NEAR('), [])
+        self.assertEqual(self.titles("!!"), [])
+
+    @skipUnless(connection.vendor == "sqlite", "FTS5 is SQLite-only")
+    def test_fts5_reindexes_edited_and_deleted_articles(self):
+        article = self.articles["Horses"]
+        article.current_content = "Wild okapi herds. " * 100
+        article.save()
+        self.backend.index_articles([article])
+        self.assertIn("Horses", self.titles("herds"))
+        self.assertEqual(self.titles("manes"), [])
+        self.backend.unindex_articles([article.pk])
+        self.assertEqual(self.titles("herds"), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {self.backend.FTS_TABLE}")
+            self.assertEqual(cursor.fetchone()[0], 3)
+
+    def test_unsupported_database(self):
+        with patch.object(connection, "vendor", "mysql"):
+            with self.assertRaises(SearchUnavailable):
+                self.backend.search(Article.objects.all(), "okapi")
+            with self.assertRaises(SearchUnavailable):
+                self.backend.rebuild()
+            # Change notifications are ignored rather than failing saves.
+            self.backend.index_rows([(uuid.uuid4(), "Title", "", "")])
+            self.backend.unindex_articles([uuid.uuid4()])
+
+    @skipUnless(connection.vendor == "postgresql", "Needs the PG trigger")
+    def test_postgres_trigger_keeps_compressed_content(self):
+        article = self.articles["Horses"]
+        self.assertEqual(self.titles("manes"), ["Horses"])
+        # The trigger indexes title and summary changes itself.
+        article.title = "Ponies"
+        article.save()
+        self.assertEqual(self.titles("ponies"), ["Ponies"])
+        self.assertEqual(self.titles("manes"), ["Ponies"])
+        # Compressed content is opaque to it: the old lexemes stay until
+        # index_articles() writes the new ones.
+        article.current_content = "Wild okapi herds. " * 100
+        article.save()
+        self.assertEqual(self.titles("herds"), [])
+        self.assertEqual(self.titles("manes"), ["Ponies"])
+        self.backend.index_articles([article])
+        self.assertEqual(self.titles("herds"), ["Ponies"])
+        self.assertEqual(self.titles("manes"), [])
+        # Compressed content of new rows is indexed the same way.
+        self.assertEqual(self.titles("seen"), [])
+        self.backend.rebuild()
+        self.assertEqual(self.titles("seen"), ["Forest life"])
+
+
+class TrendingTests(TestCase):
+    """Trending scores survive a change of the half-life."""
+
+    url = "/api/wiki/articles/trending/"
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            username="writer", email="writer@example.com", password="x"
+        )
+        cls.seeded, cls.live = [
+            Article.objects.create(
+                title=title, author=user, status=Article.Status.PUBLISHED
+            )
+            for title in ("Seeded", "Live")
+        ]
+
+    def seed(self):
+        # 1000 views, backfilled by the migration a day ago with the
+        # default half-life
+        now = timezone.now()
+        ArticleView.objects.bulk_create(
+            ArticleView(
+                article=self.seeded, viewed_at=now - timedelta(hours=26)
+            )
+            for _ in range(1000)
+        )
+        migration = importlib.import_module("wiki.migrations.0019_trending_at")
+        with (
+            self.settings(TRENDING_HALF_LIFE=12.0),
+            patch(
+                "django.utils.timezone.now", lambda: now - timedelta(hours=24)
+            ),
+        ):
+            migration.score_recent_views(apps, None)
+
+    def trending(self):
+        buffer = ViewBuffer(flush_interval=0)
+        for _ in range(5):
+            buffer.record(self.live.pk)
+        get_trending_board().refresh(force=True)
+        response = APIClient().get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return [(entry["title"], entry["score"]) for entry in response.data]
+
+    def test_longer_half_life(self):
+        self.seed()
+        with self.settings(TRENDING_HALF_LIFE=24.0):
+            (seeded, seeded_score), (live, live_score) = self.trending()
+        self.assertEqual((seeded, live), ("Seeded", "Live"))
+        # 1000 views seen 26 hours ago, halved over 2 and then 24 hours;
+        # the backfill counts them up to half an hour later.
+        self.assertAlmostEqual(
+            seeded_score, 1000 * 2 ** (-2 / 12) / 2, delta=15
+        )
+        self.assertAlmostEqual(live_score, 5, 2)
+
+    def test_shorter_half_life(self):
+        self.seed()
+        with self.settings(TRENDING_HALF_LIFE=0.5):
+            (live, live_score), (seeded, seeded_score) = self.trending()
+        self.assertEqual((live, seeded), ("Live", "Seeded"))
+        self.assertAlmostEqual(live_score, 5, 2)
+        self.assertEqual(seeded_score, 0)
+
+
+class ViewAnalyticsTests(TestCase):
+    """Views are rolled up, then archived, without losing any count."""
+
+    now = datetime(2026, 3, 10, 12, 5, tzinfo=UTC)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x"
+        )
+        cls.category = Category.objects.create(name="Mammals")
+        cls.article = Article.objects.create(
+            title="Zebras", author=cls.user, category=cls.category
+        )
+        agents = UserAgent.ids_for(["Bot", "Browser"])
+        views = [
+            # (day, hour, minute, user, agent)
+            (1, 10, 15, cls.user, "Browser"),
+            (1, 10, 45, None, "Bot"),
+            (1, 11, 30, None, "Bot"),
+            (2, 9, 0, None, "Browser"),
+            (10, 10, 30, cls.user, "Browser"),
+            # Too recent: the hour is not over yet.
+            (10, 11, 58, None, "Browser"),
+        ]
+        for day, hour, minute, user, agent in views:
+            ArticleView.objects.create(
+                article=cls.article,
+                user=user,
+                ip_address="10.0.0.1",
+                agent_id=agents[agent],
+                session_key="" if user else f"s{day}{hour}",
+                viewed_at=datetime(2026, 3, day, hour, minute, tzinfo=UTC),
+            )
+
+    def rollups(self, granularity):
+        return sorted(
+            (
+                row.period_start.day,
+                row.period_start.hour,
+                row.viewer,
+                row.views,
+            )
+            for row in ArticleViewRollup.objects.filter(
+                granularity=granularity, category=self.category
+            )
+        )
+
+    def test_rollup_and_archive(self):
+        member = ArticleViewRollup.Viewer.MEMBER
+        anonymous = ArticleViewRollup.Viewer.ANONYMOUS
+        self.assertEqual(rollup_views(now=self.now), 9 * 24 + 1)
+        self.assertEqual(rollup_mark(), self.now.replace(hour=11, minute=0))
+        hourly = [
+            (1, 10, anonymous, 1),
+            (1, 10, member, 1),
+            (1, 11, anonymous, 1),
+            (2, 9, anonymous, 1),
+            (10, 10, member, 1),
+        ]
+        daily = [
+            (1, 0, anonymous, 2),
+            (1, 0, member, 1),
+            (2, 0, anonymous, 1),
+            (10, 0, member, 1),
+        ]
+        self.assertEqual(self.rollups("hour"), hourly)
+        self.assertEqual(self.rollups("day"), daily)
+        # Nothing new to do, and running again changes nothing.
+        self.assertEqual(rollup_views(now=self.now), 0)
+        AnalyticsCheckpoint.objects.all().delete()
+        rollup_views(now=self.now)
+        self.assertEqual(self.rollups("day"), daily)
+
+        stored = list(
+            ArticleView.objects.order_by("viewed_at").values(
+                "id", "user_id", "agent__value", "session_key", "viewed_at"
+            )
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            # Views not rolled up yet are kept, whatever the cutoff.
+            archived, path = archive_views(
+                self.now + timedelta(days=1), directory, batch_size=2
+            )
+            self.assertEqual(archived, 5)
+            with gzip.open(path, "rt") as archive:
+                rows = [json.loads(line) for line in archive]
+            self.assertEqual(archive_views(self.now, directory), (0, None))
+        self.assertEqual(
+            [
+                (
+                    row["id"],
+                    row["user_id"],
+                    row["user_agent"],
+                    row["session_key"],
+                    row["viewed_at"],
+                )
+                for row in rows
+            ],
+            [
+                (
+                    view["id"],
+                    view["user_id"],
+                    view["agent__value"],
+                    view["session_key"],
+                    view["viewed_at"].isoformat().replace("+00:00", "Z"),
+                )
+                for view in stored[:5]
+            ],
+        )
+        self.assertEqual(
+            list(ArticleView.objects.values_list("id", flat=True)),
+            [stored[5]["id"]],
+        )
+
+        # Only whole days before the cutoff lose their hourly rollups,
+        # and only the agent no remaining view uses is dropped.
+        before = self.now.replace(day=2, hour=12)
+        self.assertEqual(compact_rollups(before), (3, 1))
+        self.assertEqual(self.rollups("hour"), hourly[3:])
+        self.assertEqual(self.rollups("day"), daily)
+        self.assertEqual(
+            list(UserAgent.objects.values_list("value", flat=True)),
+            ["Browser"],
+        )
+        # Later runs add the last hour and keep the archived days' totals.
+        self.assertEqual(rollup_views(now=self.now + timedelta(hours=1)), 1)
+        self.assertEqual(
+            self.rollups("day"),
+            daily[:3] + [(10, 0, anonymous, 1), (10, 0, member, 1)],
+        )
+
+
+class UniqueViewersTests(TestCase):
+    """Distinct viewer counts per article, category, author and site."""
+
+    url = "/api/wiki/articles/unique_viewers/"
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.writer, cls.other = [
+            User.objects.create_user(
+                username=name, email=f"{name}@example.com", password="x"
+            )
+            for name in ("writer", "other")
+        ]
+        cls.animals = Category.objects.create(name="Animals")
+        cls.horses = Category.objects.create(name="Horses", parent=cls.animals)
+        cls.zebras = Article.objects.create(
+            title="Zebras", author=cls.writer, category=cls.horses
+        )
+        cls.cats = Article.objects.create(
+            title="Cats", author=cls.other, category=cls.animals
+        )
+        cls.draft = Article.objects.create(title="Draft", author=cls.writer)
+        cls.today = timezone.now()
+        cls.week_ago = cls.today - timedelta(days=7)
+        # Viewers 0-59 read the zebras, 40-99 the cats and 90-109 the
+        # draft, all today; 200-299 read the zebras a week ago.
+        add_viewers(
+            [(cls.zebras.pk, f"user:{n}", cls.today) for n in range(60)]
+            + [(cls.cats.pk, f"user:{n}", cls.today) for n in range(40, 100)]
+            + [(cls.draft.pk, f"user:{n}", cls.today) for n in range(90, 110)]
+            + [
+                (cls.zebras.pk, f"user:{n}", cls.week_ago)
+                for n in range(200, 300)
+            ]
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.writer)
+
+    def count(self, url=None, **params):
+        response = self.client.get(url or self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data["unique_viewers"]
+
+    def assertCount(self, expected, url=None, **params):
+        # Well within the sketches' error at these small counts
+        self.assertAlmostEqual(
+            self.count(url, **params), expected, delta=expected * 0.03
+        )
+
+    def test_article(self):
+        url = f"/api/wiki/articles/{self.zebras.slug}/unique_viewers/"
+        self.client.force_authenticate(None)
+        self.assertCount(60, url)
+        start = (self.week_ago.date()).isoformat()
+        self.assertCount(160, url, start=start)
+        self.assertCount(100, url, start=start, end=start)
+
+    def test_groups(self):
+        self.assertCount(110)
+        self.assertCount(100, category__subtree=self.animals.pk)
+        self.assertCount(60, category=self.horses.pk)
+        self.assertCount(80, author=self.writer.pk)
+        self.assertCount(60, author=self.other.pk)
+        self.assertCount(210, start=self.week_ago.date().isoformat())
+
+    def test_other_filters_merge_articles(self):
+        self.assertCount(60, category=self.animals.pk, author=self.other.pk)
+        self.assertCount(110, status=Article.Status.DRAFT)
+        with patch("wiki.views.ArticleViewSet.MAX_VIEWER_ARTICLES", 2):
+            response = self.client.get(
+                self.url, {"status": Article.Status.DRAFT}
+            )
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get(self.url).status_code, (401, 403))
+        response = self.client.get(self.url, {"category__subtree": "nope"})
+        self.assertIn(response.status_code, (401, 403))
+
+
+class FindDuplicatesTests(TestCase):
+    """Near-duplicate clusters, without comparing equal fingerprints."""
+
+    def test_blocks_find_every_close_pair(self):
+        rng = np.random.default_rng(7)
+        base = rng.integers(0, 1 << 63, 40, dtype=np.uint64)
+        # Neighbours a few low bits away from base[0] and base[1]
+        fingerprints = np.unique(
+            np.concatenate(
+                [
+                    base,
+                    base[0] ^ (np.uint64(1) << np.arange(5, dtype=np.uint64)),
+                    [base[1] ^ np.uint64(0b111)],
+                ]
+            )
+        )
+        expected = {
+            (a, b)
+            for a in range(len(fingerprints))
+            for b in range(a + 1, len(fingerprints))
+            if int(fingerprints[a] ^ fingerprints[b]).bit_count() <= 2
+        }
+        for block in (find_duplicates.BLOCK_PAIRS, 7, 1):
+            with patch.object(find_duplicates, "BLOCK_PAIRS", block):
+                found = set(find_duplicates._close_pairs(fingerprints, 2))
+            self.assertEqual(found, expected, block)
+
+    def test_identical_fingerprints_share_a_cluster(self):
+        user = get_user_model().objects.create_user(
+            username="writer", email="writer@example.com", password="x"
+        )
+        text = " ".join(f"word{n}" for n in range(200))
+        for title, content in [
+            ("Stub one", "This article is a stub."),
+            ("Stub two", "This article is a stub."),
+            ("Stub three", "This article is a stub."),
+            ("Long", text),
+            ("Long copy", text + " word200"),
+            ("Other", "Something else entirely, with its own words."),
+        ]:
+            Article.objects.create(
+                title=title, current_content=content, author=user
+            )
+        out = StringIO()
+        call_command("find_duplicates", "--workers", "1", stdout=out)
+        output = out.getvalue()
+        self.assertIn("Cluster 1 (3 articles):", output)
+        self.assertIn("Cluster 2 (2 articles):", output)
+        self.assertIn("Found 2 clusters of near-duplicates among 6", output)
+        stubs = output.split("Cluster 2")[0]
+        for slug in ("stub-one", "stub-two", "stub-three"):
+            self.assertIn(slug, stubs)
@@ -0,0 +1,210 @@
+"""Buffered recording of article views.
+
+Recording a view appends it to an in-process buffer instead of running
+an ``INSERT`` and a contended ``view_count`` ``UPDATE`` on every read. A
+background thread flushes the buffer every
+``VIEW_TRACKING_FLUSH_INTERVAL`` seconds with one ``bulk_create`` of the
+``ArticleView`` rows and one ``UPDATE`` adding up the new views of each
+article. The buffer holds at most ``VIEW_TRACKING_BUFFER_SIZE`` views;
+the request that fills it flushes inline. Buffered views are flushed
+when the process exits, so only a killed worker loses views (at most one
+interval's worth). An interval of 0 writes every view immediately.
+
+Flushes also update the sketches of distinct viewers per article and day
+(see wiki.analytics) and, in the same ``UPDATE`` as the view counts, the
+articles' trending scores (see wiki.trending).
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Case, F, FloatField, PositiveIntegerField, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Longest user agent string kept, to bound the buffer's memory use.
+MAX_USER_AGENT = 512
+# Articles whose view counts are updated per statement
+UPDATE_BATCH_SIZE = 500
+
+
+class ViewBuffer:
+    """Collect article views in memory and write them in batches."""
+
+    def __init__(self, flush_interval=5.0, max_size=10000):
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._views = []
+        self._pid = None
+
+    def record(
+        self,
+        article_id,
+        user_id=None,
+        ip_address=None,
+        user_agent="",
+        session_key="",
+    ):
+        """Queue one view of an article."""
+        view = (
+            article_id,
+            user_id,
+            ip_address,
+            user_agent[:MAX_USER_AGENT],
+            session_key,
+            timezone.now(),
+        )
+        if self.flush_interval <= 0:
+            self._write([view])
+            return
+        with self._lock:
+            self._start()
+            self._views.append(view)
+            full = len(self._views) >= self.max_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered views and return how many were written."""
+        with self._lock:
+            views, self._views = self._views, []
+        if not views:
+            return 0
+        try:
+            self._write(views)
+        except DatabaseError:
+            logger.exception("Dropped %d article views", len(views))
+            return 0
+        return len(views)
+
+    def _start(self):
+        # Called with the lock held. A forked worker starts its own
+        # flusher and leaves views inherited from its parent to it.
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        if self._pid is None:
+            atexit.register(self.flush)
+        self._pid = pid
+        self._views = []
+        threading.Thread(
+            target=self._run, name="article-view-flusher", daemon=True
+        ).start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            close_old_connections()
+            self.flush()
+
+    def _write(self, views):
+        from .analytics import add_viewers, viewer_key
+        from .models import Article, ArticleView, UserAgent
+        from .trending import add_expression, log_sum, log_weight, seconds
+
+        now = timezone.now()
+        counts = Counter(view[0] for view in views)
+        weights = {}
+        for view in views:
+            weights.setdefault(view[0], []).append(log_weight(view[5], now))
+        with self._write_lock, transaction.atomic():
+            agents = UserAgent.ids_for(view[3] for view in views)
+            # Views of articles deleted in the meantime are dropped.
+            existing = set(
+                Article.objects.filter(pk__in=counts).values_list(
+                    "pk", flat=True
+                )
+            )
+            rows = []
+            viewers = []
+            for (
+                article_id,
+                user_id,
+                ip_address,
+                user_agent,
+                session_key,
+                viewed_at,
+            ) in views:
+                if article_id not in existing:
+                    continue
+                rows.append(
+                    ArticleView(
+                        article_id=article_id,
+                        user_id=user_id,
+                        ip_address=ip_address,
+                        agent_id=agents.get(user_agent),
+                        session_key=session_key,
+                        viewed_at=viewed_at,
+                    )
+                )
+                viewers.append(
+                    (
+                        article_id,
+                        viewer_key(
+                            user_id, session_key, ip_address, user_agent
+                        ),
+                        viewed_at,
+                    )
+                )
+            ArticleView.objects.bulk_create(rows, batch_size=1000)
+            add_viewers(viewers)
+            pks = sorted(existing)
+            for start in range(0, len(pks), UPDATE_BATCH_SIZE):
+                batch = pks[start : start + UPDATE_BATCH_SIZE]
+                Article.objects.filter(pk__in=batch).update(
+                    view_count=Case(
+                        *[
+                            When(pk=pk, then=F("view_count") + counts[pk])
+                            for pk in batch
+                        ],
+                        default=F("view_count"),
+                        output_field=PositiveIntegerField(),
+                    ),
+                    trending_score=Case(
+                        *[
+                            When(
+                                pk=pk,
+                                then=add_expression(log_sum(weights[pk]), now),
+                            )
+                            for pk in batch
+                        ],
+                        default=F("trending_score"),
+                        output_field=FloatField(),
+                    ),
+                    trending_at=seconds(now),
+                )
+
+
+@lru_cache(maxsize=None)
+def get_view_buffer():
+    """Return this process's view buffer."""
+    return ViewBuffer(
+        flush_interval=settings.VIEW_TRACKING_FLUSH_INTERVAL,
+        max_size=settings.VIEW_TRACKING_BUFFER_SIZE,
+    )
+
+
+def record_view(request, article_id):
+    """Record a view of an article by the client making request."""
+    user = getattr(request, "user", None)
+    session = getattr(request, "session", None)
+    get_view_buffer().record(
+        article_id,
+        user_id=(
+            user.pk if user is not None and user.is_authenticated else None
+        ),
+        ip_address=request.META.get("REMOTE_ADDR") or None,
+        user_agent=request.META.get("HTTP_USER_AGENT", ""),
+        session_key=(session.session_key or "") if session else "",
+    )
@@ -0,0 +1,170 @@
+"""Trending articles: view counts that decay exponentially with age.
+
+A view at time ``t`` is worth ``exp(-λ(now - t))``, so its weight halves
+every ``TRENDING_HALF_LIFE`` hours. ``Article.trending_score`` holds the
+natural logarithm of an article's decayed view count as of
+``Article.trending_at`` (seconds since ``EPOCH``); the view tracking
+flush decays it to the flush time and adds the new views with one
+log-add-exp per article (see wiki.tracking). The stored pair does not
+depend on λ, so a changed half-life applies from then on.
+
+Rather than decaying every article over and over, articles are ranked by
+``trending_score + λ·trending_at``, the log of their count decayed back to
+``EPOCH`` instead of forward to now ("forward decay"). Any later count is
+that one divided by the same factor for every article, so the ranking
+needs no periodic pass at all.
+
+``TrendingBoard`` keeps the best ``TRENDING_SIZE`` articles of every
+category in memory and reloads them with one query at most every
+``TRENDING_REFRESH_INTERVAL`` seconds, so serving trending lists never
+reads the views table, and usually not the database at all.
+"""
+
+import math
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import F, FloatField, Value, Window
+from django.db.models.functions import Abs, Exp, Greatest, Ln, RowNumber
+from django.utils import timezone
+
+# Reference time of the forward decay weights
+EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+# Largest exponent math.exp() takes without overflowing is about 709.
+MAX_EXPONENT = 700.0
+
+# Category argument of TrendingBoard.top() meaning "all categories"
+ANY = object()
+
+Entry = namedtuple("Entry", ["score", "id", "slug", "title", "category_id"])
+
+
+def decay_rate():
+    """Return λ, per second, for the configured half-life."""
+    return math.log(2) / (settings.TRENDING_HALF_LIFE * 3600)
+
+
+def seconds(moment):
+    """Return the seconds from EPOCH to moment."""
+    return (moment - EPOCH).total_seconds()
+
+
+def log_weight(moment, now):
+    """Return the log of the weight at now of a view at moment."""
+    return decay_rate() * (seconds(moment) - seconds(now))
+
+
+def log_sum(values):
+    """Return ``log(sum(exp(value)))`` without overflowing."""
+    values = list(values)
+    top = max(values)
+    return top + math.log(sum(math.exp(value - top) for value in values))
+
+
+def _float(value):
+    return Value(float(value), output_field=FloatField())
+
+
+def add_expression(log_delta, now):
+    """SQL for ``trending_score`` at now with ``exp(log_delta)`` added.
+
+    ``log(e^a + e^b) = max(a, b) + log(1 + e^-|a - b|)``, which stays
+    finite for any pair of scores.
+    """
+    stored = F("trending_score") - _float(decay_rate()) * (
+        _float(seconds(now)) - F("trending_at")
+    )
+    delta = _float(log_delta)
+    return Greatest(stored, delta) + Ln(
+        _float(1.0) + Exp(-Abs(stored - delta))
+    )
+
+
+def rank_expression():
+    """SQL for the log of an article's view count decayed to EPOCH."""
+    return F("trending_score") + _float(decay_rate()) * F("trending_at")
+
+
+def decayed_views(rank, now=None):
+    """Return the decayed view count that a rank stands for."""
+    exponent = rank - decay_rate() * seconds(now or timezone.now())
+    return math.exp(min(exponent, MAX_EXPONENT))
+
+
+class TrendingBoard:
+    """Top articles by trending score, overall and per category."""
+
+    def __init__(self, size=50, refresh_interval=60.0):
+        self.size = size
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._categories = {}
+        self._overall = []
+        self._loaded_at = None
+
+    def top(self, limit, category_id=ANY):
+        """Return up to limit entries of a category, best first.
+
+        ``category_id`` None stands for uncategorized articles.
+        """
+        self.refresh()
+        if category_id is ANY:
+            entries = self._overall
+        else:
+            entries = self._categories.get(category_id, [])
+        return entries[:limit]
+
+    def refresh(self, force=False):
+        """Reload the board if it is older than the refresh interval."""
+        if not force and not self._stale():
+            return
+        with self._lock:
+            if force or self._stale():
+                self._load()
+
+    def _stale(self):
+        return (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at >= self.refresh_interval
+        )
+
+    def _load(self):
+        from .models import Article
+
+        ranked = (
+            Article.objects.filter(status=Article.Status.PUBLISHED)
+            .annotate(rank=rank_expression())
+            .annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=[F("category_id")],
+                    order_by=[F("rank").desc(), F("id").asc()],
+                )
+            )
+            .filter(position__lte=self.size)
+            .values_list("rank", "id", "slug", "title", "category")
+        )
+        entries = sorted(
+            (Entry(*row) for row in ranked),
+            key=lambda entry: (-entry.score, entry.id),
+        )
+        categories = {}
+        for entry in entries:
+            categories.setdefault(entry.category_id, []).append(entry)
+        # The overall leaders are among the leaders of their categories.
+        overall = entries[: self.size]
+        self._categories, self._overall = categories, overall
+        self._loaded_at = time.monotonic()
+
+
+@lru_cache(maxsize=None)
+def get_trending_board():
+    """Return this process's trending board."""
+    return TrendingBoard(
+        size=settings.TRENDING_SIZE,
+        refresh_interval=settings.TRENDING_REFRESH_INTERVAL,
+    )
@@ -9,7 +9,10 @@ router = DefaultRouter()
 router.register(r"articles", views.ArticleViewSet)
 router.register(r"sections", views.SectionViewSet)
 router.register(r"revisions", views.RevisionViewSet)
+router.register(r"saved-searches", views.SavedSearchViewSet)
+router.register(r"search-alerts", views.SearchAlertViewSet)
 
 urlpatterns = [
+    path("suggest/", views.SuggestView.as_view(), name="suggest"),
     path("", include(router.urls)),
 ]
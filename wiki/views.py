@@ -1,20 +1,59 @@
-from rest_framework import viewsets, permissions, filters
+import datetime
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import viewsets, permissions, filters, serializers, status
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import (
+    OpenApiParameter,
+    extend_schema,
+    inline_serializer,
+)
 
-from .models import Article, Section, Revision
+from .filters import ArticleFilter
+from .models import (
+    Article,
+    CategoryClosure,
+    Section,
+    Revision,
+    SavedSearch,
+    SearchAlert,
+    ViewerGroupSketch,
+)
 from .serializers import (
     ArticleSerializer,
+    NearDuplicateSerializer,
+    SectionOutlineSerializer,
     SectionSerializer,
     RevisionSerializer,
+    RevisionDiffSerializer,
+    SavedSearchSerializer,
+    SearchAlertSerializer,
+    SuggestionSerializer,
+    TrendingArticleSerializer,
+    UniqueViewersSerializer,
 )
+from .search import get_suggest_index, get_vector_index
+from .search.filters import RankedSearchFilter
+from .analytics import group_viewers, unique_viewers
+from .diffs import STYLES, revision_diff
+from .tracking import record_view
+from .trending import ANY, decayed_views, get_trending_board
+from comments.loaders import content_object_loader
+from core.lexorank import spread
 from comments.models import Comment
+from core.fieldsets import SparseFieldsetFilter
+from core.values import ValuesListMixin
 from comments.serializers import CommentSerializer
 
 
-class ArticleViewSet(viewsets.ModelViewSet):
+class ArticleViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """ViewSet for Article model."""
 
     queryset = (
@@ -26,15 +65,30 @@ class ArticleViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [
         DjangoFilterBackend,
-        filters.SearchFilter,
         filters.OrderingFilter,
+        RankedSearchFilter,
+        SparseFieldsetFilter,
     ]
-    filterset_fields = ["status", "featured", "author"]
-    search_fields = ["title", "current_content", "current_summary"]
+    filterset_class = ArticleFilter
+    # Only used while the search backend is unavailable. Bodies are stored
+    # compressed (see core.fields), which icontains cannot match.
+    search_fields = ["title", "current_summary"]
     ordering_fields = ["created_at", "updated_at", "title"]
     ordering = ["-created_at"]
     lookup_field = "slug"
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["search_query"] = self.request.query_params.get(
+            RankedSearchFilter.search_param, ""
+        ).strip()
+        return context
+
+    def retrieve(self, request, *args, **kwargs):
+        article = self.get_object()
+        record_view(request, article.pk)
+        return Response(self.get_serializer(article).data)
+
     @extend_schema(
         summary="Get article comments",
         description="Retrieve all comments for a specific article",
@@ -49,8 +103,269 @@ class ArticleViewSet(viewsets.ModelViewSet):
         comments = Comment.objects.filter(
             content_type=content_type, object_id=article.id
         ).select_related("author")
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        # Every comment points at this article; no need to fetch it again.
+        content_object_loader(request).prime(article)
+        page = self.paginate_queryset(comments)
+        serializer = CommentSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(
+        summary="Get article outline",
+        description=(
+            "The article's sections as a nested tree, in order, with their "
+            "hierarchical numbers."
+        ),
+        responses=SectionOutlineSerializer(many=True),
+    )
+    @action(detail=True, methods=["get"], pagination_class=None)
+    def outline(self, request, slug=None):
+        """Get the nested section tree of an article."""
+        article = self.get_object()
+        return Response(
+            SectionOutlineSerializer(article.get_outline(), many=True).data
+        )
+
+    # Longest date range unique_viewers() accepts, in days
+    MAX_VIEWER_RANGE = 366
+    # Most articles whose own sketches unique_viewers_total() merges
+    MAX_VIEWER_ARTICLES = 200
+
+    def _viewer_range(self, request):
+        """Return (start, end) dates from the query, or an error Response."""
+        end = request.query_params.get("end")
+        start = request.query_params.get("start")
+        try:
+            end = (
+                datetime.date.fromisoformat(end)
+                if end
+                else timezone.now().date()
+            )
+            start = (
+                datetime.date.fromisoformat(start)
+                if start
+                else end - datetime.timedelta(days=6)
+            )
+        except ValueError:
+            return Response(
+                {"error": "start and end must be dates (YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not 0 <= (end - start).days < self.MAX_VIEWER_RANGE:
+            return Response(
+                {
+                    "error": (
+                        "start must not be after end, and the range may "
+                        f"span at most {self.MAX_VIEWER_RANGE} days"
+                    )
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return start, end
+
+    @extend_schema(
+        summary="Count unique viewers of an article",
+        description=(
+            "Approximate number of distinct viewers (users, else "
+            "sessions, else clients) from `start` to `end`, both "
+            "included (UTC dates, default: the last 7 days). Estimated "
+            "from daily HyperLogLog sketches, within about 2%."
+        ),
+        parameters=[
+            OpenApiParameter("start", datetime.date),
+            OpenApiParameter("end", datetime.date),
+        ],
+        responses=UniqueViewersSerializer,
+    )
+    @action(detail=True, methods=["get"])
+    def unique_viewers(self, request, slug=None):
+        """Count the distinct viewers of an article."""
+        article = self.get_object()
+        period = self._viewer_range(request)
+        if isinstance(period, Response):
+            return period
+        start, end = period
+        count = unique_viewers(
+            Article.objects.filter(pk=article.pk), start, end
+        )
+        return Response({"start": start, "end": end, "unique_viewers": count})
+
+    @extend_schema(
+        summary="Count unique viewers of many articles",
+        operation_id="wiki_articles_unique_viewers_total",
+        description=(
+            "Like an article's `unique_viewers`, for all articles "
+            "matching the list filters: a person who read several of "
+            "them counts once. Without filters, or with only one of "
+            "`category`, `category__subtree` or `author`, the count "
+            "comes from daily sketches of the whole site, each category "
+            "and each author (articles of any status, in the category "
+            "they had when viewed). Other filters may match at most "
+            f"{MAX_VIEWER_ARTICLES} articles."
+        ),
+        parameters=[
+            OpenApiParameter("start", datetime.date),
+            OpenApiParameter("end", datetime.date),
+        ],
+        responses=UniqueViewersSerializer,
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="unique_viewers",
+        pagination_class=None,
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def unique_viewers_total(self, request):
+        """Count the distinct viewers of the filtered articles."""
+        period = self._viewer_range(request)
+        if isinstance(period, Response):
+            return period
+        start, end = period
+        # Validates the filters
+        articles = self.filter_queryset(self.get_queryset())
+        group = self._viewer_group(request)
+        if group is not None:
+            count = group_viewers(*group, start, end)
+        elif articles.count() > self.MAX_VIEWER_ARTICLES:
+            return Response(
+                {
+                    "error": (
+                        "The filters match more than "
+                        f"{self.MAX_VIEWER_ARTICLES} articles; filter by "
+                        "category or author alone, or narrow them down"
+                    )
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        else:
+            count = unique_viewers(articles, start, end)
+        return Response({"start": start, "end": end, "unique_viewers": count})
+
+    def _viewer_group(self, request):
+        """Return the (scope, keys) of the filtered group sketches.
+
+        None when the filters select no group, so the sketches of the
+        articles have to be merged instead.
+        """
+        params = request.query_params
+        used = [
+            name
+            for name in (
+                *ArticleFilter.base_filters,
+                RankedSearchFilter.search_param,
+            )
+            if params.get(name)
+        ]
+        Scope = ViewerGroupSketch.Scope
+        if not used:
+            return Scope.SITE, [""]
+        if used == ["author"]:
+            return Scope.AUTHOR, [int(params["author"])]
+        if used == ["category"]:
+            return Scope.CATEGORY, [uuid.UUID(params["category"])]
+        if used == ["category__subtree"]:
+            return Scope.CATEGORY, CategoryClosure.objects.filter(
+                ancestor_id=params["category__subtree"]
+            ).values_list("descendant_id", flat=True)
+        return None
+
+    @extend_schema(
+        summary="List trending articles",
+        description=(
+            "Published articles with the most views, each view weighted "
+            "by how recent it is (its weight halves every "
+            "`TRENDING_HALF_LIFE` hours). Served from memory, so the "
+            "list may lag behind views by about a minute. `category` "
+            "restricts it to one category (not its subcategories); "
+            "`category=none` lists uncategorized articles."
+        ),
+        parameters=[
+            OpenApiParameter("category", str),
+            OpenApiParameter(
+                "limit", int, description="Maximum results (default 10)"
+            ),
+        ],
+        responses=TrendingArticleSerializer(many=True),
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        pagination_class=None,
+        filter_backends=[],
+    )
+    def trending(self, request):
+        """List the trending articles."""
+        board = get_trending_board()
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, board.size))
+
+        category = request.query_params.get("category")
+        if not category:
+            category = ANY
+        elif category == "none":
+            category = None
+        else:
+            try:
+                category = uuid.UUID(category)
+            except ValueError:
+                return Response(
+                    {"error": "category must be a category id or none"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        now = timezone.now()
+        entries = [
+            entry._replace(score=round(decayed_views(entry.score, now), 4))
+            for entry in board.top(limit, category)
+        ]
+        return Response(TrendingArticleSerializer(entries, many=True).data)
+
+    @extend_schema(
+        summary="Get related articles",
+        description=(
+            "Articles with the most similar content, by embedding "
+            "similarity. Each result carries a `similarity` in [0, 1]."
+        ),
+        parameters=[
+            OpenApiParameter(
+                "limit", int, description="Maximum results (default 10)"
+            )
+        ],
+    )
+    @action(detail=True, methods=["get"])
+    def related(self, request, slug=None):
+        """Get articles related to an article."""
+        article = self.get_object()
+        index = get_vector_index()
+        if not index.ready:
+            return Response(
+                {"error": "The vector index has not been built"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 10)), 50))
+        except ValueError:
+            limit = 10
+
+        hits = index.related(article.id, limit)
+        articles = self.get_queryset().in_bulk([pk for pk, _ in hits])
+        ranked = [
+            (articles[pk], similarity)
+            for pk, similarity in hits
+            if pk in articles
+        ]
+        serializer = self.get_serializer(
+            [related for related, _ in ranked], many=True
+        )
+        data = serializer.data
+        for item, (_, similarity) in zip(data, ranked):
+            item["similarity"] = round(similarity, 4)
+        return Response(data)
 
     @extend_schema(
         summary="Get article revisions",
@@ -60,9 +375,95 @@ class ArticleViewSet(viewsets.ModelViewSet):
     def revisions(self, request, slug=None):
         """Get all revisions for an article."""
         article = self.get_object()
-        revisions = article.revisions.all().select_related("author")
-        serializer = RevisionSerializer(revisions, many=True)
-        return Response(serializer.data)
+        revisions = (
+            article.revisions.all()
+            .select_related("article", "editor")
+            .order_by("-version_number")
+        )
+        page = self.paginate_queryset(revisions)
+        serializer = RevisionSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    # Most unchanged lines diff() shows around each change
+    MAX_DIFF_CONTEXT = 100
+
+    @extend_schema(
+        summary="Compare two revisions",
+        description=(
+            "Changes from version `from` to version `to` of the article; "
+            "`to` defaults to the latest version and `from` to the one "
+            "before `to`. "
+            "`style=unified` returns a unified diff of the lines; "
+            "`style=structured` returns hunks of deleted, inserted and "
+            "unchanged text, refined to words within changed lines. "
+            "`context` unchanged lines (default 3) surround each change. "
+            "Results are cached, so repeated comparisons are cheap."
+        ),
+        parameters=[
+            OpenApiParameter("from", int),
+            OpenApiParameter("to", int),
+            OpenApiParameter("style", str, enum=STYLES),
+            OpenApiParameter("context", int),
+        ],
+        responses=RevisionDiffSerializer,
+    )
+    @action(detail=True, methods=["get"], pagination_class=None)
+    def diff(self, request, slug=None):
+        """Compare two revisions of an article."""
+        article = self.get_object()
+        params = request.query_params
+        style = params.get("style", "unified")
+        if style not in STYLES:
+            return Response(
+                {"error": "style must be unified or structured"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            numbers = [
+                int(params[name]) if params.get(name) else None
+                for name in ("from", "to", "context")
+            ]
+        except ValueError:
+            return Response(
+                {"error": "from, to and context must be integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        old_version, new_version, context = numbers
+        if context is None:
+            context = 3
+        context = max(0, min(context, self.MAX_DIFF_CONTEXT))
+
+        fields = ("id", "article", "version_number", "updated_at")
+        revisions = article.revisions.only(*fields).order_by("-version_number")
+        if new_version is not None:
+            revisions = revisions.filter(version_number__lte=new_version)
+        # By default the newest revision and the one before it
+        found = list(revisions[: 1 if old_version is not None else 2])
+        if not found or new_version not in (None, found[0].version_number):
+            return Response(
+                {"error": "Revision not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        new = found[0]
+        if old_version is None:
+            if len(found) < 2:
+                return Response(
+                    {"error": "There is no earlier revision to compare"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            old = found[1]
+        else:
+            old = (
+                article.revisions.only(*fields)
+                .filter(version_number=old_version)
+                .first()
+            )
+            if old is None:
+                return Response(
+                    {"error": "Revision not found"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+        return Response(revision_diff(old, new, style, context))
 
 
 class SectionViewSet(viewsets.ModelViewSet):
@@ -71,19 +472,228 @@ class SectionViewSet(viewsets.ModelViewSet):
     queryset = Section.objects.all().select_related("article")
     serializer_class = SectionSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ["article"]
-    ordering_fields = ["order", "created_at"]
-    ordering = ["order"]
+    filter_backends = [
+        DjangoFilterBackend,
+        filters.OrderingFilter,
+        SparseFieldsetFilter,
+    ]
+    filterset_fields = ["article", "parent", "depth"]
+    ordering_fields = ["path", "created_at"]
+    ordering = ["path"]
 
+    @extend_schema(
+        summary="Reorder sibling sections",
+        description=(
+            "Applies a new order to all subsections of one parent (or all "
+            "top-level sections of one article), given as the complete "
+            "list of their ids."
+        ),
+        request=inline_serializer(
+            "ReorderSections",
+            {"sections": serializers.ListField(child=serializers.UUIDField())},
+        ),
+        responses=SectionSerializer(many=True),
+    )
+    @action(detail=False, methods=["post"], pagination_class=None)
+    def reorder(self, request):
+        ids = request.data.get("sections")
+        if not isinstance(ids, list) or not ids:
+            return Response(
+                {"error": "sections must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            ids = [uuid.UUID(str(pk)) for pk in ids]
+        except ValueError:
+            return Response(
+                {"error": "sections must be UUIDs"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        with transaction.atomic():
+            sections = Section.objects.select_for_update().in_bulk(ids)
+            groups = {(s.article_id, s.parent_id) for s in sections.values()}
+            if len(groups) != 1 or len(sections) != len(ids):
+                return Response(
+                    {"error": "sections must list distinct siblings"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            ((article_id, parent_id),) = groups
+            siblings = Section.objects.filter(
+                article_id=article_id, parent_id=parent_id
+            ).count()
+            if siblings != len(sections):
+                return Response(
+                    {"error": "sections must list every sibling"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            ranks = dict(zip(ids, spread(len(ids))))
+            Section.renumber(article_id, ranks)
+        queryset = self.get_queryset().filter(pk__in=ranks)
+        return Response(self.get_serializer(queryset, many=True).data)
 
-class RevisionViewSet(viewsets.ModelViewSet):
+
+class RevisionViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """ViewSet for Revision model."""
 
     queryset = Revision.objects.all().select_related("article", "editor")
     serializer_class = RevisionSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [
+        DjangoFilterBackend,
+        filters.OrderingFilter,
+        SparseFieldsetFilter,
+    ]
     filterset_fields = ["article", "editor"]
     ordering_fields = ["created_at"]
     ordering = ["-created_at"]
+
+    def create(self, request, *args, **kwargs):
+        """Create a revision and report articles it nearly duplicates."""
+        response = super().create(request, *args, **kwargs)
+        response.data["near_duplicates"] = NearDuplicateSerializer(
+            [
+                {
+                    "id": article.id,
+                    "slug": article.slug,
+                    "title": article.title,
+                    "distance": distance,
+                }
+                for article, distance in self.near_duplicates
+            ],
+            many=True,
+        ).data
+        return response
+
+    def perform_create(self, serializer):
+        revision = serializer.save()
+        self.near_duplicates = revision.article.get_near_duplicates()
+
+
+class SavedSearchViewSet(viewsets.ModelViewSet):
+    """Saved searches of the current user.
+
+    New revisions are matched against active saved searches in batches by
+    the ``percolate`` management command, which creates search alerts.
+    """
+
+    queryset = SavedSearch.objects.all()
+    serializer_class = SavedSearchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    # A handful of rows per user; page numbers are fine here.
+    pagination_class = PageNumberPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ["is_active"]
+    ordering_fields = ["created_at", "name"]
+    ordering = ["-created_at"]
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class SearchAlertViewSet(viewsets.ReadOnlyModelViewSet):
+    """Alerts raised for the current user's saved searches."""
+
+    queryset = SearchAlert.objects.all().select_related(
+        "saved_search", "article"
+    )
+    serializer_class = SearchAlertSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ["saved_search", "is_read"]
+    ordering_fields = ["created_at"]
+    ordering = ["-created_at"]
+
+    def get_queryset(self):
+        return (
+            super().get_queryset().filter(saved_search__user=self.request.user)
+        )
+
+    @extend_schema(
+        summary="Mark alerts as read",
+        description=(
+            "Marks the alerts listed in `ids` as read, or every unread alert "
+            "when `ids` is omitted."
+        ),
+        request=inline_serializer(
+            "MarkAlertsRead",
+            {
+                "ids": serializers.ListField(
+                    child=serializers.UUIDField(), required=False
+                )
+            },
+        ),
+        responses=inline_serializer(
+            "MarkAlertsReadResult", {"updated": serializers.IntegerField()}
+        ),
+    )
+    @action(detail=False, methods=["post"])
+    def mark_read(self, request):
+        alerts = self.get_queryset().filter(is_read=False)
+        ids = request.data.get("ids")
+        if ids is not None:
+            if not isinstance(ids, list):
+                return Response(
+                    {"error": "ids must be a list"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            try:
+                alerts = alerts.filter(pk__in=ids)
+            except ValidationError:
+                return Response(
+                    {"error": "ids must be UUIDs"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        return Response({"updated": alerts.update(is_read=True)})
+
+
+class SuggestView(APIView):
+    """Typeahead suggestions for article titles, categories and tags."""
+
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    max_limit = 25
+    kinds = {"article", "category", "tag"}
+
+    @extend_schema(
+        summary="Suggest as you type",
+        description=(
+            "Ranked, typo-tolerant completions of `q` among article titles, "
+            "category names and tags."
+        ),
+        parameters=[
+            OpenApiParameter("q", str, description="Text typed so far"),
+            OpenApiParameter(
+                "limit", int, description="Maximum suggestions (default 10)"
+            ),
+            OpenApiParameter(
+                "types",
+                str,
+                description="Comma-separated subset of article,category,tag",
+            ),
+        ],
+        responses=SuggestionSerializer(many=True),
+    )
+    def get(self, request):
+        query = request.query_params.get("q", "")
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, self.max_limit))
+        kinds = {
+            kind.strip()
+            for kind in request.query_params.get("types", "").split(",")
+            if kind.strip() in self.kinds
+        }
+
+        results = get_suggest_index().suggest(query, limit, kinds or None)
+        serializer = SuggestionSerializer(
+            [
+                dict(suggestion._asdict(), score=round(score, 4))
+                for score, suggestion in results
+            ],
+            many=True,
+        )
+        return Response({"query": query, "results": serializer.data})